@@ -0,0 +1,24 @@
+# backend/app/experts/base.py
+from typing import Any, Dict, Iterator, List, Optional
+from utils.ollama_pool import get_pool
+
+
+class Expert:
+    """An Ollama-served model with a prompt template for single-shot requests."""
+    name: str = "expert"
+    model: str = ""
+    template: str = "{context}\n{prompt}"
+
+    def run(self, prompt, context, **kwargs):
+        full = self.template.format(prompt=prompt, context=context)
+        return get_pool().generate(self.model, full, **kwargs).get("response", "")
+
+    def chat(self, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None) -> str:
+        response = get_pool().chat(self.model, messages, options)
+        return response['message']['content']
+
+    def stream_chat(self, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        return get_pool().chat_stream(self.model, messages, options)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.name}:{self.model}>"
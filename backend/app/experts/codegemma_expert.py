@@ -1,8 +1,30 @@
 # backend/app/experts/codegemma_expert.py
-import requests
+from experts.base import Expert
+from utils.config import MOE_EXPERT_MODELS
 
 
-class CodegemmaExpert:
-    def run(self, prompt, context, **kwargs):
-        full = f"# Context:\n{context}\n# Code request:\n{prompt}\n# Solution:"
-        return requests.post("http://localhost:11434/api/generate", json={"model":"codegemma","prompt":full,**kwargs}).json().get("response","")
\ No newline at end of file
+class CodegemmaExpert(Expert):
+    name = "codegemma"
+    model = MOE_EXPERT_MODELS.get("codegemma", "codegemma")
+    template = "# Context:\n{context}\n# Code request:\n{prompt}\n# Solution:"
+
+    def run(self, prompt, context=None, **kwargs):
+        if context is None:
+            # definitions of the identifiers in the request, from the default knowledge base
+            context = definitions_for(prompt)
+        return super().run(prompt, context, **kwargs)
+
+
+def definitions_for(prompt: str) -> str:
+    from pathlib import Path
+    from knowledge.index_cache import get_index_cache
+    from knowledge.symbols import definition_context
+    from utils.config import VECTORSTORE_PATH
+
+    cache = get_index_cache()
+    db = cache.get(Path(VECTORSTORE_PATH))
+    symbols = cache.symbols(Path(VECTORSTORE_PATH), db) if db is not None else None
+    if not symbols:
+        return ""
+    blocks, _ = definition_context(db, symbols, prompt)
+    return "\n\n".join(blocks)
@@ -1,8 +1,9 @@
 # backend/app/experts/deepseek_expert.py
-import requests
+from experts.base import Expert
+from utils.config import MOE_EXPERT_MODELS
 
 
-class DeepseekExpert:
-    def run(self, prompt, context, **kwargs):
-        full = f"Context:\n{context}\nUser:{prompt}\nAssistant:"
-        return requests.post("http://localhost:11434/api/generate", json={"model":"deepseek-r1:latest","prompt":full,**kwargs}).json().get("response","")
\ No newline at end of file
+class DeepseekExpert(Expert):
+    name = "deepseek"
+    model = MOE_EXPERT_MODELS.get("deepseek", "deepseek-r1:latest")
+    template = "Context:\n{context}\nUser:{prompt}\nAssistant:"
@@ -1,8 +1,19 @@
 # backend/app/utils/embedder.py
-import requests
+from typing import List
+from utils.ollama_pool import get_pool
+from utils.config import SEARCH_EMBED_BATCH_SIZE
+
+EMBED_MODEL = "mxbai-embed-large"
 
 
 def get_embedding(text):
-    r = requests.post("http://localhost:11434/api/embeddings",
-                      json={"model": "mxbai-embed-large", "prompt": text})
-    return r.json().get("embedding", [])
\ No newline at end of file
+    # /api/embed like get_embeddings (documents are indexed with it): /api/embeddings is not normalised
+    return get_pool().embed(EMBED_MODEL, [text])[0]
+
+
+def get_embeddings(texts: List[str], batch_size: int = SEARCH_EMBED_BATCH_SIZE) -> List[List[float]]:
+    """Embed texts with one /api/embed call per batch instead of one call per text."""
+    vectors: List[List[float]] = []
+    for i in range(0, len(texts), batch_size):
+        vectors.extend(get_pool().embed(EMBED_MODEL, texts[i:i + batch_size]))
+    return vectors
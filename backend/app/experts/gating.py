@@ -0,0 +1,258 @@
+# backend/app/experts/gating.py
+"""
+Gating stage of the mixture of experts.
+
+Each message is turned into a sparse bag of features (words,
+bigrams and a few structural markers such as code fences or message
+length) and compared against per-expert centroids built from seed
+examples. Vocabulary carries the decision; the structural markers only
+break ties. The similarity is then discounted by each expert's current
+queue depth and by how much slower it is running than usual (EWMA of
+recent calls over the median of its last BASELINE_CALLS), so a busy or
+degraded model loses close calls while a model that is slow by nature
+(deepseek) still gets the questions it exists for. Routing a message
+costs a few dict operations and stays well under a millisecond.
+
+With call coalescing (ollama.coalesce), a message identical to one still
+being answered goes to the same expert, whatever its load: the identical
+call joins the one in flight instead of adding to the queue.
+"""
+import math
+import re
+import statistics
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+from experts.base import Expert
+from experts.codegemma_expert import CodegemmaExpert
+from experts.deepseek_expert import DeepseekExpert
+from experts.llava_expert import LlavaExpert
+from experts.quick_expert import QuickExpert
+from utils.config import MOE_DEFAULT_EXPERT, MOE_LATENCY_WEIGHT, MOE_QUEUE_WEIGHT, OLLAMA_COALESCE
+
+# Below this similarity the message is not clearly anyone's; use the default
+MIN_SIMILARITY = 0.05
+EWMA_ALPHA = 0.2
+# completed calls whose median is an expert's latency baseline
+BASELINE_CALLS = 50
+
+SEED_EXAMPLES: Dict[str, List[str]] = {
+    "codegemma": [
+        "write a python function that parses a csv file",
+        "fix this bug in my code ```def f(x): return x +```",
+        "how do I implement quicksort in java",
+        "refactor this class to use async await",
+        "why does this javascript throw undefined is not a function",
+        "write a sql query to join two tables",
+        "explain this stack trace error in my program",
+        "implement a binary search tree insert method in c++",
+        "convert this loop to a list comprehension",
+        "write unit tests for this function",
+        "my code throws an exception, how do I fix the error",
+        "what does this regex match in my script",
+        "how do I sort a list of tuples by the second element",
+        "how to reverse a string in python",
+        "how can I remove duplicates from an array in javascript",
+        "why does my loop print the wrong value",
+        "how do I read a json file into a dict",
+    ],
+    "quick": [
+        "what is the capital of france",
+        "who invented the telephone",
+        "define recursion",
+        "what does cpu stand for",
+        "how many bytes in a kilobyte",
+        "when was python released",
+        "what is big o notation",
+        "is 97 a prime number",
+    ],
+    "deepseek": [
+        "explain in detail how dijkstra's algorithm works and prove its correctness",
+        "compare the trade-offs between b-trees and lsm trees for write heavy workloads",
+        "help me design a system that processes millions of events per second",
+        "walk me through the reasoning behind dynamic programming for knapsack",
+        "summarize the key ideas of this paper and discuss their limitations",
+        "analyze the time and space complexity of this approach step by step",
+        "why is the halting problem undecidable, give the full argument",
+        "how does merge sort compare with heapsort, discuss the trade-offs in depth",
+        "explain the intuition behind the kmp failure function and why it runs in linear time",
+        "tell me about neural networks and how they learn",
+        "explain how attention works in transformer models",
+        "describe how hash tables resolve collisions and the trade-offs of each method",
+        "give me an in-depth explanation of the string matching algorithm and its proof",
+        "teach me how red black trees stay balanced",
+    ],
+}
+
+_WORD = re.compile(r"[a-z_][a-z0-9_+#]*")
+# syntax rather than keywords, so "the failure function" is not code
+_CODE = re.compile(
+    r"```|\bdef \w+\(|\bclass \w+[:({]|^\s*(import|from) [\w.]+|\bfunction\s*\w*\(|"
+    r"\bselect\b.+\bfrom\b|[{};]\s*$|=>|\w+\([^)]*\)",
+    re.M | re.I,
+)
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "of", "in", "on", "to", "and", "or", "for", "this",
+    "that", "it", "my", "me", "i", "do", "does", "how", "with", "be", "by", "at", "as",
+}
+
+
+def featurize(text: str) -> Dict[str, float]:
+    lowered = text.lower()
+    words = [w for w in _WORD.findall(lowered) if w not in _STOPWORDS]
+    feats: Counter = Counter(words)
+    feats.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    # light enough that a message's words outweigh them
+    if _CODE.search(text):
+        feats["__code__"] += 1
+    n_words = len(text.split())
+    if n_words <= 8:
+        feats["__short__"] += 0.3
+    elif n_words >= 18:
+        feats["__long__"] += 0.3
+    else:
+        feats["__medium__"] += 0.2
+    return _normalize(feats)
+
+
+def _normalize(vec: Dict[str, float]) -> Dict[str, float]:
+    norm = math.sqrt(sum(v * v for v in vec.values()))
+    return {k: v / norm for k, v in vec.items()} if norm else {}
+
+
+def _dot(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+@dataclass
+class ExpertLoad:
+    latency_s: Optional[float] = None  # EWMA of completed calls
+    inflight: int = 0
+    calls: int = 0
+    recent: deque = field(default_factory=lambda: deque(maxlen=BASELINE_CALLS))
+
+    @property
+    def baseline_s(self) -> Optional[float]:
+        return statistics.median(self.recent) if self.recent else None
+
+
+@dataclass
+class RoutingDecision:
+    expert: Expert
+    scores: Dict[str, float] = field(default_factory=dict)
+    reason: str = "classifier"
+    route_ms: float = 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "expert": self.expert.name,
+            "model": self.expert.model,
+            "reason": self.reason,
+            "scores": {k: round(v, 4) for k, v in self.scores.items()},
+            "route_ms": round(self.route_ms, 3),
+        }
+
+
+class ExpertRouter:
+    def __init__(
+        self,
+        experts: Dict[str, Expert],
+        seeds: Dict[str, List[str]] = SEED_EXAMPLES,
+        default: str = MOE_DEFAULT_EXPERT,
+        latency_weight: float = MOE_LATENCY_WEIGHT,
+        queue_weight: float = MOE_QUEUE_WEIGHT,
+        coalesce: bool = OLLAMA_COALESCE,
+    ):
+        self.experts = experts
+        self.default = default if default in experts else next(iter(experts))
+        self.latency_weight = latency_weight
+        self.queue_weight = queue_weight
+        self.load: Dict[str, ExpertLoad] = {name: ExpertLoad() for name in experts}
+        self._lock = threading.Lock()
+        self.coalesce = coalesce
+        # message being answered -> [expert, calls in flight]
+        self._answering: Dict[str, List] = {}
+        self.centroids: Dict[str, Dict[str, float]] = {}
+        for name, examples in seeds.items():
+            if name not in experts:
+                continue
+            total: Counter = Counter()
+            for ex in examples:
+                total.update(featurize(ex))
+            self.centroids[name] = _normalize(total)
+
+    def penalty(self, name: str) -> float:
+        """Queue depth, plus how much slower than its own median the expert is running now."""
+        load = self.load[name]
+        baseline = load.baseline_s
+        slowdown = math.log(load.latency_s / baseline) if load.latency_s and baseline else 0.0
+        return self.latency_weight * max(slowdown, 0.0) + self.queue_weight * load.inflight
+
+    def route(self, text: str, has_images: bool = False) -> RoutingDecision:
+        start = time.perf_counter()
+        joining = self._answering.get(text.strip()) if self.coalesce else None
+        if has_images and "llava" in self.experts:
+            decision = RoutingDecision(self.experts["llava"], reason="images")
+        elif joining is not None:
+            decision = RoutingDecision(self.experts[joining[0]], reason="coalesced")
+        else:
+            feats = featurize(text)
+            similarity = {name: _dot(feats, c) for name, c in self.centroids.items()}
+            if not similarity or max(similarity.values()) < MIN_SIMILARITY:
+                decision = RoutingDecision(self.experts[self.default], similarity, reason="default")
+            else:
+                scores = {name: s - self.penalty(name) for name, s in similarity.items()}
+                best = max(scores, key=scores.get)
+                reason = "classifier" if best == max(similarity, key=similarity.get) else "load"
+                decision = RoutingDecision(self.experts[best], scores, reason=reason)
+        decision.route_ms = (time.perf_counter() - start) * 1000
+        return decision
+
+    @contextmanager
+    def track(self, name: str, text: Optional[str] = None) -> Iterator[None]:
+        """Count a call as in flight and fold its latency into the expert's EWMA."""
+        load = self.load[name]
+        key = text.strip() if text is not None and self.coalesce else None
+        with self._lock:
+            load.inflight += 1
+            if key is not None:
+                self._answering.setdefault(key, [name, 0])[1] += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                load.inflight -= 1
+                if key is not None:
+                    entry = self._answering[key]
+                    entry[1] -= 1
+                    if not entry[1]:
+                        del self._answering[key]
+                load.calls += 1
+                load.recent.append(elapsed)
+                load.latency_s = elapsed if load.latency_s is None else (
+                    EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * load.latency_s)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {
+            name: {"model": self.experts[name].model, "latency_s": load.latency_s,
+                   "baseline_s": load.baseline_s, "inflight": load.inflight, "calls": load.calls}
+            for name, load in self.load.items()
+        }
+
+
+_router: Optional[ExpertRouter] = None
+
+
+def get_router() -> ExpertRouter:
+    global _router
+    if _router is None:
+        experts = [DeepseekExpert(), CodegemmaExpert(), QuickExpert(), LlavaExpert()]
+        _router = ExpertRouter({e.name: e for e in experts})
+    return _router
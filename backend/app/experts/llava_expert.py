@@ -1,8 +1,22 @@
 # backend/app/experts/llava_expert.py
-import requests
+from typing import List, Optional
+from experts.base import Expert
+from utils.config import MOE_EXPERT_MODELS
+from utils.ollama_pool import get_pool
 
 
-class LlavaExpert:
-    def run(self, prompt, context, **kwargs):
-        full = f"[Image Context]\n{context}\nUser:{prompt}\nAssistant:"
-        return requests.post("http://localhost:11434/api/generate", json={"model":"llava","prompt":full,**kwargs}).json().get("response","")
\ No newline at end of file
+class LlavaExpert(Expert):
+    name = "llava"
+    model = MOE_EXPERT_MODELS.get("llava", "llava")
+    template = "[Image Context]\n{context}\nUser:{prompt}\nAssistant:"
+
+    def run(self, prompt, context, images: Optional[List] = None, **kwargs):
+        if images:
+            # downsampled, deduplicated JPEG payloads (knowledge/images.py)
+            from knowledge.images import get_preparer
+            kwargs["images"] = get_preparer().payloads(images)
+        return super().run(prompt, context, **kwargs)
+
+    def caption(self, payload: str, prompt: str) -> str:
+        """Describe one prepared (base64 JPEG) image."""
+        return get_pool().generate(self.model, prompt, images=[payload]).get("response", "")
@@ -0,0 +1,10 @@
+# backend/app/experts/quick_expert.py
+from experts.base import Expert
+from utils.config import MOE_EXPERT_MODELS
+
+
+class QuickExpert(Expert):
+    """Small general model for short factual questions."""
+    name = "quick"
+    model = MOE_EXPERT_MODELS.get("quick", "llama3.2:3b")
+    template = "Context:\n{context}\nAnswer briefly.\nUser:{prompt}\nAssistant:"
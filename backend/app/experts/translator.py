@@ -1,10 +1,15 @@
 # backend/app/experts/translator.py
-import requests
+import logging
 import re
-import detect
+from utils.lazy import lazy_import
+from utils.ollama_pool import get_pool
+from utils.scheduler import QueueFullError
 
+logger = logging.getLogger(__name__)
+
+# Loaded on first detection rather than at import time
+langdetect = lazy_import("langdetect")
 
-OLLAMA_API = "http://localhost:11434/api/generate"
 P2E_MODEL = "Persian-to-English-Translation-mT5-V1-Q8_0-GGUF"
 E2P_MODEL = "English-to-Persian-Translation-mT5-V1-Q8_0-GGUF"
 
@@ -15,12 +20,14 @@ def translate_persian_to_english(text: str) -> str:
     try:
         # Here you would call your actual P2E service/function
         # This is a placeholder - implement your actual translation method
-        response = ollama.chat(model=P2E_MODEL, 
+        response = get_pool().chat(P2E_MODEL,
                               messages=[
                                   {"role": "system", "content": "You are an expert Persian to English translator. Translate the following Persian text to English."},
                                   {"role": "user", "content": text}
                               ])
         return response['message']['content']
+    except QueueFullError:
+        raise
     except Exception as e:
         logger.error(f"Translation P2E error: {str(e)}")
         # Return original text if translation fails
@@ -31,12 +38,14 @@ def translate_english_to_persian(text: str) -> str:
     try:
         # Here you would call your actual E2P service/function
         # This is a placeholder - implement your actual translation method
-        response = ollama.chat(model=E2P_MODEL, 
+        response = get_pool().chat(E2P_MODEL,
                               messages=[
                                   {"role": "system", "content": "You are an expert English to Persian translator. Translate the following English text to Persian."},
                                   {"role": "user", "content": text}
                               ])
         return response['message']['content']
+    except QueueFullError:
+        raise
     except Exception as e:
         logger.error(f"Translation E2P error: {str(e)}")
         # Return original text if translation fails
@@ -46,7 +55,7 @@ def detect_language(text: str) -> str:
     """Detect the language of input text"""
     try:
         # Persian language is detected as 'fa'
-        lang = detect(text)
+        lang = langdetect.detect(text)
         return lang
     except:
         # Default to English if detection fails
@@ -0,0 +1,140 @@
+# backend/app/knowledge/compaction.py
+"""
+Optional compaction of a space's FAISS index at build time.
+
+The pipeline builds an exact IndexFlatL2 (float32, full embedding width).
+When a space asks for it, that index is replaced by an IndexPreTransform:
+a PCA or random-rotation projection to `dim` dimensions, fitted on the
+space's own vectors, in front of a float16 or int8 ScalarQuantizer. The
+transform is stored inside index.faiss, so every search (including
+filtered searches and the reranker's reconstruction) applies it to queries
+without any change on the read path.
+
+Because compaction trades recall for memory, each build measures it: a
+sample of stored vectors is searched in both indexes (excluding the vector
+itself) and recall@k of the compact index against the exact one is written
+to compaction.json with the memory and per-query search time of both.
+"""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from utils.config import COMPACTION
+
+logger = logging.getLogger(__name__)
+
+COMPACTION_FILE = "compaction.json"
+METHODS = ("none", "pca", "random")
+QUANTIZERS = ("none", "fp16", "int8")
+
+
+@dataclass
+class CompactionSpec:
+    method: str = "none"      # projection: none | pca | random
+    dim: int = 256            # projected width
+    quantizer: str = "none"   # none | fp16 | int8
+    recall_k: int = 10
+    recall_queries: int = 200
+
+    @classmethod
+    def from_settings(cls, settings: Optional[Dict[str, Any]]) -> "CompactionSpec":
+        """Space settings ("compaction" in config.json) over the global default."""
+        merged = {**COMPACTION, **((settings or {}).get("compaction") or {})}
+        spec = cls(**{k: v for k, v in merged.items() if k in cls.__dataclass_fields__})
+        if spec.method not in METHODS or spec.quantizer not in QUANTIZERS:
+            raise ValueError(f"Unknown compaction {spec.method}/{spec.quantizer}")
+        return spec
+
+    @property
+    def enabled(self) -> bool:
+        return self.method != "none" or self.quantizer != "none"
+
+
+def build_compact_index(vectors, spec: CompactionSpec, seed: int = 1234):
+    """Train and fill the compact index for `vectors` (n x d float32)."""
+    import faiss
+
+    n, d = vectors.shape
+    dim = d
+    transform = None
+    if spec.method != "none" and spec.dim < d:
+        # PCA needs at least as many samples as output dimensions
+        dim = min(spec.dim, n) if spec.method == "pca" else spec.dim
+        if spec.method == "pca":
+            transform = faiss.PCAMatrix(d, dim)
+        else:
+            transform = faiss.RandomRotationMatrix(d, dim)
+            transform.init(seed)
+    if spec.quantizer == "none":
+        inner = faiss.IndexFlatL2(dim)
+    else:
+        qtype = faiss.ScalarQuantizer.QT_fp16 if spec.quantizer == "fp16" else faiss.ScalarQuantizer.QT_8bit
+        inner = faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_L2)
+    index = faiss.IndexPreTransform(transform, inner) if transform is not None else inner
+    index.train(vectors)
+    if spec.method == "pca" and transform is not None:
+        # the full d x d training matrix is serialised too, but only A and b are applied
+        transform.PCAMat.resize(0)
+    index.add(vectors)
+    return index
+
+
+def index_bytes(index) -> int:
+    import faiss
+
+    return len(faiss.serialize_index(index))
+
+
+def _out_dim(index) -> int:
+    import faiss
+
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexPreTransform):
+        return faiss.downcast_index(index.index).d
+    return index.d
+
+
+def recall_report(exact, compact, vectors, spec: CompactionSpec, seed: int = 0) -> Dict[str, Any]:
+    """recall@k of compact against exact for a sample of stored vectors used as queries."""
+    import numpy as np
+
+    n = len(vectors)
+    k = min(spec.recall_k, n - 1)
+    if k < 1:
+        return {"recall_at_k": None, "k": 0, "queries": 0}
+    rows = np.random.default_rng(seed).choice(n, min(spec.recall_queries, n), replace=False)
+    queries = vectors[rows]
+    timings = {}
+    results = {}
+    for name, index in (("exact", exact), ("compact", compact)):
+        start = time.perf_counter()
+        _, ids = index.search(queries, k + 1)
+        timings[name] = (time.perf_counter() - start) / len(rows) * 1000
+        # drop the query's own row so recall measures its neighbours
+        results[name] = [[i for i in row if i != r][:k] for row, r in zip(ids, rows)]
+    hits = sum(len(set(e) & set(c)) for e, c in zip(results["exact"], results["compact"]))
+    return {"recall_at_k": round(hits / (k * len(rows)), 4), "k": k, "queries": len(rows),
+            "exact_ms_per_query": round(timings["exact"], 4), "compact_ms_per_query": round(timings["compact"], 4)}
+
+
+def compact_store(db, spec: CompactionSpec) -> Optional[Dict[str, Any]]:
+    """Replace db.index (a flat index) with its compact version; return the report, or None if disabled."""
+    if not spec.enabled or db.index.ntotal == 0:
+        return None
+    exact = db.index
+    vectors = exact.reconstruct_n(0, exact.ntotal)
+    start = time.perf_counter()
+    compact = build_compact_index(vectors, spec)
+    fit_s = time.perf_counter() - start
+    report = {
+        "method": spec.method, "quantizer": spec.quantizer,
+        "dim_in": exact.d, "dim_out": _out_dim(compact),
+        "vectors": exact.ntotal, "fit_s": round(fit_s, 3),
+        "exact_bytes": index_bytes(exact), "compact_bytes": index_bytes(compact),
+    }
+    report["ratio"] = round(report["exact_bytes"] / report["compact_bytes"], 2)
+    report.update(recall_report(exact, compact, vectors, spec))
+    db.index = compact
+    logger.info(f"Compacted index {report['dim_in']}d -> {report['dim_out']}d {spec.quantizer}: "
+                f"{report['ratio']}x smaller, recall@{report['k']} {report['recall_at_k']}")
+    return report
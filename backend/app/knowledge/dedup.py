@@ -0,0 +1,216 @@
+# backend/app/knowledge/dedup.py
+"""
+Near-duplicate detection for ingestion.
+
+Revised copies of the same PDF or slide deck used to be embedded and
+indexed in full. Every chunk is now fingerprinted with a MinHash over its
+word shingles and looked up in an LSH table (banded signatures, so a
+lookup only compares against chunks sharing a band, which keeps a build
+roughly linear in the corpus size). A chunk whose estimated Jaccard
+similarity to an already indexed chunk reaches `threshold` is not embedded.
+In "link" mode its source is attached to the kept chunk (docstore metadata
+and filter bitmaps), so filtered searches on the copy still find it; in
+"skip" mode it is dropped. Exact repeats are caught by a hash before any
+MinHash work.
+
+A document's signature is the element-wise minimum of its chunks'
+signatures (the MinHash of the union of their shingles), so whole-file
+near-duplicates are reported at no extra cost.
+"""
+import hashlib
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from knowledge.filters import FIELDS
+from utils.config import DEDUP_MODE, DEDUP_THRESHOLD, DEDUP_NUM_PERM, DEDUP_SHINGLE
+
+DEDUP_FILE = "dedup.json"
+
+_WORD = re.compile(r"\w+")
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """(bands, rows) with bands * rows <= num_perm whose S-curve midpoint is closest to threshold."""
+    best = (1, num_perm)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if abs((1 / bands) ** (1 / rows) - threshold) < abs((1 / best[0]) ** (1 / best[1]) - threshold):
+            best = (bands, rows)
+    return best
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = DEDUP_NUM_PERM, shingle: int = DEDUP_SHINGLE, seed: int = 1):
+        import numpy as np
+
+        rng = np.random.default_rng(seed)
+        # a < 2**31 and hashes < 2**32, so a * h + b fits in uint64 before the modulo
+        self.a = rng.integers(1, 1 << 31, num_perm, dtype="uint64")
+        self.b = rng.integers(0, 1 << 31, num_perm, dtype="uint64")
+        self.num_perm = num_perm
+        self.shingle = shingle
+
+    def shingles(self, text: str) -> List[bytes]:
+        words = _WORD.findall(text.lower())
+        n = self.shingle
+        if len(words) <= n:
+            return [" ".join(words).encode()] if words else []
+        return [" ".join(words[i:i + n]).encode() for i in range(len(words) - n + 1)]
+
+    def signature(self, text: str):
+        import numpy as np
+
+        hashes = np.fromiter((zlib.crc32(s) for s in self.shingles(text)), dtype="uint64")
+        if not len(hashes):
+            return np.full(self.num_perm, _MAX_HASH, dtype="uint64")
+        return (((self.a[:, None] * hashes[None, :] + self.b[:, None]) % _PRIME) & _MAX_HASH).min(axis=1)
+
+
+def similarity(a, b) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float((a == b).mean())
+
+
+class LSHIndex:
+    def __init__(self, threshold: float, num_perm: int):
+        self.threshold = threshold
+        # candidates at the S-curve midpoint are only found half the time, so
+        # bucket a little below the threshold and verify with the full signature
+        self.bands, self.rows = lsh_params(max(threshold - 0.1, 0.05), num_perm)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self._signatures: List[Any] = []
+        self._keys: List[Any] = []
+
+    def _band_keys(self, sig) -> List[bytes]:
+        r = self.rows
+        return [sig[i * r:(i + 1) * r].tobytes() for i in range(self.bands)]
+
+    def query(self, sig) -> Optional[Tuple[Any, float]]:
+        """Best indexed (key, similarity) at or above the threshold, or None."""
+        seen = set()
+        best = None
+        for bucket, band in zip(self._buckets, self._band_keys(sig)):
+            for i in bucket.get(band, ()):
+                if i in seen:
+                    continue
+                seen.add(i)
+                s = similarity(sig, self._signatures[i])
+                if s >= self.threshold and (best is None or s > best[1]):
+                    best = (self._keys[i], s)
+        return best
+
+    def add(self, key: Any, sig) -> None:
+        i = len(self._signatures)
+        self._signatures.append(sig)
+        self._keys.append(key)
+        for bucket, band in zip(self._buckets, self._band_keys(sig)):
+            bucket.setdefault(band, []).append(i)
+
+
+@dataclass
+class DedupReport:
+    mode: str = DEDUP_MODE
+    threshold: float = DEDUP_THRESHOLD
+    chunks_seen: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    chars_seen: int = 0
+    chars_skipped: int = 0
+    # (document, earlier document it nearly duplicates, estimated similarity)
+    duplicate_documents: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def skipped(self) -> int:
+        return self.exact_duplicates + self.near_duplicates
+
+    def as_dict(self) -> Dict:
+        return {**self.__dict__, "skipped": self.skipped,
+                "skipped_share": round(self.skipped / self.chunks_seen, 4) if self.chunks_seen else 0.0}
+
+    def summary(self) -> str:
+        share = self.skipped / self.chunks_seen if self.chunks_seen else 0.0
+        return (f"{self.skipped}/{self.chunks_seen} chunks skipped as duplicates ({share:.1%}; "
+                f"{self.exact_duplicates} exact, {self.near_duplicates} near), "
+                f"{self.chars_skipped / 1e6:.2f} MB of text not embedded, "
+                f"{len(self.duplicate_documents)} near-duplicate documents")
+
+
+class Deduplicator:
+    """
+    Decides, chunk by chunk and in ingestion order, which chunks are new.
+
+    Kept chunks are numbered in the order they are returned, which is the
+    order the pipeline adds them to FAISS, so `links` can name the row a
+    skipped chunk duplicates.
+    """
+
+    def __init__(self, mode: str = DEDUP_MODE, threshold: float = DEDUP_THRESHOLD,
+                 num_perm: int = DEDUP_NUM_PERM, shingle: int = DEDUP_SHINGLE):
+        self.mode = mode
+        self.hasher = MinHasher(num_perm, shingle)
+        self.chunks = LSHIndex(threshold, num_perm)
+        self.documents = LSHIndex(threshold, num_perm)
+        self.exact: Dict[str, int] = {}
+        self.rows = 0
+        # (kept row, metadata of the skipped chunk); applied once the index is built
+        self.links: List[Tuple[int, Dict[str, Any]]] = []
+        self.report = DedupReport(mode, threshold)
+        self._doc: Optional[str] = None
+        self._doc_sig = None
+
+    def keep(self, text: str, metadata: Dict[str, Any]) -> bool:
+        """True if the chunk should be embedded; False if it duplicates an earlier one."""
+        import numpy as np
+
+        self.report.chunks_seen += 1
+        self.report.chars_seen += len(text)
+        digest = hashlib.sha1(" ".join(text.split()).encode("utf-8")).hexdigest()
+        row = self.exact.get(digest)
+        sig = None
+        if row is None:
+            sig = self.hasher.signature(text)
+            found = self.chunks.query(sig)
+            if found is not None:
+                row = found[0]
+                self.report.near_duplicates += 1
+        else:
+            self.report.exact_duplicates += 1
+        if self._doc is not None:
+            if sig is None:
+                sig = self.hasher.signature(text)
+            self._doc_sig = sig if self._doc_sig is None else np.minimum(self._doc_sig, sig)
+
+        if row is not None:
+            self.report.chars_skipped += len(text)
+            if self.mode == "link":
+                self.links.append((row, metadata))
+            return False
+        row = self.rows
+        self.rows += 1
+        self.exact[digest] = row
+        self.chunks.add(row, sig)
+        return True
+
+    def start_document(self, name: str) -> None:
+        self._doc, self._doc_sig = name, None
+
+    def end_document(self) -> None:
+        if self._doc is not None and self._doc_sig is not None:
+            found = self.documents.query(self._doc_sig)
+            if found is not None:
+                self.report.duplicate_documents.append(
+                    {"document": self._doc, "duplicate_of": found[0], "similarity": round(found[1], 3)})
+            self.documents.add(self._doc, self._doc_sig)
+        self._doc, self._doc_sig = None, None
+
+    def apply_links(self, db, metadata_index) -> None:
+        """Attach skipped chunks' sources to the rows they duplicate."""
+        for row, metadata in self.links:
+            doc = db.docstore.search(db.index_to_docstore_id[row])
+            # with the filter fields, so MetadataIndex.from_docstore can rebuild the link
+            doc.metadata.setdefault("duplicates", []).append(
+                {k: metadata[k] for k in ("chunk", *FIELDS) if k in metadata})
+            metadata_index.link(row, metadata)
@@ -0,0 +1,166 @@
+# backend/app/knowledge/filters.py
+"""
+Metadata filters for vector search.
+
+At ingest time every chunk's source path, file type, algorithm names and
+upload date are recorded against its FAISS row id. Chunks of one file are
+added consecutively, so each value's ids are stored as runs
+([start, length] pairs) in filters.json next to the index. At search time
+the runs are turned into Python-int bitmaps (bit i = row i): values of one
+field are OR-ed, fields are AND-ed, and the result is handed to FAISS as
+an IDSelectorBitmap in the search parameters. The filter is therefore
+applied inside the vector search instead of over-fetching and discarding
+hits afterwards.
+"""
+import bisect
+import json
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+FIELDS = ("source", "file_type", "algorithms", "date")
+FILTERS_FILE = "filters.json"
+
+Runs = List[List[int]]
+
+
+@dataclass
+class SearchFilter:
+    source_prefix: Optional[str] = None
+    file_types: List[str] = field(default_factory=list)
+    algorithms: List[str] = field(default_factory=list)
+    date_from: Optional[str] = None  # ISO dates, inclusive
+    date_to: Optional[str] = None
+
+    def is_empty(self) -> bool:
+        return not (self.source_prefix or self.file_types or self.algorithms or self.date_from or self.date_to)
+
+
+def _runs_to_int(runs: Runs) -> int:
+    bits = 0
+    for start, length in runs:
+        bits |= ((1 << length) - 1) << start
+    return bits
+
+
+class MetadataIndex:
+    def __init__(self):
+        self.size = 0
+        # field -> value -> runs of row ids
+        self.runs: Dict[str, Dict[str, Runs]] = {f: {} for f in FIELDS}
+        self._bitmaps: Dict[tuple, int] = {}
+        self._sorted: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    # --- Building ---
+    def add(self, metadatas: Iterable[Dict[str, Any]]) -> None:
+        """Record metadata for the next rows, in the order they were added to FAISS."""
+        for metadata in metadatas:
+            i = self.size
+            for name in FIELDS:
+                values = metadata.get(name)
+                if values is None:
+                    continue
+                for value in (values if isinstance(values, (list, tuple, set)) else [values]):
+                    runs = self.runs[name].setdefault(str(value), [])
+                    if runs and runs[-1][0] + runs[-1][1] == i:
+                        runs[-1][1] += 1
+                    else:
+                        runs.append([i, 1])
+            self.size += 1
+        self._bitmaps.clear()
+        self._sorted.clear()
+
+    def link(self, row: int, metadata: Dict[str, Any]) -> None:
+        """Make an existing row also match metadata's values (a near-duplicate chunk that was not indexed)."""
+        for name in FIELDS:
+            values = metadata.get(name)
+            if values is None:
+                continue
+            for value in (values if isinstance(values, (list, tuple, set)) else [values]):
+                runs = self.runs[name].setdefault(str(value), [])
+                if not any(start <= row < start + length for start, length in runs):
+                    runs.append([row, 1])
+        self._bitmaps.clear()
+        self._sorted.clear()
+
+    @classmethod
+    def from_docstore(cls, db) -> "MetadataIndex":
+        """Rebuild from a loaded LangChain FAISS store (indexes saved before filters existed)."""
+        index = cls()
+        metadatas = [db.docstore.search(db.index_to_docstore_id[i]).metadata for i in range(db.index.ntotal)]
+        index.add(metadatas)
+        for i, metadata in enumerate(metadatas):
+            # near-duplicate chunks folded into this row at ingest (knowledge/dedup.py)
+            for duplicate in metadata.get("duplicates", ()):
+                index.link(i, duplicate)
+        return index
+
+    def save(self, index_dir: Path) -> None:
+        (Path(index_dir) / FILTERS_FILE).write_text(json.dumps({"size": self.size, "runs": self.runs}))
+
+    @classmethod
+    def load(cls, index_dir: Path) -> Optional["MetadataIndex"]:
+        path = Path(index_dir) / FILTERS_FILE
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text())
+        index = cls()
+        index.size = data["size"]
+        index.runs.update(data["runs"])
+        return index
+
+    # --- Querying ---
+    def bitmap(self, name: str, value: str) -> int:
+        key = (name, value)
+        with self._lock:
+            bits = self._bitmaps.get(key)
+            if bits is None:
+                bits = self._bitmaps[key] = _runs_to_int(self.runs[name].get(value, []))
+            return bits
+
+    def values(self, name: str) -> List[str]:
+        with self._lock:
+            if name not in self._sorted:
+                self._sorted[name] = sorted(self.runs[name])
+            return self._sorted[name]
+
+    def _any(self, name: str, values: Iterable[str]) -> int:
+        bits = 0
+        for v in values:
+            bits |= self.bitmap(name, v)
+        return bits
+
+    def select(self, flt: SearchFilter) -> Optional[int]:
+        """Bitmap of rows matching every condition; None means "no filter"."""
+        if flt.is_empty():
+            return None
+        bits = (1 << self.size) - 1
+        if flt.source_prefix:
+            sources = self.values("source")
+            lo = bisect.bisect_left(sources, flt.source_prefix)
+            hi = bisect.bisect_left(sources, flt.source_prefix + "\uffff")
+            bits &= self._any("source", sources[lo:hi])
+        if flt.file_types:
+            bits &= self._any("file_type", [t.lower().lstrip(".") for t in flt.file_types])
+        if flt.algorithms:
+            bits &= self._any("algorithms", flt.algorithms)
+        if flt.date_from or flt.date_to:
+            dates = self.values("date")
+            lo = bisect.bisect_left(dates, flt.date_from) if flt.date_from else 0
+            hi = bisect.bisect_right(dates, flt.date_to) if flt.date_to else len(dates)
+            bits &= self._any("date", dates[lo:hi])
+        return bits
+
+    def search_params(self, bits: int):
+        """FAISS SearchParameters restricting the search to the rows set in `bits`."""
+        import faiss
+        import numpy as np
+
+        packed = np.frombuffer(bits.to_bytes((self.size + 7) // 8 or 1, "little"), dtype="uint8").copy()
+        selector = faiss.IDSelectorBitmap(len(packed), faiss.swig_ptr(packed))
+        params = faiss.SearchParameters(sel=selector)
+        # the selector only points at the array; keep both alive as long as params
+        params._refs = (packed, selector)
+        return params
@@ -0,0 +1,19 @@
+# backend/app/knowledge/formats
+# Format handlers for knowledge/loader.py. Each module may import heavyweight
+# parsers at module level; the loader registry imports them on first use.
+# Handlers are generators yielding Segments (a page, slide, section or row
+# batch) so a file never has to be held in memory as a single string.
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+# Upper bound for a segment cut from free-flowing text (txt/md/docx sections)
+SEGMENT_MAX_CHARS = 20000
+
+
+@dataclass
+class Segment:
+    text: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    # encoded pictures on this page/slide (or the file itself), captioned by
+    # the ingestion pipeline when images.caption is on
+    images: List[bytes] = field(default_factory=list)
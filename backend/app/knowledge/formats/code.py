@@ -0,0 +1,97 @@
+# backend/app/knowledge/formats/code.py
+"""
+Source files split at definition boundaries.
+
+Python is parsed with the standard library's ast: every top-level function
+and class becomes one segment (decorators included), runs of module-level
+code between them (imports, constants) are grouped into "module" segments,
+and a class larger than CODE_CHUNK_CHARS is split into its header and one
+segment per method, each prefixed with the class line. Segments record the
+names they define in metadata["symbols"] ("Class", "Class.method",
+"CONSTANT"), which the pipeline turns into the exact-match symbol index
+(knowledge/symbols.py), and are marked "prechunked" so the text chunker
+does not cut a definition in half. A definition longer than
+CODE_CHUNK_CHARS on its own is left to the chunker. Files that do not parse
+fall back to plain text sections.
+"""
+import ast
+from pathlib import Path
+from typing import Iterator, List, Optional
+from knowledge.formats import Segment
+from utils.config import CODE_CHUNK_CHARS
+
+
+def _start(node: ast.AST) -> int:
+    decorators = getattr(node, "decorator_list", [])
+    return min([node.lineno] + [d.lineno for d in decorators])
+
+
+def _assigned_names(node: ast.AST) -> List[str]:
+    targets = []
+    if isinstance(node, ast.Assign):
+        targets = node.targets
+    elif isinstance(node, (ast.AnnAssign, ast.AugAssign)):
+        targets = [node.target]
+    return [t.id for t in targets if isinstance(t, ast.Name)]
+
+
+def _segment(lines: List[str], start: int, end: int, symbols: List[str], kind: str,
+             prefix: Optional[str] = None) -> Segment:
+    text = "".join(lines[start - 1:end])
+    if prefix:
+        text = prefix + text
+    metadata = {"language": "python", "kind": kind, "symbols": symbols, "line": start, "end_line": end}
+    if len(text) <= CODE_CHUNK_CHARS:
+        metadata["prechunked"] = True
+    return Segment(text, metadata)
+
+
+def _class_segments(lines: List[str], node: ast.ClassDef) -> Iterator[Segment]:
+    start, end = _start(node), node.end_lineno
+    methods = [n for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    symbols = [node.name] + [f"{node.name}.{m.name}" for m in methods]
+    if sum(len(line) for line in lines[start - 1:end]) <= CODE_CHUNK_CHARS or not methods:
+        yield _segment(lines, start, end, symbols, "class")
+        return
+    # header: decorators, class line, docstring and class attributes up to the first method
+    yield _segment(lines, start, _start(methods[0]) - 1, [node.name], "class")
+    header = lines[node.lineno - 1]
+    for i, method in enumerate(methods):
+        m_end = _start(methods[i + 1]) - 1 if i + 1 < len(methods) else end
+        yield _segment(lines, _start(method), m_end, [f"{node.name}.{method.name}"], "method", prefix=header)
+
+
+def iter_python_segments(path: Path) -> Iterator[Segment]:
+    source = Path(path).read_text(encoding="utf-8", errors="ignore")
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        from knowledge.formats.text import iter_text_segments
+        yield from iter_text_segments(Path(path))
+        return
+    lines = source.splitlines(keepends=True)
+
+    # module-level statements between definitions, flushed before each definition
+    pending_start, pending_end, pending_symbols = None, 0, []
+
+    def flush() -> Iterator[Segment]:
+        nonlocal pending_start, pending_symbols
+        if pending_start is not None and "".join(lines[pending_start - 1:pending_end]).strip():
+            yield _segment(lines, pending_start, pending_end, pending_symbols, "module")
+        pending_start, pending_symbols = None, []
+
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            yield from flush()
+            if isinstance(node, ast.ClassDef):
+                yield from _class_segments(lines, node)
+            else:
+                yield _segment(lines, _start(node), node.end_lineno, [node.name], "function")
+            continue
+        start = node.lineno if pending_start is None else pending_start
+        if pending_start is not None and sum(len(l) for l in lines[start - 1:node.end_lineno]) > CODE_CHUNK_CHARS:
+            yield from flush()
+            start = node.lineno
+        pending_start, pending_end = start, node.end_lineno
+        pending_symbols += _assigned_names(node)
+    yield from flush()
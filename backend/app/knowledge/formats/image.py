@@ -0,0 +1,9 @@
+# backend/app/knowledge/formats/image.py
+from pathlib import Path
+from typing import Iterator
+from knowledge.formats import Segment
+
+
+def iter_image_segments(path: Path) -> Iterator[Segment]:
+    """An image file is one segment whose text is its caption (added by the pipeline)."""
+    yield Segment("", {"image": True}, [Path(path).read_bytes()])
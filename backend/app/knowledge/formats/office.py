@@ -0,0 +1,39 @@
+# backend/app/knowledge/formats/office.py
+from pathlib import Path
+from typing import Iterator, List
+from docx import Document as DocxDocument  # python-docx for .docx
+from pptx import Presentation  # python-pptx for .pptx slides
+from knowledge.formats import Segment, SEGMENT_MAX_CHARS
+
+
+def iter_docx_segments(path: Path) -> Iterator[Segment]:
+    """Yield one segment per heading-delimited section, then one per table."""
+    doc = DocxDocument(str(path))
+    texts: List[str] = []
+    size = 0
+    section = 0
+    for p in doc.paragraphs:
+        if not p.text:
+            continue
+        is_heading = p.style is not None and p.style.name.startswith("Heading")
+        if texts and (is_heading or size + len(p.text) > SEGMENT_MAX_CHARS):
+            yield Segment("\n".join(texts), {"section": section})
+            texts, size = [], 0
+            section += 1
+        texts.append(p.text)
+        size += len(p.text)
+    if texts:
+        yield Segment("\n".join(texts), {"section": section})
+    for number, table in enumerate(doc.tables):
+        rows = [", ".join(cell.text for cell in row.cells) for row in table.rows]
+        if rows:
+            yield Segment("\n".join(rows), {"table": number})
+
+
+def iter_pptx_segments(path: Path) -> Iterator[Segment]:
+    """Yield one segment per slide."""
+    prs = Presentation(str(path))
+    for number, slide in enumerate(prs.slides, start=1):
+        texts = [shape.text for shape in slide.shapes if hasattr(shape, "text") and shape.text]
+        if texts:
+            yield Segment("\n".join(texts), {"slide": number})
@@ -0,0 +1,39 @@
+# backend/app/knowledge/formats/pdf.py
+from pathlib import Path
+from typing import Iterator, List
+from PIL import Image
+import fitz  # PyMuPDF for PDF
+import pytesseract  # OCR for scanned PDFs
+from knowledge.formats import Segment
+from utils.config import IMAGES_CAPTION, IMAGES_MIN_SIDE, IMAGES_OCR_DPI
+from utils.metrics import span
+
+
+def _page_images(pdf, page) -> List[bytes]:
+    """Embedded pictures of a page, skipping ones too small to caption."""
+    images = []
+    for info in page.get_images(full=True):
+        xref, width, height = info[0], info[2], info[3]
+        if min(width, height) < IMAGES_MIN_SIDE:
+            continue
+        try:
+            images.append(pdf.extract_image(xref)["image"])
+        except Exception:  # unsupported colourspace / broken stream
+            continue
+    return images
+
+
+def iter_pdf_segments(path: Path) -> Iterator[Segment]:
+    """Yield one segment per page, OCR-ing pages that have no text layer."""
+    with fitz.open(str(path)) as pdf:
+        for number, page in enumerate(pdf, start=1):
+            txt = page.get_text().strip()
+            if txt:
+                images = _page_images(pdf, page) if IMAGES_CAPTION else []
+                yield Segment(txt, {"page": number}, images)
+            else:
+                with span("ingest.ocr"):
+                    pix = page.get_pixmap(dpi=IMAGES_OCR_DPI)
+                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+                    ocr = pytesseract.image_to_string(img)
+                yield Segment(ocr, {"page": number, "ocr": True})
@@ -0,0 +1,160 @@
+# backend/app/knowledge/formats/tabular.py
+"""
+Row-batched ingestion for delimited files (CSV/TSV).
+
+Rows are streamed with the csv module, the column schema is inferred once
+from a sample at the top of the file, and consecutive rows are rendered
+into header-aware chunks ("column: value" per row) bounded by row count and
+CHUNK_SIZE. Each chunk records its 1-based data row range so a search hit
+points back to specific rows.
+
+The first row is taken as the header unless it is clearly data: some
+column is typed (int, float, date, bool) in the sample and the first row's
+value fits that type in every such column. A file whose columns are all
+text therefore keeps its header, where csv.Sniffer.has_header would call
+it headerless. `ingestion.csv_header` can force either answer.
+"""
+import csv
+import re
+from itertools import islice
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from knowledge.formats import Segment
+from utils.config import CHUNK_SIZE, CSV_HEADER, CSV_ROWS_PER_CHUNK
+
+SNIFF_BYTES = 64 * 1024
+SCHEMA_SAMPLE_ROWS = 200
+
+_INT = re.compile(r"^[+-]?\d+$")
+_FLOAT = re.compile(r"^[+-]?(\d+\.\d*|\.\d+|\d+)([eE][+-]?\d+)?$")
+_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2})?)?")
+_BOOL = {"true", "false", "yes", "no"}
+
+
+def _value_type(value: str) -> Optional[str]:
+    v = value.strip()
+    if not v:
+        return None
+    if _INT.match(v):
+        return "int"
+    if _FLOAT.match(v):
+        return "float"
+    if _DATE.match(v):
+        return "date"
+    if v.lower() in _BOOL:
+        return "bool"
+    return "text"
+
+
+def infer_schema(header: List[str], sample: List[List[str]]) -> List[Tuple[str, str]]:
+    """Return [(column, type)] using the narrowest type that fits every sampled value."""
+    schema = []
+    for i, name in enumerate(header):
+        types = {_value_type(row[i]) for row in sample if i < len(row)} - {None}
+        if not types:
+            col_type = "text"
+        elif types <= {"int"}:
+            col_type = "int"
+        elif types <= {"int", "float"}:
+            col_type = "float"
+        elif len(types) == 1:
+            col_type = types.pop()
+        else:
+            col_type = "text"
+        schema.append((name, col_type))
+    return schema
+
+
+def _open_reader(path: Path):
+    f = path.open(newline="", encoding="utf-8", errors="ignore")
+    sample = f.read(SNIFF_BYTES)
+    f.seek(0)
+    sniffer = csv.Sniffer()
+    try:
+        dialect = sniffer.sniff(sample, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel_tab if path.suffix.lower() == ".tsv" else csv.excel
+    return f, csv.reader(f, dialect)
+
+
+def has_header(first: List[str], sample: List[List[str]], mode: str = CSV_HEADER) -> bool:
+    """Whether the first row names the columns (see the module docstring)."""
+    if mode in ("always", "true", "yes"):
+        return True
+    if mode in ("never", "false", "no"):
+        return False
+    if not sample:
+        # nothing to compare with: a lone row of names is a header, a lone row with numbers is data
+        return all(_value_type(v) in (None, "text") for v in first)
+    typed = [(i, col_type) for i, (_, col_type) in enumerate(infer_schema([""] * len(first), sample))
+             if col_type != "text"]
+    if not typed:
+        return True
+    for i, col_type in typed:
+        value_type = _value_type(first[i])
+        if value_type is None:
+            continue
+        if value_type != col_type and not (col_type == "float" and value_type == "int"):
+            return True
+    return False
+
+
+def render_rows(schema: List[Tuple[str, str]], rows: List[Tuple[int, List[str]]]) -> str:
+    header = "Columns: " + ", ".join(f"{name} ({col_type})" for name, col_type in schema)
+    lines = [header]
+    for number, row in rows:
+        cells = [f"{name}: {value}" for (name, _), value in zip(schema, row) if value.strip()]
+        lines.append(f"Row {number}: " + "; ".join(cells))
+    return "\n".join(lines)
+
+
+def iter_table_segments(path: Path, rows_per_chunk: int = CSV_ROWS_PER_CHUNK,
+                        max_chars: int = CHUNK_SIZE) -> Iterator[Segment]:
+    f, reader = _open_reader(path)
+    with f:
+        first = next(reader, None)
+        if first is None:
+            return
+        sample = list(islice(reader, SCHEMA_SAMPLE_ROWS))
+        if has_header(first, sample):
+            header = [h.strip() or f"column_{i + 1}" for i, h in enumerate(first)]
+        else:
+            header = [f"column_{i + 1}" for i in range(len(first))]
+            sample.insert(0, first)
+        width = max([len(header)] + [len(r) for r in sample])
+        header += [f"column_{i + 1}" for i in range(len(header), width)]
+        schema = infer_schema(header, sample)
+        columns = [name for name, _ in schema]
+
+        def rows() -> Iterator[Tuple[int, List[str]]]:
+            number = 0
+            for row in sample:
+                number += 1
+                yield number, row
+            for row in reader:
+                number += 1
+                yield number, row
+
+        batch: List[Tuple[int, List[str]]] = []
+        size = 0
+        for number, row in rows():
+            if not any(cell.strip() for cell in row):
+                continue
+            row_size = sum(len(c) for c in row) + sum(len(c) for c in columns) + 4 * len(row)
+            if batch and (len(batch) >= rows_per_chunk or size + row_size > max_chars):
+                yield _segment(schema, columns, batch)
+                batch, size = [], 0
+            batch.append((number, row))
+            size += row_size
+        if batch:
+            yield _segment(schema, columns, batch)
+
+
+def _segment(schema, columns, batch) -> Segment:
+    return Segment(render_rows(schema, batch), {
+        "row_start": batch[0][0],
+        "row_end": batch[-1][0],
+        "columns": columns,
+        # already sized for embedding; the pipeline must not re-split it
+        "prechunked": True,
+    })
@@ -0,0 +1,24 @@
+# backend/app/knowledge/formats/text.py
+from pathlib import Path
+from typing import Iterator, List
+from knowledge.formats import Segment, SEGMENT_MAX_CHARS
+
+
+def iter_text_segments(path: Path) -> Iterator[Segment]:
+    """Yield sections split at Markdown headings, capped at SEGMENT_MAX_CHARS."""
+    lines: List[str] = []
+    size = 0
+    section = 0
+    start_line = 1
+    with path.open(encoding="utf-8", errors="ignore") as f:
+        for lineno, line in enumerate(f, start=1):
+            if lines and (line.startswith("#") or size + len(line) > SEGMENT_MAX_CHARS):
+                yield Segment("".join(lines), {"section": section, "line": start_line})
+                lines, size = [], 0
+                section += 1
+                start_line = lineno
+            lines.append(line)
+            size += len(line)
+    if lines:
+        yield Segment("".join(lines), {"section": section, "line": start_line})
+
@@ -0,0 +1,285 @@
+# backend/app/knowledge/gazetteer.py
+"""
+Algorithm names found in one pass over a document.
+
+Text is tokenised once (words, hyphenated names like "Bellman-Ford", "A*",
+possessives folded: "Dijkstra's" -> "dijkstra") and the tokens are fed to
+an Aho-Corasick automaton over a vocabulary of algorithm names, so every
+known name -- one token or several ("Floyd Warshall") -- is found in the
+same pass whatever the vocabulary size. The patterns extract_algorithms
+used to run as three separate regex passes are evaluated on the same token
+stream as context rules: "<name> algorithm", "Algorithm: <name>",
+"procedure/method <name>". Names they propose are filtered through a
+stoplist, which drops the noise the regexes returned ("the algorithm",
+"this method", "methods" -> "s").
+
+The vocabulary is the curated list below (plus ALGORITHMS_VOCABULARY_PATH,
+one name per line) and names learned from the corpus: a context-rule name
+seen ALGORITHMS_LEARN_MIN_COUNT times joins the automaton, so later
+mentions without "algorithm" next to them are found too. Learned names are
+saved as algorithms.json in the index generation and seed the next build.
+Only ingestion learns: the shared extractor behind extract_algorithms
+(get_extractor) is built with learn=False, so user queries never grow the
+automaton or touch the counts.
+
+Results are stored in chunk metadata["algorithms"] at ingest; queries read
+them from there instead of extracting again.
+"""
+import json
+import logging
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils.config import ALGORITHMS_LEARN_MIN_COUNT, ALGORITHMS_VOCABULARY_PATH
+
+logger = logging.getLogger(__name__)
+
+ALGORITHMS_FILE = "algorithms.json"
+
+CURATED = (
+    # graphs
+    "Dijkstra", "Bellman-Ford", "Floyd-Warshall", "A*", "A-star", "Johnson", "Kruskal", "Prim",
+    "Boruvka", "Tarjan", "Kosaraju", "Ford-Fulkerson", "Edmonds-Karp", "Dinic", "Hopcroft-Karp",
+    "Hungarian", "Kahn", "Breadth-First Search", "Depth-First Search", "BFS", "DFS",
+    "Topological Sort", "Union-Find", "PageRank",
+    # sorting and selection
+    "Quicksort", "Mergesort", "Merge Sort", "Heapsort", "Heap Sort", "Insertion Sort", "Selection Sort",
+    "Bubble Sort", "Counting Sort", "Radix Sort", "Bucket Sort", "Shell Sort", "Timsort", "Introsort",
+    "Quickselect", "Median of Medians", "Binary Search",
+    # strings
+    "KMP", "Knuth-Morris-Pratt", "Rabin-Karp", "Boyer-Moore", "Aho-Corasick", "Z-Algorithm",
+    "Manacher", "Levenshtein", "Needleman-Wunsch", "Smith-Waterman", "Huffman", "LZ77", "LZW",
+    # numeric, geometry, optimisation, learning
+    "Euclid", "Sieve of Eratosthenes", "Miller-Rabin", "Karatsuba", "Strassen", "FFT",
+    "Fast Fourier Transform", "Gaussian Elimination", "Newton-Raphson", "Simplex", "Graham Scan",
+    "Jarvis March", "Gradient Descent", "Stochastic Gradient Descent", "Backpropagation",
+    "K-Means", "K-Nearest Neighbors", "Expectation-Maximization", "Viterbi", "Baum-Welch",
+    "Monte Carlo", "Metropolis-Hastings", "Simulated Annealing", "Minimax", "Alpha-Beta Pruning",
+    "RSA", "Diffie-Hellman", "AES", "SHA-256", "Bloom Filter", "MinHash", "Paxos", "Raft",
+)
+
+# words the context rules pick up that are not names
+STOPWORDS = frozenset("""
+a an the this that these those its it their our your my his her each every any some all both
+same such other another following above below previous next new old first second last final
+main basic simple naive standard classic classical general generic common usual typical
+proposed improved modified original given above-mentioned well-known famous popular known
+good better best efficient fast faster slow optimal approximate approximation exact heuristic
+greedy recursive iterative parallel distributed online offline randomized deterministic
+sorting searching search sort learning training clustering encryption compression hashing
+which what whose one two three is are was were be been being has have had do does did
+and or but not no of in on at by for with from to as into using used use via than then
+can could should would will may might must
+algorithm algorithms procedure procedures method methods technique approach step steps
+""".split())
+
+_TOKEN = re.compile(r"[A-Za-z0-9][\w\-]*\*?(?:['’]s\b)?")
+# the same over lowercased text, normalised form (possessive dropped) in group 1
+_LOWER_TOKEN = re.compile(r"([a-z0-9][\w\-]*\*?)(?:['’]s\b)?")
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+_GAP_NAME_AFTER = frozenset(" \t\r\n:")
+
+# context rules: trigger token -> where the proposed name sits relative to it
+_NAME_BEFORE = frozenset(("algorithm", "algorithms"))
+_NAME_AFTER = frozenset(("algorithm", "procedure", "method"))
+
+
+def _norm(token: str) -> str:
+    token = token.lower()
+    if token.endswith(("'s", "’s")):
+        token = token[:-2]
+    return token
+
+
+def _keys(name: str) -> List[Tuple[str, ...]]:
+    """Token sequences a name is matched as: "Floyd-Warshall" also as "Floyd Warshall" and back."""
+    variants = {name}
+    if not any(_norm(part) in STOPWORDS for part in name.split("-")):
+        # not for "A-star": "a star" is mostly prose
+        variants.add(name.replace("-", " "))
+    if " " in name:
+        variants.add(name.replace(" ", "-"))
+    keys = []
+    for v in variants:
+        tokens = tuple(_norm(t) for t in _TOKEN.findall(v))
+        if tokens and tokens not in keys:
+            keys.append(tokens)
+    return keys
+
+
+class AlgorithmExtractor:
+    def __init__(self, vocabulary: Iterable[str] = CURATED, learned: Optional[Dict[str, int]] = None,
+                 learn_min_count: int = ALGORITHMS_LEARN_MIN_COUNT, learn: bool = True):
+        self.learn_min_count = learn_min_count
+        # False: context-rule names are returned but never counted or added (query time)
+        self.learn = learn
+        # token-level automaton: goto transitions, failure links, names ending at each state
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._own: List[Tuple[str, ...]] = [()]
+        self._out: List[Tuple[str, ...]] = [()]
+        self._names: Dict[Tuple[str, ...], str] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        # context-rule names -> mentions seen, and their spelling when first seen
+        self.counts: Counter = Counter()
+        self._spelling: Dict[str, str] = {}
+        self.learned: Dict[str, int] = {}
+        for name in vocabulary:
+            self.add(name)
+        for name, count in (learned or {}).items():
+            self.counts[_norm(name)] += count
+            self._learn(name)
+
+    @classmethod
+    def from_store(cls, index_dir: Optional[Path], learn: bool = True) -> "AlgorithmExtractor":
+        """Curated vocabulary plus the configured file and the names the last build learned."""
+        vocabulary = list(CURATED)
+        if ALGORITHMS_VOCABULARY_PATH:
+            path = Path(ALGORITHMS_VOCABULARY_PATH)
+            if path.exists():
+                vocabulary += [l.strip() for l in path.read_text(encoding="utf-8").splitlines()
+                               if l.strip() and not l.startswith("#")]
+            else:
+                logger.warning(f"Algorithm vocabulary {path} not found")
+        learned = None
+        if index_dir is not None and (Path(index_dir) / ALGORITHMS_FILE).exists():
+            learned = json.loads((Path(index_dir) / ALGORITHMS_FILE).read_text()).get("learned")
+        return cls(vocabulary, learned, learn=learn)
+
+    def save(self, index_dir: Path) -> None:
+        (Path(index_dir) / ALGORITHMS_FILE).write_text(json.dumps({"learned": self.learned}, indent=2))
+
+    # --- Vocabulary ---
+    def add(self, name: str) -> None:
+        with self._lock:
+            for key in _keys(name):
+                if key in self._names:
+                    continue
+                self._names[key] = name
+                state = 0
+                for token in key:
+                    nxt = self._goto[state].get(token)
+                    if nxt is None:
+                        nxt = len(self._goto)
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._own.append(())
+                        self._out.append(())
+                        self._goto[state][token] = nxt
+                    state = nxt
+                self._own[state] = (name,)
+                self._dirty = True
+
+    def _build(self) -> None:
+        """Breadth-first failure links; each state also reports the names ending at its suffixes."""
+        with self._lock:
+            if not self._dirty:
+                return
+            own = self._own
+            queue = list(self._goto[0].values())
+            for s in queue:
+                self._fail[s] = 0
+                self._out[s] = own[s]
+            i = 0
+            while i < len(queue):
+                state = queue[i]
+                i += 1
+                for token, nxt in self._goto[state].items():
+                    f = self._fail[state]
+                    while f and token not in self._goto[f]:
+                        f = self._fail[f]
+                    fallback = self._goto[f].get(token, 0)
+                    self._fail[nxt] = fallback if fallback != nxt else 0
+                    self._out[nxt] = own[nxt] + self._out[self._fail[nxt]]
+                    queue.append(nxt)
+            self._dirty = False
+
+    def _learn(self, name: str) -> None:
+        norm = _norm(name)
+        self._spelling.setdefault(norm, name)
+        if norm not in self.learned and self.counts[norm] >= self.learn_min_count \
+                and (norm,) not in self._names:
+            self.learned[self._spelling[norm]] = self.counts[norm]
+            self.add(self._spelling[norm])
+
+    def _propose(self, raw: str, colon: bool = False, sentence_start: bool = False) -> Optional[str]:
+        """
+        A context-rule name, or None. Unknown words must look like names
+        (capitalised mid-sentence, or with digits, hyphens or "*") unless a
+        colon introduced them: "Algorithm: quicksort" but not "graph
+        algorithm" or "Graph algorithms are ...".
+        """
+        norm = _norm(raw)
+        if norm in STOPWORDS or len(norm) < 2 or norm.replace("-", "").isdigit():
+            return None
+        known = self._names.get((norm,))
+        if known is not None:
+            return known
+        if not (colon or (raw[0].isupper() and not sentence_start)
+                or any(c.isdigit() or c in "-*" for c in raw)):
+            return None
+        name = raw[:-2] if norm != raw.lower() else raw
+        if not self.learn:
+            return self._spelling.get(norm, name)
+        self.counts[norm] += 1
+        self._learn(name)
+        return self._spelling[norm]
+
+    # --- Extraction ---
+    def extract(self, text: str) -> List[str]:
+        """Algorithm names in text, first mention first, in one pass."""
+        if self._dirty:
+            self._build()
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Dict[str, None] = {}
+        # ASCII-only lowering keeps offsets aligned ("İ".lower() is two characters)
+        low = text.lower() if text.isascii() else text.translate(_ASCII_LOWER)
+        state = 0
+        # previous token: normalised form, span, and the end of the token before it
+        prev_norm, prev_start, prev_end, before_prev = None, 0, 0, 0
+        prev_named = False
+        for m in _LOWER_TOKEN.finditer(low):
+            norm = m.group(1)
+            start = m.start()
+            # gazetteer: names never span punctuation
+            if state and not low[prev_end:start].isspace():
+                state = 0
+            while state and norm not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(norm, 0)
+            named = False
+            if state and out[state]:
+                named = True
+                for name in out[state]:
+                    found[name] = None
+            # context rules (the former extract_algorithms patterns), only around trigger words
+            if prev_norm is not None and (norm in _NAME_BEFORE or prev_norm in _NAME_AFTER):
+                gap = text[prev_end:start]
+                if norm in _NAME_BEFORE and gap.isspace() and not prev_named:
+                    sentence_start = before_prev == 0 or any(c in ".!?\n" for c in text[before_prev:prev_start])
+                    name = self._propose(text[prev_start:prev_end], sentence_start=sentence_start)
+                    if name:
+                        found[name] = None
+                if prev_norm in _NAME_AFTER and all(c in _GAP_NAME_AFTER for c in gap):
+                    name = self._propose(text[start:m.end()], colon=":" in gap)
+                    if name:
+                        found[name] = None
+            before_prev = prev_end
+            prev_norm, prev_start, prev_end, prev_named = norm, start, m.end(), named
+        return list(found)
+
+    def __len__(self):
+        return len(self._names)
+
+
+_extractor: Optional[AlgorithmExtractor] = None
+
+
+def get_extractor() -> AlgorithmExtractor:
+    global _extractor
+    if _extractor is None:
+        _extractor = AlgorithmExtractor.from_store(None, learn=False)
+    return _extractor
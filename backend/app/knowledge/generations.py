@@ -0,0 +1,334 @@
+# backend/app/knowledge/generations.py
+"""
+Versioned, immutable index generations.
+
+A build never writes into the directory readers use. It writes a new
+generation under <store>/generations/<id>.staging, lists every file with
+its size and sha256 in manifest.json (plus one checksum over the list),
+renames the directory to <store>/generations/<id> and then publishes it by
+atomically replacing <store>/CURRENT (temp file, fsync, os.replace). A
+reader therefore sees either the old generation or the new one, never a
+half-written index.
+
+Readers resolve CURRENT once per load (`locate`) and hold a lease on that
+generation while they read its files; garbage collection keeps the current
+generation and the `keep - 1` newest others (the rollback targets) and
+never deletes a leased one. Leases are per process: builds run in the API
+process (background tasks), which is the only one that collects.
+
+Builds of one store are serialised: a build holds the store's build lock
+from staging to publish, and takes its generation id only once it has the
+lock, so ids increase in publish order. Publishing never moves CURRENT
+back to an older id than the one it holds (only rollback does that).
+
+Stores written before generations existed (files directly in <store>) are
+read as before until their first generational build, which also removes
+the old files.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+from utils.config import VECTORSTORE_KEEP_GENERATIONS
+
+logger = logging.getLogger(__name__)
+
+GENERATIONS_DIR = "generations"
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+STAGING_SUFFIX = ".staging"
+# index files of the pre-generation layout, directly in the store
+LEGACY_FILES = ("index.faiss", "index.pkl", "filters.json", "symbols.json", "dedup.json", "compaction.json")
+
+_lock = threading.Lock()
+_leases: Counter = Counter()
+_building: set = set()
+_build_locks: Dict[str, threading.Lock] = {}
+
+
+# --- Resolving ---
+def current(store: Path) -> Optional[str]:
+    try:
+        return (Path(store) / CURRENT_FILE).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def generation_dir(store: Path, generation: str) -> Path:
+    return Path(store) / GENERATIONS_DIR / generation
+
+
+def _build_lock(store: Path) -> threading.Lock:
+    key = str(Path(store).resolve())
+    with _lock:
+        return _build_locks.setdefault(key, threading.Lock())
+
+
+def locate(path: Path) -> Path:
+    """
+    Physical directory behind a logical index path: the store itself
+    (vectorstore/) or a sub-index inside every generation (vectorstore/algos).
+    """
+    path = Path(path)
+    for store, sub in ((path, None), (path.parent, path.name)):
+        generation = current(store)
+        if generation is not None:
+            base = generation_dir(store, generation)
+            return base / sub if sub else base
+    return path
+
+
+def _generation_of(path: Path) -> str:
+    """Lease key: the generation directory containing path (or the legacy store)."""
+    path = Path(path)
+    if path.parent.name == GENERATIONS_DIR:
+        return str(path)
+    if path.parent.parent.name == GENERATIONS_DIR:
+        return str(path.parent)
+    return str(path)
+
+
+@contextmanager
+def hold(physical: Path) -> Iterator[Path]:
+    """Keep the generation containing `physical` from being collected while reading it."""
+    key = _generation_of(physical)
+    with _lock:
+        _leases[key] += 1
+    try:
+        yield Path(physical)
+    finally:
+        with _lock:
+            _leases[key] -= 1
+            if _leases[key] <= 0:
+                del _leases[key]
+
+
+@contextmanager
+def lease(path: Path) -> Iterator[Path]:
+    """Resolve a logical index path to its current generation and hold it."""
+    with _lock:
+        physical = locate(path)
+        key = _generation_of(physical)
+        _leases[key] += 1
+    try:
+        yield physical
+    finally:
+        with _lock:
+            _leases[key] -= 1
+            if _leases[key] <= 0:
+                del _leases[key]
+
+
+# --- Manifests ---
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _file_entries(directory: Path) -> Dict[str, Dict[str, Any]]:
+    return {
+        str(p.relative_to(directory)): {"size": p.stat().st_size, "sha256": _sha256(p)}
+        for p in sorted(directory.rglob("*")) if p.is_file() and p.name != MANIFEST_FILE
+    }
+
+
+def _checksum(files: Dict[str, Dict[str, Any]]) -> str:
+    return hashlib.sha256("".join(f"{name}:{e['sha256']}\n" for name, e in sorted(files.items())).encode()).hexdigest()
+
+
+def read_manifest(gen_dir: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads((Path(gen_dir) / MANIFEST_FILE).read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def verify(gen_dir: Path) -> bool:
+    """True if every file listed in the manifest is present and unchanged."""
+    manifest = read_manifest(gen_dir)
+    if manifest is None:
+        return False
+    files = _file_entries(Path(gen_dir))
+    return files == manifest["files"] and _checksum(files) == manifest["checksum"]
+
+
+# --- Publishing ---
+def _fsync_dir(directory: Path) -> None:
+    try:
+        fd = os.open(str(directory), os.O_RDONLY)
+    except OSError:  # e.g. Windows
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _flip(store: Path, generation: str) -> None:
+    tmp = Path(store) / f"{CURRENT_FILE}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(generation)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, Path(store) / CURRENT_FILE)
+    _fsync_dir(Path(store))
+
+
+class GenerationBuild:
+    """
+    Staging directory of one build; published when the `with` block exits
+    cleanly. Entering waits for any other build of the same store to finish.
+    """
+
+    def __init__(self, store: Path):
+        self.store = Path(store)
+        self.generation: Optional[str] = None
+        self.path: Optional[Path] = None
+        # free-form build facts recorded in the manifest (chunks, files, ...)
+        self.meta: Dict[str, Any] = {}
+        self.discarded = False
+        self._store_lock = _build_lock(self.store)
+
+    def discard(self) -> None:
+        """Do not publish (e.g. nothing to index)."""
+        self.discarded = True
+
+    def __enter__(self) -> "GenerationBuild":
+        self._store_lock.acquire()
+        try:
+            # stamped under the lock: a build that waited gets a newer id than the one it waited for
+            self.generation = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+            self.path = generation_dir(self.store, self.generation + STAGING_SUFFIX)
+            self.path.mkdir(parents=True)
+            with _lock:
+                _building.add(str(self.path))
+        except BaseException:
+            self._store_lock.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        try:
+            if exc_type is None and not self.discarded:
+                self._publish()
+            else:
+                shutil.rmtree(self.path, ignore_errors=True)
+        finally:
+            with _lock:
+                _building.discard(str(self.path))
+            self._store_lock.release()
+        return False
+
+    def _publish(self) -> None:
+        active = current(self.store)
+        if active is not None and self.generation <= active:
+            shutil.rmtree(self.path, ignore_errors=True)
+            raise RuntimeError(f"Refusing to publish generation {self.generation} over newer {active} "
+                               f"in {self.store}")
+        files = _file_entries(self.path)
+        manifest = {
+            "generation": self.generation,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "previous": current(self.store),
+            "files": files,
+            "checksum": _checksum(files),
+            "meta": self.meta,
+        }
+        (self.path / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        final = generation_dir(self.store, self.generation)
+        os.replace(self.path, final)
+        _fsync_dir(final.parent)
+        _flip(self.store, self.generation)
+        logger.info(f"Published index generation {self.generation} in {self.store}")
+        collect(self.store)
+
+
+def new_generation(store: Path) -> GenerationBuild:
+    return GenerationBuild(store)
+
+
+# --- Listing, rollback, garbage collection ---
+def generations(store: Path) -> List[str]:
+    """Published generations, oldest first (ids sort by creation time)."""
+    root = Path(store) / GENERATIONS_DIR
+    if not root.exists():
+        return []
+    return sorted(p.name for p in root.iterdir() if p.is_dir() and not p.name.endswith(STAGING_SUFFIX))
+
+
+def list_generations(store: Path) -> Dict[str, Any]:
+    active = current(store)
+    out = []
+    for generation in reversed(generations(store)):
+        gen_dir = generation_dir(store, generation)
+        manifest = read_manifest(gen_dir) or {}
+        with _lock:
+            leases = _leases.get(str(gen_dir), 0)
+        out.append({
+            "generation": generation, "current": generation == active, "created": manifest.get("created"),
+            "checksum": manifest.get("checksum"), "bytes": sum(e["size"] for e in manifest.get("files", {}).values()),
+            "leases": leases, "meta": manifest.get("meta", {}),
+        })
+    return {"current": active, "generations": out}
+
+
+def activate(store: Path, generation: str) -> None:
+    """Point CURRENT at an existing generation after checking its manifest."""
+    gen_dir = generation_dir(store, generation)
+    if not gen_dir.is_dir():
+        raise FileNotFoundError(f"Generation '{generation}' not found.")
+    if not verify(gen_dir):
+        raise ValueError(f"Generation '{generation}' failed its checksum.")
+    _flip(Path(store), generation)
+    logger.info(f"Activated index generation {generation} in {store}")
+
+
+def rollback(store: Path, to: Optional[str] = None) -> str:
+    """Activate `to`, or the newest generation older than the current one; returns it."""
+    if to is None:
+        active = current(store)
+        older = [g for g in generations(store) if active is None or g < active]
+        if not older:
+            raise FileNotFoundError("No earlier generation to roll back to.")
+        to = older[-1]
+    activate(store, to)
+    return to
+
+
+def collect(store: Path, keep: int = VECTORSTORE_KEEP_GENERATIONS) -> List[str]:
+    """Delete generations beyond the newest `keep` (never the current or a leased one); returns them."""
+    store = Path(store)
+    active = current(store)
+    if active is None:
+        return []
+    keep_set = {active, *[g for g in generations(store) if g != active][-(max(keep, 1) - 1):]} if keep > 1 else {active}
+    removed = []
+    root = store / GENERATIONS_DIR
+    for p in root.iterdir():
+        gen_dir = str(p)
+        with _lock:
+            busy = gen_dir in _building or _leases.get(gen_dir, 0) > 0
+        if busy or p.name in keep_set or not p.is_dir():
+            continue
+        shutil.rmtree(p, ignore_errors=True)
+        removed.append(p.name)
+    # the pre-generation layout is superseded once a generation is current
+    with _lock:
+        legacy_busy = _leases.get(str(store), 0) > 0 or _leases.get(str(store / "algos"), 0) > 0
+    if not legacy_busy:
+        for sub in (store, store / "algos"):
+            for name in LEGACY_FILES:
+                (sub / name).unlink(missing_ok=True)
+    if removed:
+        logger.info(f"Collected index generations {removed} in {store}")
+    return removed
@@ -0,0 +1,399 @@
+# backend/app/knowledge/images.py
+"""
+Image preprocessing for the vision expert (LlavaExpert).
+
+Vision calls are the most expensive requests we make, so every image goes
+through the same steps before one is issued:
+
+1. prepare: decode, drop images smaller than `min_side` (bullets, icons),
+   downsample so the longest side is at most `max_side` (the model resizes
+   to its own tile grid anyway, larger uploads only cost transfer and
+   decode time) and re-encode as JPEG. Encoded payloads are cached in
+   memory by the sha1 of the input bytes.
+2. dedup: a 64-bit DCT perceptual hash identifies the same picture across
+   re-encodings and small edits (a logo on every slide, a figure pasted in
+   two documents). PHashIndex finds hashes within `phash_distance` bits by
+   splitting them into 8 byte-bands: two hashes that differ in at most 7
+   bits share at least one band exactly.
+3. caption: captions are cached on disk (JSON lines) by payload digest and
+   perceptual hash, so rebuilds and near-duplicates never reach the model
+   twice. Cache misses are captioned in batches of `caption_batch` images
+   with `caption_workers` concurrent requests (Ollama takes one image set
+   per generate call and returns one answer, so a batch is concurrent
+   single-image requests).
+"""
+import base64
+import hashlib
+import io
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+from utils.config import (
+    IMAGES_MAX_SIDE, IMAGES_MIN_SIDE, IMAGES_JPEG_QUALITY, IMAGES_PHASH_DISTANCE,
+    IMAGES_CAPTION_BATCH, IMAGES_CAPTION_WORKERS, IMAGES_CAPTION_PROMPT, IMAGES_CACHE_PATH,
+    IMAGES_PAYLOAD_CACHE_SIZE,
+)
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+ImageInput = Union[bytes, str, "Image.Image"]
+
+_BANDS = 8
+
+
+@dataclass
+class PreparedImage:
+    digest: str     # sha1 of the encoded payload
+    phash: int      # 64-bit perceptual hash
+    width: int
+    height: int
+    payload: str    # base64 JPEG, as the Ollama API expects
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"digest": self.digest, "phash": f"{self.phash:016x}", "width": self.width, "height": self.height}
+
+
+# --- Perceptual hash ---
+def _dct_matrix(n: int):
+    import numpy as np
+
+    k = np.arange(n)
+    m = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * np.sqrt(2 / n)
+    m[0] /= np.sqrt(2)
+    return m
+
+
+_DCT = None
+
+
+def phash(img) -> int:
+    """DCT hash: sign of the 8x8 lowest frequencies of a 32x32 greyscale thumbnail against their median."""
+    import numpy as np
+    from PIL import Image
+
+    global _DCT
+    if _DCT is None:
+        _DCT = _dct_matrix(32)
+    pixels = np.asarray(img.convert("L").resize((32, 32), Image.LANCZOS), dtype="float64")
+    low = (_DCT @ pixels @ _DCT.T)[:8, :8].flatten()
+    # the DC term is the mean brightness, not structure
+    bits = low > np.median(low[1:])
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class PHashIndex:
+    """Perceptual hashes -> keys, queried within a Hamming distance (at most 7 bits)."""
+
+    def __init__(self, distance: int = IMAGES_PHASH_DISTANCE):
+        self.distance = min(distance, _BANDS - 1)
+        self.hashes: Dict[int, Any] = {}
+        self.bands: List[Dict[int, List[int]]] = [{} for _ in range(_BANDS)]
+
+    def find(self, h: int) -> Optional[Any]:
+        if h in self.hashes:
+            return self.hashes[h]
+        if self.distance == 0:
+            return None
+        seen = set()
+        for i, band in enumerate(self.bands):
+            for other in band.get((h >> (8 * i)) & 0xFF, ()):
+                if other not in seen:
+                    seen.add(other)
+                    if hamming(h, other) <= self.distance:
+                        return self.hashes[other]
+        return None
+
+    def add(self, h: int, key: Any) -> None:
+        if h in self.hashes:
+            return
+        self.hashes[h] = key
+        for i, band in enumerate(self.bands):
+            band.setdefault((h >> (8 * i)) & 0xFF, []).append(h)
+
+    def __len__(self):
+        return len(self.hashes)
+
+
+# --- Prepare ---
+def _open(data: ImageInput):
+    from PIL import Image
+
+    if isinstance(data, Image.Image):
+        return data
+    if isinstance(data, str):
+        # chat attachments arrive base64-encoded, optionally as a data URL
+        data = base64.b64decode(data.split(",", 1)[1] if data.startswith("data:") else data)
+    return Image.open(io.BytesIO(data))
+
+
+def _input_key(data: ImageInput) -> Optional[str]:
+    if isinstance(data, (bytes, str)):
+        return hashlib.sha1(data if isinstance(data, bytes) else data.encode()).hexdigest()
+    return None
+
+
+class ImagePreparer:
+    def __init__(self, max_side: int = IMAGES_MAX_SIDE, min_side: int = IMAGES_MIN_SIDE,
+                 quality: int = IMAGES_JPEG_QUALITY, cache_size: int = IMAGES_PAYLOAD_CACHE_SIZE):
+        self.max_side = max_side
+        self.min_side = min_side
+        self.quality = quality
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Optional[PreparedImage]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def prepare(self, data: ImageInput) -> Optional[PreparedImage]:
+        """Downsampled JPEG payload and hashes of an image; None if it is too small or unreadable."""
+        key = _input_key(data)
+        if key is not None:
+            with self._lock:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    return self._cache[key]
+                self.misses += 1
+        with span("image.prepare"):
+            prepared = self._prepare(data)
+        if key is not None:
+            with self._lock:
+                self._cache[key] = prepared
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return prepared
+
+    def _prepare(self, data: ImageInput) -> Optional[PreparedImage]:
+        from PIL import Image
+
+        try:
+            img = _open(data)
+            if img.format == "JPEG":
+                # let libjpeg decode at 1/2, 1/4 or 1/8 scale when that still covers max_side
+                img.draft("RGB", (self.max_side, self.max_side))
+            img.load()
+        except Exception as e:
+            logger.warning(f"Unreadable image skipped: {e}")
+            return None
+        if min(img.size) < self.min_side:
+            return None
+        if img.mode != "RGB":
+            # flatten transparency onto white, as diagrams are drawn for light backgrounds
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.split()[-1])
+        if max(img.size) > self.max_side:
+            if isinstance(data, Image.Image):
+                img = img.copy()  # thumbnail works in place; leave the caller's image alone
+            # reducing_gap: box-reduce by an integer factor first, then resample the remainder
+            img.thumbnail((self.max_side, self.max_side), Image.BICUBIC, reducing_gap=2.0)
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=self.quality)
+        encoded = buf.getvalue()
+        return PreparedImage(
+            digest=hashlib.sha1(encoded).hexdigest(), phash=phash(img),
+            width=img.width, height=img.height, payload=base64.b64encode(encoded).decode(),
+        )
+
+    def payloads(self, images: List[ImageInput]) -> List[str]:
+        """Payloads for one request: small and near-duplicate images dropped, order kept."""
+        seen = PHashIndex()
+        out = []
+        for data in images:
+            prepared = self.prepare(data)
+            if prepared is None or seen.find(prepared.phash) is not None:
+                continue
+            seen.add(prepared.phash, prepared.digest)
+            out.append(prepared.payload)
+        return out
+
+
+# --- Captions ---
+class CaptionCache:
+    """Captions per (model, payload digest), also found by perceptual hash; appended to a JSON-lines file."""
+
+    def __init__(self, path: Optional[Path] = IMAGES_CACHE_PATH, distance: int = IMAGES_PHASH_DISTANCE):
+        self.path = Path(path) if path else None
+        self.distance = distance
+        self.captions: Dict[tuple, str] = {}
+        self.phashes: Dict[str, PHashIndex] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self) -> None:
+        self._loaded = True
+        if self.path is None or not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:  # a write cut short
+                    continue
+                self._remember(entry["model"], entry["digest"], int(entry["phash"], 16), entry["caption"])
+
+    def _remember(self, model: str, digest: str, h: int, caption: str) -> None:
+        self.captions[(model, digest)] = caption
+        self.phashes.setdefault(model, PHashIndex(self.distance)).add(h, digest)
+
+    def get(self, model: str, image: PreparedImage) -> Optional[str]:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            caption = self.captions.get((model, image.digest))
+            if caption is None and model in self.phashes:
+                digest = self.phashes[model].find(image.phash)
+                caption = self.captions.get((model, digest)) if digest else None
+            return caption
+
+    def put(self, model: str, image: PreparedImage, caption: str) -> None:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self._remember(model, image.digest, image.phash, caption)
+            if self.path is not None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"model": model, "digest": image.digest, "phash": f"{image.phash:016x}",
+                                        "caption": caption}, ensure_ascii=False) + "\n")
+
+    def __len__(self):
+        return len(self.captions)
+
+
+@dataclass
+class ImageReport:
+    seen: int = 0
+    skipped: int = 0        # too small or unreadable
+    duplicates: int = 0     # same picture earlier in this build
+    cached: int = 0
+    captioned: int = 0
+    failed: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+    def summary(self) -> str:
+        return ", ".join(f"{v} {k}" for k, v in self.__dict__.items())
+
+
+class Captioner:
+    def __init__(self, expert=None, prompt: str = IMAGES_CAPTION_PROMPT, batch: int = IMAGES_CAPTION_BATCH,
+                 workers: int = IMAGES_CAPTION_WORKERS, cache: Optional[CaptionCache] = None):
+        if expert is None:
+            from experts.llava_expert import LlavaExpert
+            expert = LlavaExpert()
+        self.expert = expert
+        self.prompt = prompt
+        self.batch = batch
+        self.workers = workers
+        self.cache = cache if cache is not None else CaptionCache()
+        self.counts = {"cached": 0, "captioned": 0, "failed": 0}
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _caption(self, image: PreparedImage) -> Optional[str]:
+        try:
+            caption = self.expert.caption(image.payload, self.prompt).strip()
+        except Exception as e:
+            logger.warning(f"Captioning image {image.digest[:12]} failed: {e}")
+            return None
+        return caption or None
+
+    def caption_many(self, images: List[PreparedImage], report: Optional[ImageReport] = None) -> List[Optional[str]]:
+        """Captions in input order; cached ones are reused, the rest are captioned batch by batch."""
+        model = self.expert.model
+        out: List[Optional[str]] = [self.cache.get(model, image) for image in images]
+        misses = [i for i, caption in enumerate(out) if caption is None]
+        with self._lock:
+            self.counts["cached"] += len(images) - len(misses)
+        if report is not None:
+            report.cached += len(images) - len(misses)
+        if not misses:
+            return out
+        start = time.perf_counter()
+        with span("image.caption"), ThreadPoolExecutor(max(self.workers, 1), thread_name_prefix="caption") as pool:
+            for b in range(0, len(misses), self.batch):
+                rows = misses[b:b + self.batch]
+                for i, caption in zip(rows, pool.map(lambda i: self._caption(images[i]), rows)):
+                    out[i] = caption
+                    if caption is not None:
+                        self.cache.put(model, images[i], caption)
+        with self._lock:
+            self.seconds += time.perf_counter() - start
+            self.counts["captioned"] += sum(out[i] is not None for i in misses)
+            self.counts["failed"] += sum(out[i] is None for i in misses)
+        if report is not None:
+            report.captioned += sum(out[i] is not None for i in misses)
+            report.failed += sum(out[i] is None for i in misses)
+        return out
+
+    def metrics(self):
+        preparer = get_preparer()
+        with self._lock:
+            counts = dict(self.counts)
+            seconds = self.seconds
+        return [
+            ("edris_image_captions_total", "counter", "Images captioned, by result",
+             [({"result": k}, v) for k, v in counts.items()]),
+            ("edris_image_caption_seconds_total", "counter", "Seconds spent in vision captioning calls",
+             [({}, round(seconds, 3))]),
+            ("edris_image_caption_cache_entries", "gauge", "Cached image captions", [({}, len(self.cache))]),
+            ("edris_image_payload_cache_total", "counter", "Prepared image payload cache lookups",
+             [({"result": "hit"}, preparer.hits), ({"result": "miss"}, preparer.misses)]),
+        ]
+
+
+@dataclass
+class ImageBatcher:
+    """Per-build image dedup and captioning; `describe` returns a caption per new picture, in order."""
+    captioner: Captioner
+    preparer: ImagePreparer
+    seen: PHashIndex = field(default_factory=PHashIndex)
+    report: ImageReport = field(default_factory=ImageReport)
+
+    def unique(self, images: List[ImageInput]) -> List[PreparedImage]:
+        out = []
+        for data in images:
+            self.report.seen += 1
+            prepared = self.preparer.prepare(data)
+            if prepared is None:
+                self.report.skipped += 1
+            elif self.seen.find(prepared.phash) is not None:
+                self.report.duplicates += 1
+            else:
+                self.seen.add(prepared.phash, prepared.digest)
+                out.append(prepared)
+        return out
+
+    def describe(self, images: List[PreparedImage]) -> List[Optional[str]]:
+        return self.captioner.caption_many(images, self.report)
+
+
+_preparer: Optional[ImagePreparer] = None
+_captioner: Optional[Captioner] = None
+
+
+def get_preparer() -> ImagePreparer:
+    global _preparer
+    if _preparer is None:
+        _preparer = ImagePreparer()
+    return _preparer
+
+
+def get_captioner() -> Captioner:
+    global _captioner
+    if _captioner is None:
+        _captioner = Captioner()
+    return _captioner
@@ -0,0 +1,114 @@
+# backend/app/knowledge/index_cache.py
+"""
+Process-wide cache of loaded FAISS indexes.
+
+Loading an index (reading index.faiss and unpickling the docstore) costs
+far more than searching it, and the search endpoints used to do it on
+every request. Indexes are cached per logical directory and keyed by the
+generation directory it currently resolves to (knowledge/generations.py)
+and the modification time of its index.faiss, so a newly published build
+or a rollback is picked up on the next search without explicit
+invalidation; the generation is leased while it is being loaded. The least recently
+used index is dropped once `size` indexes are loaded. The metadata filter
+index (knowledge/filters.py) and the code symbol index
+(knowledge/symbols.py) are cached alongside their FAISS index.
+"""
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+from knowledge.filters import MetadataIndex
+from knowledge.generations import hold, lease
+from knowledge.symbols import SymbolIndex
+from utils.config import SEARCH_INDEX_CACHE_SIZE
+
+
+class IndexCache:
+    def __init__(self, size: int = SEARCH_INDEX_CACHE_SIZE):
+        self.size = size
+        # dir -> ((generation dir, mtime of index.faiss), FAISS store, MetadataIndex, SymbolIndex);
+        # the side indexes are None until first needed
+        self._indexes: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, index_dir: Path):
+        """Return the FAISS store at index_dir, loading it if missing or stale; None if absent."""
+        from langchain_community.vectorstores import FAISS
+        from experts.embedder import get_embedding
+
+        key = str(index_dir)
+        with lease(Path(index_dir)) as physical:
+            try:
+                version = (str(physical), (physical / "index.faiss").stat().st_mtime_ns)
+            except FileNotFoundError:
+                self.invalidate(index_dir)
+                return None
+            with self._lock:
+                cached = self._indexes.get(key)
+                if cached is not None and cached[0] == version:
+                    self._indexes.move_to_end(key)
+                    self.hits += 1
+                    return cached[1]
+                self.misses += 1
+            # indexes are written by build_space_vs, so unpickling the docstore is safe
+            db = FAISS.load_local(str(physical), get_embedding, allow_dangerous_deserialization=True)
+        with self._lock:
+            self._indexes[key] = [version, db, None, None]
+            self._indexes.move_to_end(key)
+            while len(self._indexes) > self.size:
+                self._indexes.popitem(last=False)
+        return db
+
+    def filters(self, index_dir: Path, db=None) -> Optional[MetadataIndex]:
+        """Metadata filter index of the store at index_dir, or of db loaded from it (built from the docstore if never saved)."""
+        return self._sidecar(index_dir, db, 2, MetadataIndex)
+
+    def symbols(self, index_dir: Path, db=None) -> Optional[SymbolIndex]:
+        """Code symbol index of the store at index_dir, or of db loaded from it (built from the docstore if never saved)."""
+        return self._sidecar(index_dir, db, 3, SymbolIndex)
+
+    def _sidecar(self, index_dir: Path, db, slot: int, cls):
+        db = db if db is not None else self.get(index_dir)
+        if db is None:
+            return None
+        key = str(index_dir)
+        with self._lock:
+            entry = self._indexes.get(key)
+            if entry is None or entry[1] is not db:
+                return cls.from_docstore(db)
+            if entry[slot] is not None:
+                return entry[slot]
+            physical = Path(entry[0][0])
+        # read the side file from the generation db was loaded from, not whatever is current now
+        with hold(physical):
+            index = cls.load(physical)
+        if index is None or index.size != db.index.ntotal:
+            index = cls.from_docstore(db)
+        with self._lock:
+            entry = self._indexes.get(key)
+            if entry is not None and entry[1] is db:
+                entry[slot] = index
+        return index
+
+    def invalidate(self, index_dir: Optional[Path] = None) -> None:
+        with self._lock:
+            if index_dir is None:
+                self._indexes.clear()
+            else:
+                self._indexes.pop(str(index_dir), None)
+
+    def status(self):
+        with self._lock:
+            return {"loaded": list(self._indexes), "size": self.size, "hits": self.hits, "misses": self.misses}
+
+
+_cache: Optional[IndexCache] = None
+
+
+def get_index_cache() -> IndexCache:
+    global _cache
+    if _cache is None:
+        _cache = IndexCache()
+    return _cache
@@ -1,22 +1,15 @@
 # knowledge/loader.py
-import re
-import csv
-from pathlib import Path
-from typing import List, Optional
-from PIL import Image
-import fitz  # PyMuPDF for PDF
-import pytesseract  # OCR for scanned PDFs
-from docx import Document as DocxDocument  # python-docx for .docx
-from pptx import Presentation  # python-pptx for .pptx slides
-from langchain.docstore.document import Document
-from langchain_community.vectorstores import FAISS
-from backend.app.experts.embedder import get_embedding
-from utils.config import DOCS_PATH, VECTORSTORE_PATH
-from bs4 import BeautifulSoup
-import pandas as pd
-import matplotlib.pyplot as plt
 import io, base64
 import json
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Union
+from experts.embedder import get_embedding, get_embeddings
+from knowledge.formats import Segment
+from utils.config import DOCS_PATH, VECTORSTORE_PATH
+from utils.lazy import import_module
+from utils.metrics import span
+from utils.scheduler import PRIORITY_BULK, model_priority
 
 
 
@@ -27,85 +20,82 @@ class OllamaEmbeddings:
     embedding_dimension: int = 4096
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        return [get_embedding(t) for t in texts]
+        return get_embeddings(texts)
 
     def embed_query(self, text: str) -> List[float]:
         return get_embedding(text)
 # --- Algorithm Extraction ---
 def extract_algorithms(text: str) -> List[str]:
-    """Extract algorithm names supporting word, hyphens, underscores."""
-    patterns = [
-        r"Algorithm[:\s]+([\w\-]+)",
-        r"([\w\-]+)\s+algorithm",
-        r"(?:procedure|method)[:\s]*([\w\-]+)"
-    ]
-    algos = set()
-    for p in patterns:
-        for m in re.findall(p, text, flags=re.IGNORECASE):
-            algos.add(m.strip())
-    return list(algos)
+    """Algorithm names in text (curated vocabulary plus "<name> algorithm" style mentions)."""
+    from knowledge.gazetteer import get_extractor
+    return get_extractor().extract(text)
+
+# --- Loader Registry ---
+# Handlers are referenced as "module:function" so their parsers (PyMuPDF,
+# pytesseract, python-docx, python-pptx) are only imported when a file of
+# that type is actually loaded. A handler takes a path and yields Segments.
+SegmentLoader = Callable[[Path], Iterator[Segment]]
+
+_LOADER_SPECS: Dict[str, str] = {
+    ".txt": "knowledge.formats.text:iter_text_segments",
+    ".md": "knowledge.formats.text:iter_text_segments",
+    ".csv": "knowledge.formats.tabular:iter_table_segments",
+    ".tsv": "knowledge.formats.tabular:iter_table_segments",
+    ".pdf": "knowledge.formats.pdf:iter_pdf_segments",
+    ".docx": "knowledge.formats.office:iter_docx_segments",
+    ".pptx": "knowledge.formats.office:iter_pptx_segments",
+    ".ppt": "knowledge.formats.office:iter_pptx_segments",
+    ".png": "knowledge.formats.image:iter_image_segments",
+    ".jpg": "knowledge.formats.image:iter_image_segments",
+    ".jpeg": "knowledge.formats.image:iter_image_segments",
+    ".webp": "knowledge.formats.image:iter_image_segments",
+    ".py": "knowledge.formats.code:iter_python_segments",
+}
+_LOADERS: Dict[str, SegmentLoader] = {}
+
+def register_loader(ext: str, handler: Union[str, SegmentLoader]) -> None:
+    """Register a loader for an extension, either a callable or a lazy "module:function" spec."""
+    ext = ext.lower()
+    _LOADERS.pop(ext, None)
+    if isinstance(handler, str):
+        _LOADER_SPECS[ext] = handler
+    else:
+        _LOADER_SPECS.pop(ext, None)
+        _LOADERS[ext] = handler
+
+def get_loader(ext: str) -> SegmentLoader:
+    ext = ext.lower()
+    if ext not in _LOADERS:
+        spec = _LOADER_SPECS.get(ext)
+        if spec is None:
+            raise ValueError(f"Unsupported file type: {ext}")
+        module_name, func_name = spec.split(":")
+        _LOADERS[ext] = getattr(import_module(module_name), func_name)
+    return _LOADERS[ext]
+
+def supported_extensions() -> List[str]:
+    return sorted(set(_LOADER_SPECS) | set(_LOADERS))
 
 # --- File Loaders ---
-def load_text_file(path: Path) -> str:
-    return path.read_text(encoding="utf-8", errors="ignore")
-
-def load_csv_file(path: Path) -> str:
-    rows = []
-    with path.open(newline="", encoding="utf-8", errors="ignore") as f:
-        reader = csv.reader(f)
-        for row in reader:
-            rows.append(", ".join(row))
-    return "\n".join(rows)
-
-def load_pdf_documents(path: Path) -> List[Document]:
+def iter_segments(path: Path) -> Iterator[Segment]:
+    """Stream a file as page/slide/section segments tagged with source metadata."""
+    path = Path(path)
+    # upload date: uploads are written straight into the docs directory
+    uploaded = datetime.fromtimestamp(path.stat().st_mtime).date().isoformat()
+    base = {"source": str(path), "file_type": path.suffix.lower().lstrip("."), "date": uploaded}
+    for segment in get_loader(path.suffix)(path):
+        segment.metadata = {**base, **segment.metadata}
+        yield segment
+
+def load_pdf_documents(path: Path) -> List["Document"]:
     """Load a PDF and return as a single Document"""
-    text = load_pdf_file(path)
+    from langchain_core.documents import Document
+    text = load_file(path)
     return [Document(page_content=text, metadata={"source": str(path)})]
 
-def load_pdf_file(path: Path) -> str:
-    text_chunks: List[str] = []
-    pdf = fitz.open(str(path))
-    for page in pdf:
-        txt = page.get_text().strip()
-        if txt:
-            text_chunks.append(txt)
-        else:
-            pix = page.get_pixmap(dpi=300)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            ocr = pytesseract.image_to_string(img)
-            text_chunks.append(ocr)
-    return "\n".join(text_chunks)
-
-def load_docx_file(path: Path) -> str:
-    doc = DocxDocument(str(path))
-    texts: List[str] = [p.text for p in doc.paragraphs if p.text]
-    for table in doc.tables:
-        for row in table.rows:
-            texts.append(", ".join(cell.text for cell in row.cells))
-    return "\n".join(texts)
-
-def load_pptx_file(path: Path) -> str:
-    prs = Presentation(str(path))
-    texts: List[str] = []
-    for slide in prs.slides:
-        for shape in slide.shapes:
-            if hasattr(shape, "text") and shape.text:
-                texts.append(shape.text)
-    return "\n".join(texts)
-
 def load_file(path: Path) -> str:
-    ext = path.suffix.lower()
-    if ext in [".txt", ".md"]:
-        return load_text_file(path)
-    if ext == ".csv":
-        return load_csv_file(path)
-    if ext == ".pdf":
-        return load_pdf_file(path)
-    if ext == ".docx":
-        return load_docx_file(path)
-    if ext in [".pptx", ".ppt"]:
-        return load_pptx_file(path)
-    raise ValueError(f"Unsupported file type: {ext}")
+    """Load a whole file as one string; prefer iter_segments for large files."""
+    return "\n".join(segment.text for segment in iter_segments(path))
 
 
 
@@ -113,6 +103,10 @@ def extract_media_from_html(html: str, source_path: Path):
     """
     فرض می‌کنیم اسناد HTML یا Markdown حاوی <img>, <table> و <canvas data-chart> هستند.
     """
+    from bs4 import BeautifulSoup
+    import pandas as pd
+    import matplotlib.pyplot as plt
+
     soup = BeautifulSoup(html, "html.parser")
     media = []
 
@@ -155,50 +149,94 @@ def extract_media_from_html(html: str, source_path: Path):
 
 
 # --- Vectorstore Builder ---
-def build_vectorstore(source_dir: Optional[str] = None):
+def build_vectorstore(source_dir: Optional[str] = None, store_dir: Optional[Path] = None,
+                      compaction=None):
+    """Stream every supported file under source_dir into a new index generation of store_dir.
+
+    compaction is an optional knowledge.compaction.CompactionSpec applied
+    to the text index before it is saved. The text index, its side files and
+    the algos index are written into one staging generation that is only
+    published (knowledge/generations.py) once all of them are complete.
+    """
+    from langchain_core.documents import Document
+    from langchain_community.vectorstores import FAISS
+    from knowledge.compaction import COMPACTION_FILE, compact_store
+    from knowledge.dedup import DEDUP_FILE
+    from knowledge.gazetteer import AlgorithmExtractor
+    from knowledge.generations import locate, new_generation
+    from knowledge.pipeline import IngestionPipeline
+
     src = Path(source_dir) if source_dir else DOCS_PATH
+    store = Path(store_dir) if store_dir else VECTORSTORE_PATH
     src.mkdir(parents=True, exist_ok=True)
-    VECTORSTORE_PATH.mkdir(parents=True, exist_ok=True)
+    store.mkdir(parents=True, exist_ok=True)
 
     # gather all supported files
-    patterns = ["*.md", "*.txt", "*.csv", "*.pdf", "*.docx", "*.pptx", "*.ppt"]
+    patterns = [f"*{ext}" for ext in supported_extensions()]
     files = [p for pattern in patterns for p in src.rglob(pattern)]
 
-    documents, metadatas = [], []
-    all_algos = []
-
-    for fp in files:
-        content = load_file(fp)
-        documents.append(Document(page_content=content, metadata={"source": str(fp)}))
-        metadatas.append({"source": str(fp), "algorithms": extract_algorithms(content)})
-        all_algos.extend(extract_algorithms(content))
-
-    if not documents:
-        print("No documents to index.")
-        return
-
-    # index text docs
-    embeddings_fn = get_embedding
-    db = FAISS.from_documents(documents, embeddings_fn, metadatas=metadatas)
-    db.save_local(str(VECTORSTORE_PATH))
-    print(f"Built text vectorstore with {len(documents)} docs.")
-
-    # index unique algorithms
-    unique_algos = set(all_algos)
-    if unique_algos:
-        algo_docs = [Document(page_content=a, metadata={}) for a in unique_algos]
-        algo_dir = VECTORSTORE_PATH / "algos"
-        algo_dir.mkdir(parents=True, exist_ok=True)
-        algo_db = FAISS.from_documents(algo_docs, embeddings_fn)
-        algo_db.save_local(str(algo_dir))
-        print(f"Built algorithm index with {len(unique_algos)} algos.")
+    embeddings = OllamaEmbeddings()
+    with new_generation(store) as generation:
+        gen_dir = generation.path
+        # ingestion embeddings yield to interactive traffic in the model scheduler
+        # names learned by the current generation seed this build's vocabulary
+        pipeline = IngestionPipeline(embeddings, algorithms=AlgorithmExtractor.from_store(locate(store)))
+        with model_priority(PRIORITY_BULK):
+            db, stats = pipeline.run(files)
+
+        if db is None:
+            generation.discard()
+            print("No documents to index.")
+            return
+
+        compaction_report = None
+        if compaction is not None and compaction.enabled:
+            with span("ingest.compact"):
+                compaction_report = compact_store(db, compaction)
+
+        with span("ingest.save"):
+            db.save_local(str(gen_dir))
+            if compaction_report is not None:
+                (gen_dir / COMPACTION_FILE).write_text(json.dumps(compaction_report, indent=2))
+            pipeline.metadata_index.save(gen_dir)
+            pipeline.symbol_index.save(gen_dir)
+            pipeline.algorithms.save(gen_dir)
+            if stats.dedup is not None:
+                (gen_dir / DEDUP_FILE).write_text(json.dumps(stats.dedup.as_dict(), indent=2))
+        print(f"Built text vectorstore with {stats.chunks} chunks from {stats.files} files "
+              f"in {stats.seconds:.1f}s ({stats.stage_summary()}).")
+        if stats.dedup is not None:
+            print(f"Deduplication: {stats.dedup.summary()}.")
+        if stats.images is not None and stats.images.seen:
+            print(f"Images: {stats.images.summary()}.")
+        if compaction_report is not None:
+            r = compaction_report
+            print(f"Compaction: {r['dim_in']}d -> {r['dim_out']}d {r['quantizer']}, {r['ratio']}x smaller, "
+                  f"recall@{r['k']} {r['recall_at_k']}.")
+
+        # index unique algorithms
+        unique_algos = stats.algorithms
+        if unique_algos:
+            algo_docs = [Document(page_content=a, metadata={}) for a in unique_algos]
+            algo_dir = gen_dir / "algos"
+            algo_dir.mkdir(parents=True, exist_ok=True)
+            with span("ingest.algos"), model_priority(PRIORITY_BULK):
+                algo_db = FAISS.from_documents(algo_docs, embeddings)
+                algo_db.save_local(str(algo_dir))
+            print(f"Built algorithm index with {len(unique_algos)} algos.")
+
+        generation.meta = {"source_dir": str(src), "files": stats.files, "chunks": stats.chunks,
+                           "algorithms": len(unique_algos), "seconds": round(stats.seconds, 2),
+                           "compaction": compaction_report is not None}
+    print(f"Published index generation {generation.generation}.")
 
 
 def search_knowledge(query: str, k: int = 5) -> Optional[List[str]]:
     """Retrieve top-k doc contents from FAISS."""
-    if not VECTORSTORE_PATH.exists():
+    from knowledge.index_cache import get_index_cache
+    db = get_index_cache().get(VECTORSTORE_PATH)
+    if db is None:
         return []
-    db = FAISS.load_local(str(VECTORSTORE_PATH), OllamaEmbeddings().embed_query)
     results = db.similarity_search(query, k=k)
     return [doc.page_content for doc in results]
 
@@ -206,6 +244,7 @@ def search_algorithms(query: str, k: int = 5) -> List[str]:
     """
     Retrieve top-k algorithm names semantically similar to the query.
     """
+    from langchain_community.vectorstores import FAISS
     algo_dir = VECTORSTORE_DIR / "algos"
     if not algo_dir.exists():
         return []
@@ -1,12 +1,27 @@
+import heapq
 import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import replace
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 from knowledge.loader import load_file, build_vectorstore, extract_algorithms
 from knowledge.loader import build_vectorstore as _build_vs, build_vectorstore as _build_algos
-from utils.config import SPACES_DIR, DOCS_PATH, VECTORSTORE_PATH, ALGOS_PATH, MEDIA_DIR
-from backend.app.experts.embedder import get_embedding
-from langchain.docstore.document import Document
-from langchain_community.vectorstores import FAISS
+from utils.config import (
+    SPACES_DIR, DOCS_PATH, VECTORSTORE_PATH, ALGOS_PATH, MEDIA_DIR,
+    SEARCH_SPACE_TIMEOUT, SEARCH_FANOUT_WORKERS
+)
+from experts.embedder import get_embedding, get_embeddings
+from knowledge.compaction import COMPACTION_FILE, CompactionSpec
+from knowledge.dedup import DEDUP_FILE
+from knowledge.filters import SearchFilter
+from knowledge.generations import list_generations, locate, rollback
+from knowledge.index_cache import get_index_cache
+from knowledge.symbols import definition_context
+from utils.metrics import span
 
 BASE = Path(__file__).resolve().parent
 SPACES_DIR = BASE / "spaces"
@@ -35,27 +50,207 @@ def create_space(name: str, settings: Dict) -> None:
 def delete_space(name: str) -> None:
     space = SPACES_DIR / name
     if not space.exists(): raise FileNotFoundError(f"Space '{name}' not found.")
-    for p in space.rglob("*"): p.unlink() if p.is_file() else None
-    for d in sorted((space).iterdir(), key=lambda x: x.is_file()): d.rmdir()
+    # vectorstore/algos is nested, so remove the whole tree
+    shutil.rmtree(space)
 
 # Build both docs and algos for a space
 def build_space_vs(name: str) -> None:
     docs_dir = SPACES_DIR / name / "docs"
     media_dir = MEDIA_DIR
     media_dir.mkdir(parents=True, exist_ok=True)
-    _build_vs(str(docs_dir))
-    _build_algos(str(docs_dir))
+    cfg = SPACES_DIR / name / "config.json"
+    settings = json.loads(cfg.read_text()) if cfg.exists() else {}
+    # build_vectorstore writes the text index and the algos index in one pass,
+    # published together as a new generation of the space's vectorstore
+    _build_vs(str(docs_dir), SPACES_DIR / name / "vectorstore", CompactionSpec.from_settings(settings))
 
-# Search within text docs
-def search_space(name: str, query: str, k: int = 5) -> List[str]:
+def space_index_report(name: str) -> Dict:
+    """Build reports of a space's current text index: compaction (recall vs exact) and deduplication."""
+    vs_dir = SPACES_DIR / name / "vectorstore"
+    if not (SPACES_DIR / name).exists(): raise FileNotFoundError(f"Space '{name}' not found.")
+    gen_dir = locate(vs_dir)
+    report = {}
+    for key, filename in (("compaction", COMPACTION_FILE), ("dedup", DEDUP_FILE)):
+        path = gen_dir / filename
+        report[key] = json.loads(path.read_text()) if path.exists() else None
+    return report
+
+def space_generations(name: str) -> Dict:
+    """Published index generations of a space, newest first."""
+    if not (SPACES_DIR / name).exists(): raise FileNotFoundError(f"Space '{name}' not found.")
+    return list_generations(SPACES_DIR / name / "vectorstore")
+
+def rollback_space(name: str, to: Optional[str] = None) -> str:
+    """Make `to` (default: the previous generation) the space's current index; returns its id."""
+    if not (SPACES_DIR / name).exists(): raise FileNotFoundError(f"Space '{name}' not found.")
+    return rollback(SPACES_DIR / name / "vectorstore", to)
+
+def _index_dir(name: str, algos: bool = False) -> Path:
     vs_dir = SPACES_DIR / name / "vectorstore"
-    if not vs_dir.exists(): return []
-    db = FAISS.load_local(str(vs_dir), get_embedding)
-    return [d.page_content for d in db.similarity_search(query, k=k)]
+    return vs_dir / "algos" if algos else vs_dir
+
+def _has_index(index_dir: Path) -> bool:
+    return (locate(index_dir) / "index.faiss").exists()
+
+def _space_filter(name: str, flt: Optional[SearchFilter]) -> Optional[SearchFilter]:
+    # source prefixes are relative to the space's docs directory unless absolute
+    if flt is None or not flt.source_prefix or Path(flt.source_prefix).is_absolute():
+        return flt
+    prefix = str(SPACES_DIR / name / "docs" / flt.source_prefix)
+    # Path drops a trailing separator, which is what keeps "lectures/" from matching "lectures_old/..."
+    if flt.source_prefix.endswith(("/", os.sep)):
+        prefix += os.sep
+    return replace(flt, source_prefix=prefix)
+
+def _knn(index_dir: Path, vectors, k: int, flt: Optional[SearchFilter] = None):
+    """(db, distances, ids) for a matrix of query vectors, restricted to rows matching flt; None without an index."""
+    import numpy as np
+    cache = get_index_cache()
+    with span("search.load_index"):
+        db = cache.get(index_dir)
+    if db is None: return None
+    params = None
+    if flt is not None and not flt.is_empty():
+        with span("search.filter"):
+            meta = cache.filters(index_dir, db)
+            bits = meta.select(flt)
+        if not bits:
+            empty = np.full((len(vectors), k), -1, dtype="int64")
+            return db, np.zeros((len(vectors), k), dtype="float32"), empty
+        params = meta.search_params(bits)
+    with span("search.faiss"):
+        distances, ids = db.index.search(vectors, k, params=params)
+    return db, distances, ids
+
+def _docs(db, distances, ids):
+    """Per query row, (Document, distance) pairs; FAISS pads missing hits with id -1."""
+    return [[(db.docstore.search(db.index_to_docstore_id[i]), float(d)) for d, i in zip(row_d, row_i) if i >= 0]
+            for row_d, row_i in zip(distances, ids)]
+
+def _search(index_dir: Path, query: str, k: int, flt: Optional[SearchFilter] = None) -> List[str]:
+    import numpy as np
+    if not _has_index(index_dir): return []
+    with span("search.embed"):
+        vector = np.asarray([get_embedding(query)], dtype="float32")
+    found = _knn(index_dir, vector, k, flt)
+    if found is None: return []
+    return [doc.page_content for doc, _ in _docs(*found)[0]]
+
+# Search within text docs
+def search_space(name: str, query: str, k: int = 5, flt: Optional[SearchFilter] = None) -> List[str]:
+    return _search(_index_dir(name), query, k, _space_filter(name, flt))
 
 # Search within algorithms
 def search_space_algos(name: str, query: str, k: int = 5) -> List[str]:
-    algo_dir = SPACES_DIR / name / "vectorstore" / "algos"
-    if not algo_dir.exists(): return []
-    db = FAISS.load_local(str(algo_dir), get_embedding)
-    return [d.page_content for d in db.similarity_search(query, k=k)]
\ No newline at end of file
+    return _search(_index_dir(name, algos=True), query, k)
+
+# Code definitions by exact symbol lookup
+def search_space_symbols(name: str, query: str) -> Dict:
+    """Definitions of the identifiers in query ("Retriever.search", `build()`), with their code."""
+    index_dir = _index_dir(name)
+    if not _has_index(index_dir): return {"definitions": [], "report": None}
+    cache = get_index_cache()
+    db = cache.get(index_dir)
+    if db is None: return {"definitions": [], "report": None}
+    with span("search.symbols"):
+        symbols = cache.symbols(index_dir, db)
+        blocks, report = definition_context(db, symbols, query)
+    return {"definitions": blocks, "report": report}
+
+# Many queries against one index: batched embedding, one matrix search
+def search_space_batch(name: str, queries: List[str], k: int = 5, algos: bool = False,
+                       flt: Optional[SearchFilter] = None) -> List[List[Dict]]:
+    """Per query, up to k hits as {"content", "score", "metadata"}; score is the FAISS distance (lower is closer)."""
+    import numpy as np
+    index_dir = _index_dir(name, algos)
+    if not queries or not _has_index(index_dir): return [[] for _ in queries]
+    with span("search.embed"):
+        vectors = np.asarray(get_embeddings(queries), dtype="float32")
+    found = _knn(index_dir, vectors, k, _space_filter(name, flt))
+    if found is None: return [[] for _ in queries]
+    return [[{"content": doc.page_content, "score": dist, "metadata": doc.metadata} for doc, dist in row]
+            for row in _docs(*found)]
+
+# --- Federated search ---
+_fanout: Optional[ThreadPoolExecutor] = None
+_fanout_lock = threading.Lock()
+
+def _executor() -> ThreadPoolExecutor:
+    global _fanout
+    with _fanout_lock:
+        if _fanout is None:
+            _fanout = ThreadPoolExecutor(SEARCH_FANOUT_WORKERS, thread_name_prefix="space-search")
+    return _fanout
+
+def _similarity(db, distance: float) -> float:
+    """Higher is closer, whatever metric the index uses, so hits from different spaces compare."""
+    from langchain_community.vectorstores.utils import DistanceStrategy
+    if db.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT:
+        return float(distance)
+    return -float(distance)
+
+def _search_one(name: str, vector, k: int, algos: bool, flt: Optional[SearchFilter] = None) -> List[Dict]:
+    import numpy as np
+    index_dir = _index_dir(name, algos)
+    if not _has_index(index_dir):
+        raise FileNotFoundError(f"Space '{name}' has no index")
+    db = get_index_cache().get(index_dir)
+    if db is None:
+        raise FileNotFoundError(f"Space '{name}' has no index")
+    if db.index.d != len(vector):
+        raise ValueError(f"index dimension {db.index.d} != query dimension {len(vector)}")
+    found = _knn(index_dir, np.asarray([vector], dtype="float32"), k, _space_filter(name, flt))
+    return [{"space": name, "content": doc.page_content, "score": _similarity(db, dist), "metadata": doc.metadata}
+            for doc, dist in _docs(*found)[0]]
+
+def search_spaces(query: str, names: Optional[List[str]] = None, k: int = 5, algos: bool = False,
+                  timeout: float = SEARCH_SPACE_TIMEOUT, flt: Optional[SearchFilter] = None) -> Dict:
+    """
+    Embed the query once, search the selected spaces (default: all) concurrently
+    and keep the global top-k in a heap. Spaces that miss the timeout are left
+    out of the result and reported as "timeout".
+    """
+    if names is None:
+        names = [s.name for s in SPACES_DIR.iterdir() if s.is_dir()] if SPACES_DIR.exists() else []
+    status: Dict[str, Dict] = {}
+    if not names:
+        return {"results": [], "spaces": status}
+    with span("search.embed"):
+        vector = get_embedding(query)
+
+    start = time.perf_counter()
+    futures = {_executor().submit(_search_one, name, vector, k, algos, flt): name for name in names}
+    top: List = []  # min-heap of (score, seq, hit), size <= k
+    seq = 0
+    with span("search.fanout"):
+        pending = set(futures)
+        deadline = start + timeout
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.perf_counter(), 0),
+                                 return_when="FIRST_COMPLETED")
+            if not done:
+                break
+            for f in done:
+                name = futures[f]
+                elapsed = round((time.perf_counter() - start) * 1000, 1)
+                try:
+                    hits = f.result()
+                except FileNotFoundError:
+                    status[name] = {"status": "no_index", "ms": elapsed}
+                    continue
+                except Exception as e:
+                    status[name] = {"status": "error", "error": str(e), "ms": elapsed}
+                    continue
+                status[name] = {"status": "ok", "hits": len(hits), "ms": elapsed}
+                for hit in hits:
+                    seq += 1
+                    if len(top) < k:
+                        heapq.heappush(top, (hit["score"], seq, hit))
+                    elif hit["score"] > top[0][0]:
+                        heapq.heapreplace(top, (hit["score"], seq, hit))
+        for f in pending:
+            # the worker finishes in the background; its hits are dropped
+            f.cancel()
+            status[futures[f]] = {"status": "timeout", "ms": round(timeout * 1000, 1)}
+    results = [hit for _, _, hit in sorted(top, key=lambda x: (-x[0], x[1]))]
+    return {"results": results, "spaces": status}
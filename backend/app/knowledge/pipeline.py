@@ -0,0 +1,301 @@
+# backend/app/knowledge/pipeline.py
+import logging
+import queue
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from knowledge.dedup import Deduplicator, DedupReport
+from knowledge.filters import MetadataIndex
+from knowledge.formats import Segment
+from knowledge.gazetteer import AlgorithmExtractor
+from knowledge.images import ImageBatcher, ImageReport, PreparedImage, get_captioner, get_preparer
+from knowledge.loader import iter_segments
+from knowledge.symbols import SymbolIndex
+from utils.config import (
+    CHUNK_SIZE, CHUNK_OVERLAP, EMBED_BATCH_SIZE, INGEST_QUEUE_SIZE, DEDUP_MODE, IMAGES_CAPTION
+)
+from utils.metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+Chunk = Tuple[str, Dict[str, Any]]
+
+_DONE = object()
+
+
+@dataclass
+class IngestionStats:
+    files: int = 0
+    segments: int = 0
+    chunks: int = 0
+    failed: List[str] = field(default_factory=list)
+    algorithms: Set[str] = field(default_factory=set)
+    seconds: float = 0.0
+    # busy seconds per stage; parse/chunk run concurrently with embed/index
+    stages: Dict[str, float] = field(default_factory=dict)
+    # near-duplicate chunks and documents skipped before embedding
+    dedup: Optional[DedupReport] = None
+    # pictures seen, deduplicated and captioned (images.caption)
+    images: Optional[ImageReport] = None
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, stage=f"ingest.{stage}")
+
+    def stage_summary(self) -> str:
+        return ", ".join(f"{k} {v:.1f}s" for k, v in self.stages.items())
+
+
+# --- Clean ---
+def clean_text(text: str) -> str:
+    """Normalise extracted text: drop NULs, join hyphenated line breaks, squeeze blanks."""
+    text = text.replace("\x00", "")
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+    text = re.sub(r"[ \t\f\v]+", " ", text)
+    text = re.sub(r"\n\s*\n\s*\n+", "\n\n", text)
+    return text.strip()
+
+
+# --- Chunk ---
+def _split_long(piece: str, size: int) -> Iterator[str]:
+    """Split a paragraph longer than `size` on word boundaries."""
+    current, length = [], 0
+    for w in piece.split(" "):
+        while len(w) > size:  # e.g. minified tables or base64 blobs
+            yield w[:size]
+            w = w[size:]
+        if current and length + len(w) + 1 > size:
+            yield " ".join(current)
+            current, length = [], 0
+        current.append(w)
+        length += len(w) + 1
+    if current:
+        yield " ".join(current)
+
+
+def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> Iterator[str]:
+    """Greedily pack paragraphs into ~size-char chunks with a trailing overlap."""
+    pieces: List[str] = []
+    for para in text.split("\n\n"):
+        if len(para) > size:
+            pieces.extend(_split_long(para, max(size - overlap, 1)))
+        elif para:
+            pieces.append(para)
+
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) + 2 > size:
+            yield current
+            tail = current[-overlap:] if overlap else ""
+            # start the overlap on a word boundary
+            current = tail[tail.find(" ") + 1:] if " " in tail else ""
+        current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        yield current
+
+
+# --- Pipeline ---
+class IngestionPipeline:
+    """
+    Streaming load -> clean -> chunk -> embed -> index.
+
+    A producer thread parses files into chunk batches and hands them over a
+    bounded queue; the caller's thread embeds and indexes them. When embedding
+    falls behind, the full queue blocks the parser, so at most
+    `queue_size` batches are ever held in memory.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        chunk_size: int = CHUNK_SIZE,
+        chunk_overlap: int = CHUNK_OVERLAP,
+        batch_size: int = EMBED_BATCH_SIZE,
+        queue_size: int = INGEST_QUEUE_SIZE,
+        dedup: str = DEDUP_MODE,
+        captions: bool = IMAGES_CAPTION,
+        algorithms: Optional[AlgorithmExtractor] = None,
+    ):
+        self.embeddings = embeddings
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        # "link", "skip" or "off"; see knowledge/dedup.py
+        self.dedup = dedup
+        # caption pictures into their segment's text; see knowledge/images.py
+        self.captions = captions
+        self.images: Optional[ImageBatcher] = None
+        # row id -> metadata bitmaps for filtered search, rebuilt by every run
+        self.metadata_index = MetadataIndex()
+        # code symbol -> defining rows, for exact lookups (knowledge/symbols.py)
+        self.symbol_index = SymbolIndex()
+        # algorithm names, one pass per segment (knowledge/gazetteer.py); learns as it goes
+        self.algorithms = algorithms or AlgorithmExtractor()
+        self.deduplicator: Optional[Deduplicator] = None
+
+    def iter_chunks(self, files: Iterable[Path], stats: IngestionStats) -> Iterator[Chunk]:
+        dedup = self.deduplicator
+        for fp in files:
+            if dedup is not None:
+                dedup.start_document(str(fp))
+            try:
+                segments = iter_segments(fp)
+                if self.images is not None:
+                    segments = self._captioned(segments, stats)
+                while True:
+                    t0 = time.perf_counter()
+                    captioning = stats.stages.get("caption", 0.0)
+                    segment = next(segments, None)
+                    t1 = time.perf_counter()
+                    stats.add_stage("parse", t1 - t0 - (stats.stages.get("caption", 0.0) - captioning))
+                    if segment is None:
+                        break
+                    stats.segments += 1
+                    chunks = list(self._chunk_segment(segment, stats))
+                    t2 = time.perf_counter()
+                    stats.add_stage("chunk", t2 - t1)
+                    if dedup is not None:
+                        chunks = [c for c in chunks if dedup.keep(*c)]
+                        stats.add_stage("dedup", time.perf_counter() - t2)
+                    yield from chunks
+                stats.files += 1
+            except Exception as e:
+                logger.error(f"Error ingesting {fp}: {str(e)}")
+                stats.failed.append(str(fp))
+            finally:
+                if dedup is not None:
+                    dedup.end_document()
+
+    def _captioned(self, segments: Iterator[Segment], stats: IngestionStats) -> Iterator[Segment]:
+        """
+        Append captions of a file's new pictures to their segments' text.
+        Segments are held back until `caption_batch` pictures are waiting (or
+        the file ends) so captioning runs in batches; order is preserved.
+        """
+        batcher = self.images
+        pending: List[Tuple[Segment, List[PreparedImage]]] = []
+        waiting = 0
+
+        def flush() -> Iterator[Segment]:
+            t0 = time.perf_counter()
+            captions = iter(batcher.describe([image for _, images in pending for image in images]))
+            stats.add_stage("caption", time.perf_counter() - t0)
+            for segment, images in pending:
+                found = [c for c in (next(captions) for _ in images) if c]
+                if found:
+                    segment.text = "\n\n".join([segment.text, *(f"[Image] {c}" for c in found)]).strip()
+                yield segment
+            pending.clear()
+
+        for segment in segments:
+            t0 = time.perf_counter()
+            new = batcher.unique(segment.images) if segment.images else []
+            stats.add_stage("caption", time.perf_counter() - t0)
+            if not new and not pending:
+                yield segment
+                continue
+            pending.append((segment, new))
+            waiting += len(new)
+            if waiting >= batcher.captioner.batch:
+                yield from flush()
+                waiting = 0
+        if pending:
+            yield from flush()
+
+    def _chunk_segment(self, segment: Segment, stats: IngestionStats) -> Iterator[Chunk]:
+        if segment.metadata.get("language"):
+            # source code: whitespace is significant
+            text = segment.text.replace("\x00", "").strip("\n")
+        else:
+            text = clean_text(segment.text)
+        if not text.strip():
+            return
+        algos = self.algorithms.extract(text)
+        stats.algorithms.update(algos)
+        metadata = {k: v for k, v in segment.metadata.items() if k != "prechunked"}
+        if segment.metadata.get("prechunked"):
+            # e.g. CSV row groups: splitting would detach rows from their header
+            chunks = [text]
+        else:
+            chunks = chunk_text(text, self.chunk_size, self.chunk_overlap)
+        for i, chunk in enumerate(chunks):
+            yield chunk, {**metadata, "chunk": i, "algorithms": algos}
+
+    def _produce(self, files: List[Path], stats: IngestionStats, out: "queue.Queue", stop: threading.Event):
+        try:
+            batch: List[Chunk] = []
+            for chunk in self.iter_chunks(files, stats):
+                batch.append(chunk)
+                if len(batch) == self.batch_size:
+                    out.put(batch)
+                    batch = []
+                if stop.is_set():
+                    return
+            if batch:
+                out.put(batch)
+        except BaseException as e:  # surfaced in the consumer
+            out.put(e)
+        finally:
+            out.put(_DONE)
+
+    def run(self, files: Iterable[Path]):
+        """Ingest files and return (FAISS index or None, IngestionStats)."""
+        from langchain_community.vectorstores import FAISS
+
+        start = time.perf_counter()
+        stats = IngestionStats()
+        self.metadata_index = MetadataIndex()
+        self.symbol_index = SymbolIndex()
+        self.deduplicator = Deduplicator(self.dedup) if self.dedup != "off" else None
+        self.images = ImageBatcher(get_captioner(), get_preparer()) if self.captions else None
+        batches: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=self._produce, args=(list(files), stats, batches, stop),
+            name="ingest-producer", daemon=True,
+        )
+        producer.start()
+
+        db = None
+        try:
+            while True:
+                batch = batches.get()
+                if batch is _DONE:
+                    break
+                if isinstance(batch, BaseException):
+                    raise batch
+                texts = [text for text, _ in batch]
+                metadatas = [meta for _, meta in batch]
+                t0 = time.perf_counter()
+                vectors = self.embeddings.embed_documents(texts)
+                t1 = time.perf_counter()
+                pairs = list(zip(texts, vectors))
+                if db is None:
+                    db = FAISS.from_embeddings(pairs, self.embeddings, metadatas=metadatas)
+                else:
+                    db.add_embeddings(pairs, metadatas=metadatas)
+                self.metadata_index.add(metadatas)
+                self.symbol_index.add(metadatas)
+                stats.add_stage("embed", t1 - t0)
+                stats.add_stage("index", time.perf_counter() - t1)
+                stats.chunks += len(batch)
+        finally:
+            stop.set()
+            # unblock a producer waiting on a full queue
+            while producer.is_alive():
+                try:
+                    batches.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+        if self.deduplicator is not None:
+            if db is not None:
+                self.deduplicator.apply_links(db, self.metadata_index)
+            stats.dedup = self.deduplicator.report
+        if self.images is not None:
+            stats.images = self.images.report
+        stats.seconds = time.perf_counter() - start
+        return db, stats
@@ -0,0 +1,266 @@
+# backend/app/knowledge/rerank.py
+"""
+Two-stage retrieval: retrieve many, rerank few.
+
+Chat and fullcomplete used to paste the raw FAISS top-k into the prompt,
+and prefill time grows with every passage. Here FAISS over-fetches
+`fetch_k` candidates, which are re-scored on the CPU by a cheap blend of
+lexical overlap (share of query terms found in the passage) and cosine
+similarity between the query and passage embeddings (vectors reconstructed
+from the index in one batch, no model call; projected vectors for
+compacted indexes). Only the best passages are kept, up to `max_passages`
+and a token budget, and passages scoring far below the best one are
+dropped.
+
+Scores are cached per (query, passage) pair, keyed by the normalised query
+and a hash of the passage text, so repeated and related questions (and the
+per-algorithm lookups of fullcomplete) skip the scoring work; query
+embeddings are cached too.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from experts.embedder import get_embedding, get_embeddings
+from utils.context_builder import count_tokens
+from utils.metrics import span
+from utils.config import (
+    RETRIEVAL_FETCH_K, RETRIEVAL_MAX_PASSAGES, RETRIEVAL_CONTEXT_TOKENS,
+    RETRIEVAL_LEXICAL_WEIGHT, RETRIEVAL_MIN_SCORE_RATIO, RETRIEVAL_CACHE_SIZE
+)
+
+_TERM = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how in is it its of on or that the this to "
+    "was what when where which who why will with you your explain describe give me about".split()
+)
+
+
+def terms(text: str) -> set:
+    return {t for t in _TERM.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS}
+
+
+def lexical_overlap(query_terms: set, text: str) -> float:
+    """Fraction of the query's terms that occur in text."""
+    if not query_terms:
+        return 0.0
+    return len(query_terms & terms(text)) / len(query_terms)
+
+
+def _query_key(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class _LRU:
+    def __init__(self, size: int):
+        self.size = size
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+@dataclass
+class Passage:
+    content: str
+    metadata: Dict[str, Any]
+    score: float
+    similarity: float
+    lexical: float
+    tokens: int
+
+    def as_dict(self) -> Dict:
+        return dict(self.__dict__)
+
+
+@dataclass
+class RetrievalReport:
+    candidates: int = 0
+    selected: int = 0
+    candidate_tokens: int = 0
+    context_tokens: int = 0
+    cached_scores: int = 0
+    dropped: Dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict:
+        return dict(self.__dict__)
+
+
+class Reranker:
+    def __init__(self, fetch_k: int = RETRIEVAL_FETCH_K, max_passages: int = RETRIEVAL_MAX_PASSAGES,
+                 context_tokens: int = RETRIEVAL_CONTEXT_TOKENS, lexical_weight: float = RETRIEVAL_LEXICAL_WEIGHT,
+                 min_score_ratio: float = RETRIEVAL_MIN_SCORE_RATIO, cache_size: int = RETRIEVAL_CACHE_SIZE):
+        self.fetch_k = fetch_k
+        self.max_passages = max_passages
+        self.context_tokens = context_tokens
+        self.lexical_weight = lexical_weight
+        self.min_score_ratio = min_score_ratio
+        # (query key, passage hash) -> (similarity, lexical); query key -> embedding
+        self.scores = _LRU(cache_size)
+        self.queries = _LRU(max(cache_size // 16, 64))
+
+    # --- Stage 1: candidates ---
+    def _embed(self, queries: List[str]):
+        import numpy as np
+
+        keys = [_query_key(q) for q in queries]
+        vectors = [self.queries.get(k) for k in keys]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            texts = [queries[i] for i in missing]
+            fresh = [get_embedding(texts[0])] if len(texts) == 1 else get_embeddings(texts)
+            for i, v in zip(missing, fresh):
+                vectors[i] = v
+                self.queries.put(keys[i], v)
+        return np.asarray(vectors, dtype="float32")
+
+    def _candidates(self, db, vectors, k: int):
+        with span("retrieve.search"):
+            _, ids = db.index.search(vectors, min(k, db.index.ntotal))
+        return [[int(i) for i in row if i >= 0] for row in ids]
+
+    # --- Stage 2: rerank ---
+    def _vectors(self, db, ids: List[int], vector):
+        """Stored vectors of ids and the query vector, in the space the index compares them in."""
+        import faiss
+        import numpy as np
+
+        index = faiss.downcast_index(db.index)
+        query = vector[None, :]
+        if isinstance(index, faiss.IndexPreTransform):
+            # compacted index (knowledge/compaction.py): compare projected vectors
+            for i in range(index.chain.size()):
+                query = faiss.downcast_VectorTransform(index.chain.at(i)).apply(query)
+            index = faiss.downcast_index(index.index)
+        try:
+            return index.reconstruct_batch(np.asarray(ids, dtype="int64")), query[0]
+        except RuntimeError:
+            # index types without reconstruction; lexical overlap still ranks them
+            return None, None
+
+    def rerank(self, db, query: str, vector, ids: List[int]) -> Tuple[List[Passage], int]:
+        """Score the candidate rows of db for query; returns passages best first and the cache hit count."""
+        import numpy as np
+
+        qkey = _query_key(query)
+        qterms = terms(query)
+        docs = [db.docstore.search(db.index_to_docstore_id[i]) for i in ids]
+        keys = [(qkey, _text_key(d.page_content)) for d in docs]
+        cached = [self.scores.get(k) for k in keys]
+        missing = [j for j, c in enumerate(cached) if c is None]
+        if missing:
+            vecs, q = self._vectors(db, [ids[j] for j in missing], vector)
+            if vecs is not None:
+                q = q / (np.linalg.norm(q) or 1.0)
+                norms = np.linalg.norm(vecs, axis=1)
+                norms[norms == 0] = 1.0
+                sims = (vecs @ q) / norms
+            else:
+                sims = np.zeros(len(missing), dtype="float32")
+            for j, sim in zip(missing, sims):
+                cached[j] = (float(sim), lexical_overlap(qterms, docs[j].page_content))
+                self.scores.put(keys[j], cached[j])
+
+        w = self.lexical_weight
+        passages = [
+            Passage(d.page_content, dict(d.metadata), (1 - w) * sim + w * lex, sim, lex, count_tokens(d.page_content))
+            for d, (sim, lex) in zip(docs, cached)
+        ]
+        passages.sort(key=lambda p: p.score, reverse=True)
+        return passages, len(ids) - len(missing)
+
+    def select(self, passages: List[Passage], budget: int, max_passages: int,
+               report: RetrievalReport) -> List[Passage]:
+        """Best passages first, while they fit the budget and score near the best one."""
+        kept: List[Passage] = []
+        seen = set()
+        used = 0
+        floor = passages[0].score * self.min_score_ratio if passages and passages[0].score > 0 else None
+        for p in passages:
+            reason = None
+            if len(kept) >= max_passages:
+                reason = "max_passages"
+            elif floor is not None and p.score < floor:
+                reason = "low_score"
+            elif p.content in seen:
+                reason = "duplicate"
+            elif used + p.tokens > budget and kept:
+                # the best passage is always kept; the context builder trims it if needed
+                reason = "budget"
+            if reason:
+                report.dropped[reason] = report.dropped.get(reason, 0) + 1
+                continue
+            kept.append(p)
+            seen.add(p.content)
+            used += p.tokens
+        report.selected = len(kept)
+        report.context_tokens = used
+        return kept
+
+    # --- Entry points ---
+    def retrieve_many(self, db, queries: List[str], fetch_k: Optional[int] = None,
+                      max_passages: Optional[int] = None,
+                      budget: Optional[int] = None) -> List[Tuple[List[Passage], RetrievalReport]]:
+        """Two-stage retrieval for several queries: one embedding batch, one matrix search."""
+        if db is None or not queries or db.index.ntotal == 0:
+            return [([], RetrievalReport()) for _ in queries]
+        with span("retrieve.embed"):
+            vectors = self._embed(queries)
+        candidates = self._candidates(db, vectors, fetch_k or self.fetch_k)
+        out = []
+        with span("retrieve.rerank"):
+            for query, vector, ids in zip(queries, vectors, candidates):
+                report = RetrievalReport(candidates=len(ids))
+                passages, report.cached_scores = self.rerank(db, query, vector, ids)
+                report.candidate_tokens = sum(p.tokens for p in passages)
+                kept = self.select(passages, budget or self.context_tokens, max_passages or self.max_passages, report)
+                out.append((kept, report))
+        return out
+
+    def retrieve(self, db, query: str, **kwargs) -> Tuple[List[Passage], RetrievalReport]:
+        return self.retrieve_many(db, [query], **kwargs)[0]
+
+    def metrics(self):
+        return [
+            ("edris_rerank_cache_entries", "gauge", "Cached reranker entries",
+             [({"cache": "scores"}, len(self.scores)), ({"cache": "queries"}, len(self.queries))]),
+            ("edris_rerank_cache_hits_total", "counter", "Reranker cache hits",
+             [({"cache": "scores"}, self.scores.hits), ({"cache": "queries"}, self.queries.hits)]),
+            ("edris_rerank_cache_misses_total", "counter", "Reranker cache misses",
+             [({"cache": "scores"}, self.scores.misses), ({"cache": "queries"}, self.queries.misses)]),
+        ]
+
+
+_reranker: Optional[Reranker] = None
+
+
+def get_reranker() -> Reranker:
+    global _reranker
+    if _reranker is None:
+        _reranker = Reranker()
+    return _reranker
@@ -0,0 +1,204 @@
+# backend/app/knowledge/symbols.py
+"""
+Exact-match symbol index over ingested source code.
+
+Code segments (knowledge/formats/code.py) list the names they define in
+metadata["symbols"]. While the pipeline adds chunks to FAISS, every symbol
+is recorded with its row id, source file and line span, and the index is
+saved as symbols.json next to filters.json. A definition is found under
+its qualified name ("Retriever.search") and under its last component
+("search"). An unknown dotted name ("retriever.search") falls back to its
+last component only when the qualifier is an indexed class or module, and
+only to definitions inside it, so "os.path.join" or "e.g." do not pick up
+an unrelated `join` or `g`.
+
+Code questions resolve definitions here before any vector search: the
+identifiers in the question (backticked spans, dotted names, snake_case,
+camelCase, calls like `build()`) are looked up directly, and the chunks
+that define them become the whole context, so codegemma gets the few
+definitions it was asked about instead of the nearest prose chunks.
+"""
+import json
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from utils.config import RETRIEVAL_CONTEXT_TOKENS, SYMBOL_MAX_CHUNKS
+
+SYMBOLS_FILE = "symbols.json"
+
+_BACKTICK = re.compile(r"`([^`\n]+)`")
+_TOKEN = re.compile(r"[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*(\()?")
+
+
+def identifiers(text: str) -> List[str]:
+    """Names in a question that look like code, in order of appearance."""
+    found: List[str] = []
+    for span in _BACKTICK.findall(text):
+        found += [m.group(0).rstrip("( ") for m in _TOKEN.finditer(span)]
+    for m in _TOKEN.finditer(_BACKTICK.sub(" ", text)):
+        name = m.group(0).rstrip("( ")
+        if (m.group(1) or "." in name or "_" in name
+                or any(c.isupper() for c in name[1:]) and any(c.islower() for c in name)):
+            found.append(name)
+    return list(dict.fromkeys(n.strip(".") for n in found if n.strip(".")))
+
+
+@dataclass
+class Definition:
+    symbol: str
+    kind: str
+    source: str
+    line: int
+    end_line: int
+    rows: List[int]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+
+class SymbolIndex:
+    def __init__(self):
+        self.size = 0
+        # qualified symbol -> definition; short name -> qualified symbols
+        self.definitions: Dict[str, List[Definition]] = {}
+        self.short: Dict[str, List[str]] = {}
+        # class and module names a dotted name may be qualified with (built on first fallback)
+        self._scopes: Optional[set] = None
+
+    # --- Building ---
+    def add(self, metadatas: Iterable[Dict[str, Any]]) -> None:
+        """Record symbols of the next rows, in the order they were added to FAISS."""
+        self._scopes = None
+        for metadata in metadatas:
+            row = self.size
+            self.size += 1
+            for symbol in metadata.get("symbols") or ():
+                defs = self.definitions.setdefault(symbol, [])
+                source = metadata.get("source", "")
+                same = next((d for d in defs if d.source == source and d.line == metadata.get("line")), None)
+                if same is not None:
+                    # a definition longer than one chunk
+                    same.rows.append(row)
+                    continue
+                defs.append(Definition(symbol, metadata.get("kind", ""), source,
+                                       metadata.get("line", 0), metadata.get("end_line", 0), [row]))
+                short = symbol.rsplit(".", 1)[-1]
+                if short != symbol:
+                    self.short.setdefault(short, []).append(symbol)
+
+    @classmethod
+    def from_docstore(cls, db) -> "SymbolIndex":
+        """Rebuild from a loaded LangChain FAISS store (indexes saved before symbols existed)."""
+        index = cls()
+        index.add(db.docstore.search(db.index_to_docstore_id[i]).metadata for i in range(db.index.ntotal))
+        return index
+
+    def save(self, index_dir: Path) -> None:
+        data = {"size": self.size, "definitions": {s: [d.as_dict() for d in defs]
+                                                   for s, defs in self.definitions.items()}}
+        (Path(index_dir) / SYMBOLS_FILE).write_text(json.dumps(data))
+
+    @classmethod
+    def load(cls, index_dir: Path) -> Optional["SymbolIndex"]:
+        path = Path(index_dir) / SYMBOLS_FILE
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text())
+        index = cls()
+        index.size = data["size"]
+        for symbol, defs in data["definitions"].items():
+            index.definitions[symbol] = [Definition(**d) for d in defs]
+            short = symbol.rsplit(".", 1)[-1]
+            if short != symbol:
+                index.short.setdefault(short, []).append(symbol)
+        return index
+
+    # --- Querying ---
+    def scopes(self) -> set:
+        if self._scopes is None:
+            scopes = set()
+            for symbol, defs in self.definitions.items():
+                if "." in symbol:
+                    scopes.add(symbol.rsplit(".", 1)[0].rsplit(".", 1)[-1])
+                scopes.update(symbol for d in defs if d.kind == "class")
+                scopes.update(Path(d.source).stem for d in defs if d.source)
+            self._scopes = scopes
+        return self._scopes
+
+    def lookup(self, name: str, fallback: bool = True) -> List[Definition]:
+        """
+        Definitions of a qualified or short name. With fallback, "Scope.method"
+        also tries "method" inside Scope when Scope is an indexed class or module.
+        """
+        if name in self.definitions:
+            return list(self.definitions[name])
+        found = [d for symbol in self.short.get(name, ()) for d in self.definitions[symbol]]
+        if found or not fallback or "." not in name:
+            return found
+        qualifier, short = name.rsplit(".", 1)
+        scope = qualifier.rsplit(".", 1)[-1]
+        if len(short) < 2 or scope not in self.scopes():
+            return []
+        return [d for d in self.lookup(short, fallback=False)
+                if d.symbol.rsplit(".", 1)[0].rsplit(".", 1)[-1] == scope or Path(d.source).stem == scope]
+
+    def resolve(self, text: str) -> List[Definition]:
+        """Definitions of every identifier in text, first mention first, without repeats."""
+        return [d for d, _ in _resolve(self, text)]
+
+    def __len__(self):
+        return len(self.definitions)
+
+
+def _resolve(symbols: SymbolIndex, text: str) -> List[Tuple[Definition, bool]]:
+    """resolve(), with whether each definition matched a name exactly (not by fallback)."""
+    out, seen = [], set()
+    for name in identifiers(text):
+        found = symbols.lookup(name, fallback=False)
+        exact = bool(found)
+        for d in found if exact else symbols.lookup(name):
+            key = (d.symbol, d.source, d.line)
+            if key not in seen:
+                seen.add(key)
+                out.append((d, exact))
+    return out
+
+
+def _header(d: Definition) -> str:
+    return f"# {d.source}:{d.line}-{d.end_line} ({d.kind} {d.symbol})"
+
+
+def definition_context(db, symbols: SymbolIndex, text: str, max_chunks: int = SYMBOL_MAX_CHUNKS,
+                       budget: int = RETRIEVAL_CONTEXT_TOKENS) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Code of the definitions text refers to, headed by file and lines, within
+    max_chunks chunks and budget tokens (the first definition is always kept).
+    Returns ([], report) when the text names no indexed symbol; report["exact"]
+    is False when every definition kept came from the dotted-name fallback.
+    """
+    from utils.context_builder import count_tokens
+
+    definitions = _resolve(symbols, text)
+    blocks: List[str] = []
+    used_rows = set()
+    tokens = 0
+    resolved = []
+    exact = False
+    for d, matched in definitions:
+        rows = [r for r in d.rows if r not in used_rows]
+        if not rows:
+            continue  # a class chunk already holds this method
+        code = "\n".join(db.docstore.search(db.index_to_docstore_id[r]).page_content for r in rows)
+        block = f"{_header(d)}\n{code}"
+        cost = count_tokens(block)
+        if blocks and (len(used_rows) + len(rows) > max_chunks or tokens + cost > budget):
+            continue
+        blocks.append(block)
+        used_rows.update(rows)
+        tokens += cost
+        resolved.append(d.symbol)
+        exact = exact or matched
+    report = {"identifiers": identifiers(text), "matched": len(definitions), "resolved": resolved,
+              "exact": exact, "chunks": len(used_rows), "tokens": tokens}
+    return blocks, report
@@ -1,19 +1,31 @@
 ## File: backend/app/main.py
-from fastapi import FastAPI, BackgroundTasks, File, UploadFile
+from fastapi import FastAPI, BackgroundTasks, Depends, File, HTTPException, Query, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
-from typing import List
+from fastapi.responses import FileResponse, RedirectResponse, JSONResponse, PlainTextResponse
+from typing import List, Optional
+from pydantic import BaseModel
 from utils.router import chat_endpoint as chat_handler, ChatRequest, ChatResponse
 
 from utils.config import (
     BACKEND_HOST, BACKEND_PORT, FRONTEND_ORIGINS,
     DOCS_PATH, SPACES_DIR ,DOCS_PATH, VECTORSTORE_PATH,
-    ALGOS_PATH, MEDIA_DIR
+    ALGOS_PATH, MEDIA_DIR, FAST_STARTUP, PRELOAD_MODULES, SEARCH_MAX_BATCH_QUERIES,
+    SEARCH_SPACE_TIMEOUT, PROFILING_ENABLED
 )
+from utils.lazy import preload
+from utils.metrics import register_collector, render as render_metrics, trace
+from utils.ollama_pool import get_pool
+from utils.profiler import ProfilingMiddleware, get_profiler
+from utils.residency import get_residency
+from utils.scheduler import QueueFullError, get_scheduler
+from knowledge.compaction import CompactionSpec
+from knowledge.filters import SearchFilter
+from knowledge.images import get_captioner
+from knowledge.rerank import get_reranker
 from knowledge.manager import (
-    list_spaces, create_space, delete_space,
-    build_space_vs, search_space, search_space_algos
+    list_spaces, create_space, delete_space, space_index_report, space_generations, rollback_space,
+    build_space_vs, search_space, search_space_algos, search_space_batch, search_spaces, search_space_symbols
 )
 
 app = FastAPI()
@@ -22,16 +34,44 @@ app.add_middleware(
     allow_origins=FRONTEND_ORIGINS,
     allow_methods=["*"], allow_headers=["*"], allow_credentials=True,
 )
+if PROFILING_ENABLED:
+    # stack-sampled profiles of slow /chat and /knowledge/upload requests, listed at GET /profiles
+    app.add_middleware(ProfilingMiddleware)
 DOCS_PATH.mkdir(parents=True, exist_ok=True)
 VECTORSTORE_PATH.mkdir(parents=True, exist_ok=True)
 ALGOS_PATH.mkdir(parents=True, exist_ok=True)
 SPACES_DIR.mkdir(parents=True, exist_ok=True)
 MEDIA_DIR.mkdir(parents=True, exist_ok=True)
 
+# scheduler, pool and residency state is read at scrape time
+register_collector(lambda: get_scheduler().metrics())
+register_collector(lambda: get_pool().metrics())
+register_collector(lambda: get_residency().metrics())
+register_collector(lambda: get_reranker().metrics())
+register_collector(lambda: get_captioner().metrics())
+
 # Serve media files
 app.mount("/media", StaticFiles(directory=str(MEDIA_DIR)), name="media")
 
 
+@app.exception_handler(QueueFullError)
+async def queue_full_handler(request, exc: QueueFullError):
+    return JSONResponse(
+        status_code=429, content={"detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after))}
+    )
+
+
+@app.on_event("startup")
+def warm_imports():
+    # In fast-startup mode heavy modules load on first use only
+    if not FAST_STARTUP:
+        preload(PRELOAD_MODULES)
+    get_pool().start_health_checks()
+    # load the chat, translation and embedding models before the first request needs them
+    get_residency().start()
+
+
 @app.get("/")
 async def streamlit():
     return RedirectResponse(url="/docs")
@@ -43,9 +83,39 @@ def api_list_spaces():
 
 @app.post("/spaces/{name}")
 def api_create_space(name: str, settings: dict):
+    try:
+        CompactionSpec.from_settings(settings)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid compaction settings: {e}")
     create_space(name, settings)
     return {"status": "created", "space": name}
 
+@app.get("/spaces/{name}/index")
+def api_space_index(name: str):
+    # compaction (size, recall vs the exact index) and dedup reports of the last build
+    try:
+        return space_index_report(name)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/spaces/{name}/generations")
+def api_space_generations(name: str):
+    # published index builds, newest first; "current" is the one searches use
+    try:
+        return space_generations(name)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.post("/spaces/{name}/generations/rollback")
+def api_space_rollback(name: str, to: Optional[str] = None):
+    # default: the generation published before the current one
+    try:
+        return {"status": "rolled_back", "space": name, "current": rollback_space(name, to)}
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 @app.delete("/spaces/{name}")
 def api_delete_space(name: str):
     delete_space(name)
@@ -68,13 +138,112 @@ async def api_upload_and_build(
     return {"status": "scheduled", "space": space, "files": [f.filename for f in files]}
 
 # --- Query Endpoints ---
+def search_filter(
+    source: Optional[str] = None,
+    file_type: Optional[List[str]] = Query(None),
+    algorithm: Optional[List[str]] = Query(None),
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> SearchFilter:
+    # source is a path prefix (relative to the space's docs), dates are ISO upload dates
+    return SearchFilter(source, file_type or [], algorithm or [], date_from, date_to)
+
 @app.get("/knowledge/search/{space}")
-def api_search_knowledge(space: str, q: str, k: int = 5):
-    return {"results": search_space(space, q, k)}
+def api_search_knowledge(space: str, q: str, k: int = 5, timings: bool = False,
+                         flt: SearchFilter = Depends(search_filter)):
+    with trace("knowledge_search") as t:
+        results = search_space(space, q, k, flt)
+    return {"results": results, **({"timings": t.as_dict()} if timings else {})}
 
 @app.get("/algorithms/search/{space}")
-def api_search_algorithms(space: str, q: str, k: int = 5):
-    return {"algorithms": search_space_algos(space, q, k)}
+def api_search_algorithms(space: str, q: str, k: int = 5, timings: bool = False):
+    with trace("algorithm_search") as t:
+        algorithms = search_space_algos(space, q, k)
+    return {"algorithms": algorithms, **({"timings": t.as_dict()} if timings else {})}
+
+@app.get("/knowledge/symbols/{space}")
+def api_search_symbols(space: str, q: str, timings: bool = False):
+    # q names symbols directly or is a question mentioning them
+    with trace("symbol_search") as t:
+        result = search_space_symbols(space, q)
+    return {**result, **({"timings": t.as_dict()} if timings else {})}
+
+@app.get("/knowledge/search")
+def api_search_federated(q: str, spaces: Optional[List[str]] = Query(None), k: int = 5,
+                         algorithms: bool = False, timeout: float = SEARCH_SPACE_TIMEOUT,
+                         timings: bool = False, flt: SearchFilter = Depends(search_filter)):
+    # one query across several spaces (all of them by default), merged by score
+    if k < 1:
+        raise HTTPException(status_code=422, detail="k must be at least 1")
+    with trace("federated_search") as t:
+        body = search_spaces(q, spaces, k, algorithms, timeout, flt)
+    if timings:
+        body["timings"] = t.as_dict()
+    return body
+
+class BatchSearchFilter(BaseModel):
+    source: Optional[str] = None
+    file_types: List[str] = []
+    algorithms: List[str] = []
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    k: int = 5
+    # search the algorithm index instead of the document index
+    algorithms: bool = False
+    # applied to every query
+    filter: Optional[BatchSearchFilter] = None
+    timings: bool = False
+
+@app.post("/knowledge/search/{space}/batch")
+def api_search_batch(space: str, request: BatchSearchRequest):
+    if len(request.queries) > SEARCH_MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {SEARCH_MAX_BATCH_QUERIES} queries per request")
+    if request.k < 1:
+        raise HTTPException(status_code=422, detail="k must be at least 1")
+    with trace("batch_search") as t:
+        f = request.filter
+        flt = SearchFilter(f.source, f.file_types, f.algorithms, f.date_from, f.date_to) if f else None
+        results = search_space_batch(space, request.queries, request.k, request.algorithms, flt)
+    body = {"results": [{"query": q, "hits": hits} for q, hits in zip(request.queries, results)]}
+    if request.timings:
+        body["timings"] = t.as_dict()
+    return body
+
+@app.get("/experts")
+def api_experts():
+    # observed latency / queue depth the expert router is weighing
+    from experts.gating import get_router
+    return {"experts": get_router().snapshot()}
+
+@app.get("/ollama/backends")
+def api_ollama_backends():
+    return {"backends": get_pool().status(), "scheduler": get_scheduler().status()}
+
+@app.get("/ollama/models")
+def api_ollama_models():
+    # resident models, keep_alive and cold-load counts
+    return get_residency().status()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text format: stage/request/model-call histograms plus live gauges
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/profiles")
+def api_profiles():
+    # saved profiles of slow (or sampled) requests, newest first
+    return {"enabled": PROFILING_ENABLED, **get_profiler().status(), "profiles": get_profiler().list()}
+
+@app.get("/profiles/{name}")
+def api_profile(name: str):
+    path = get_profiler().file(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile {name} not found")
+    media_type = "application/json" if path.suffix == ".json" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=name)
 
 # --- Health Check ---
 @app.get("/health")
@@ -1,8 +1,11 @@
+import os
 import yaml
 from pathlib import Path
 
 # مسیر فایل پیکربندی در کانتینر
-_CONFIG_PATH = Path(__file__).resolve().parents[1] / "config.yaml"
+_CONFIG_PATH = Path(os.environ.get(
+    "EDRIS_CONFIG", Path(__file__).resolve().parents[1] / "config.yaml"
+))
 
 # بارگذاری کانفیگ
 def _load_config() -> dict:
@@ -18,11 +21,138 @@ FRONTEND_ORIGINS = config["backend"]["frontend_origins"]
 # Vectorstore
 DOCS_PATH = Path(config["vectorstore"]["docs_path"])
 VECTORSTORE_PATH = Path(config["vectorstore"]["store_path"])
+VECTORSTORE_KEEP_GENERATIONS = config["vectorstore"].get("keep_generations", 3)
 ALGOS_PATH = Path(config["vectorstore"]["algos_path"])
 
+# Ingestion
+_ingestion = config.get("ingestion", {})
+CHUNK_SIZE = _ingestion.get("chunk_size", 1000)
+CHUNK_OVERLAP = _ingestion.get("chunk_overlap", 150)
+EMBED_BATCH_SIZE = _ingestion.get("embed_batch_size", 32)
+INGEST_QUEUE_SIZE = _ingestion.get("queue_size", 4)
+CSV_ROWS_PER_CHUNK = _ingestion.get("csv_rows_per_chunk", 50)
+CSV_HEADER = str(_ingestion.get("csv_header", "auto")).lower()
+CODE_CHUNK_CHARS = _ingestion.get("code_chunk_chars", 4000)
+DEDUP_MODE = _ingestion.get("dedup", "link")
+DEDUP_THRESHOLD = _ingestion.get("dedup_threshold", 0.85)
+DEDUP_NUM_PERM = _ingestion.get("dedup_num_perm", 64)
+DEDUP_SHINGLE = _ingestion.get("dedup_shingle", 5)
+
+# Images (vision expert, captioning during ingestion, OCR)
+_images = config.get("images", {})
+IMAGES_CAPTION = _images.get("caption", False)
+IMAGES_MAX_SIDE = _images.get("max_side", 672)
+IMAGES_MIN_SIDE = _images.get("min_side", 48)
+IMAGES_JPEG_QUALITY = _images.get("jpeg_quality", 85)
+IMAGES_PHASH_DISTANCE = _images.get("phash_distance", 6)
+IMAGES_CAPTION_BATCH = _images.get("caption_batch", 8)
+IMAGES_CAPTION_WORKERS = _images.get("caption_workers", 2)
+IMAGES_CAPTION_PROMPT = _images.get(
+    "caption_prompt",
+    "Describe this image in detail for a search index: objects, text, diagrams, charts and their values.",
+)
+IMAGES_CACHE_PATH = Path(_images.get("cache_path", "./backend/app/knowledge/image_captions.jsonl"))
+IMAGES_PAYLOAD_CACHE_SIZE = _images.get("payload_cache_size", 256)
+IMAGES_OCR_DPI = _images.get("ocr_dpi", 300)
+
+# Index compaction defaults; a space's config.json "compaction" overrides them
+COMPACTION = config.get("compaction", {})
+
 # Ollama
 OLLAMA_URL = config["ollama"]["api_url"]
 OLLAMA_MODEL = config["ollama"]["model"]
+# Backend pool; a single api_url is treated as a one-backend pool
+OLLAMA_BACKENDS = config["ollama"].get("backends") or [
+    {"url": OLLAMA_URL.split("/api/")[0], "models": []}
+]
+OLLAMA_HEALTH_INTERVAL = config["ollama"].get("health_interval", 10)
+OLLAMA_MAX_FAILURES = config["ollama"].get("max_failures", 3)
+OLLAMA_EJECT_SECONDS = config["ollama"].get("eject_seconds", 30)
+OLLAMA_RETRIES = config["ollama"].get("retries", 2)
+OLLAMA_TIMEOUT = config["ollama"].get("timeout", 300)
+OLLAMA_COALESCE = config["ollama"].get("coalesce", True)
+
+# Search
+_search = config.get("search", {})
+SEARCH_INDEX_CACHE_SIZE = _search.get("index_cache_size", 8)
+SEARCH_EMBED_BATCH_SIZE = _search.get("embed_batch_size", 64)
+SEARCH_MAX_BATCH_QUERIES = _search.get("max_batch_queries", 1000)
+SEARCH_SPACE_TIMEOUT = _search.get("space_timeout", 2.0)
+SEARCH_FANOUT_WORKERS = _search.get("fanout_workers", 8)
+
+# Two-stage retrieval for chat context (FAISS over-fetch, CPU rerank)
+_retrieval = config.get("retrieval", {})
+RETRIEVAL_FETCH_K = _retrieval.get("fetch_k", 20)
+RETRIEVAL_MAX_PASSAGES = _retrieval.get("max_passages", 3)
+RETRIEVAL_CONTEXT_TOKENS = _retrieval.get("context_tokens", 768)
+RETRIEVAL_LEXICAL_WEIGHT = _retrieval.get("lexical_weight", 0.4)
+RETRIEVAL_MIN_SCORE_RATIO = _retrieval.get("min_score_ratio", 0.6)
+RETRIEVAL_CACHE_SIZE = _retrieval.get("cache_size", 8192)
+SYMBOL_MAX_CHUNKS = _retrieval.get("symbol_max_chunks", 4)
+
+# Algorithm extraction
+_algorithms = config.get("algorithms", {})
+ALGORITHMS_VOCABULARY_PATH = _algorithms.get("vocabulary_path")
+ALGORITHMS_LEARN_MIN_COUNT = _algorithms.get("learn_min_count", 2)
+ALGORITHMS_FULLCOMPLETE_MAX = _algorithms.get("fullcomplete_max", 5)
+
+# Model residency (preloading and keep-alive)
+_residency = config.get("residency", {})
+RESIDENCY_PRELOAD = _residency.get("preload", [])
+RESIDENCY_KEEP_ALIVE = _residency.get("keep_alive", "30m")
+RESIDENCY_KEEP_ALIVE_OVERRIDES = _residency.get("keep_alive_overrides", {})
+RESIDENCY_EMBEDDING_MODELS = _residency.get("embedding_models", ["mxbai-embed-large"])
+RESIDENCY_COLD_LOAD_THRESHOLD = _residency.get("cold_load_threshold", 0.5)
+RESIDENCY_REWARM_INTERVAL = _residency.get("rewarm_interval", 60)
+
+# Admission control for model calls
+_scheduler = config.get("scheduler", {})
+SCHEDULER_DEFAULT_CONCURRENCY = _scheduler.get("default_concurrency", 2)
+SCHEDULER_CONCURRENCY = _scheduler.get("concurrency", {})
+SCHEDULER_MAX_QUEUE = _scheduler.get("max_queue", 32)
+SCHEDULER_MAX_WAIT = _scheduler.get("max_wait", 60)
+
+# Prompt budgets and history compaction
+_context = config.get("context", {})
+CONTEXT_DEFAULT_BUDGET = _context.get("default_budget", 4096)
+CONTEXT_BUDGETS = _context.get("budgets", {})
+CONTEXT_ANSWER_RESERVE = _context.get("answer_reserve", 1024)
+CONTEXT_RECENT_TURNS = _context.get("recent_turns", 6)
+CONTEXT_SHARE = _context.get("context_share", 0.4)
+CONTEXT_SUMMARY_MODEL = _context.get("summary_model", "llama3.2:3b")
+CONTEXT_SUMMARY_TOKENS = _context.get("summary_tokens", 256)
+
+# Chat stage graph
+_chat = config.get("chat", {})
+CHAT_SPECULATIVE_RETRIEVAL = _chat.get("speculative_retrieval", True)
+CHAT_MULTILINGUAL_RETRIEVAL = _chat.get("multilingual_retrieval", False)
+CHAT_PREWARM_SUMMARY = _chat.get("prewarm_summary", True)
+
+# Answer rendering (utils/postprocessor.py)
+_postprocess = config.get("postprocess", {})
+POSTPROCESS_MAX_PENDING = _postprocess.get("max_pending_chars", 65536)
+
+# Sampling profiler for slow requests (utils/profiler.py)
+_profiling = config.get("profiling", {})
+PROFILING_ENABLED = os.environ.get(
+    "EDRIS_PROFILING", str(_profiling.get("enabled", False))
+).lower() in ("1", "true", "yes")
+PROFILING_PATHS = _profiling.get("paths", ["/chat", "/knowledge/upload"])
+PROFILING_THRESHOLD = _profiling.get("threshold_seconds", 5.0)
+PROFILING_SAMPLE_RATE = _profiling.get("sample_rate", 0.0)
+PROFILING_INTERVAL_MS = _profiling.get("interval_ms", 10)
+PROFILING_FORMAT = _profiling.get("format", "speedscope")
+PROFILING_DIR = Path(_profiling.get("dir", "./backend/app/profiles"))
+PROFILING_MAX_FILES = _profiling.get("max_files", 100)
+PROFILING_MAX_MB = _profiling.get("max_mb", 200)
+PROFILING_MAX_STACKS = _profiling.get("max_stacks", 20000)
+
+# Mixture of experts
+_moe = config.get("moe", {})
+MOE_EXPERT_MODELS = {name: spec["model"] for name, spec in _moe.get("experts", {}).items()}
+MOE_DEFAULT_EXPERT = _moe.get("default_expert", "deepseek")
+MOE_LATENCY_WEIGHT = _moe.get("latency_weight", 0.1)
+MOE_QUEUE_WEIGHT = _moe.get("queue_weight", 0.05)
 
 # Logging
 LOGGING_LEVEL = config["logging"]["level"]
@@ -30,4 +160,11 @@ LOGGING_FORMAT = config["logging"]["format"]
 
 # Custom Paths
 SPACES_DIR = Path(config["paths"]["spaces_dir"])
-MEDIA_DIR = Path(config["paths"]["media_dir"])
\ No newline at end of file
+MEDIA_DIR = Path(config["paths"]["media_dir"])
+
+# Startup
+_startup = config.get("startup", {})
+FAST_STARTUP = os.environ.get(
+    "EDRIS_FAST_STARTUP", str(_startup.get("fast", False))
+).lower() in ("1", "true", "yes")
+PRELOAD_MODULES = _startup.get("preload", [])
@@ -0,0 +1,247 @@
+# backend/app/utils/context_builder.py
+"""
+Token-budgeted prompt assembly for chat.
+
+The prompt for a model is capped at its configured budget (minus a reserve
+for the answer). System messages and the latest user message are always
+kept; recent turns are kept verbatim; older turns are folded into a rolling
+summary; retrieved context gets at most `context_share` of the budget and
+is trimmed passage by passage. Summaries are cached under a hash chain of
+the messages they cover, so each new turn only summarises the messages
+that just fell out of the verbatim window, and prompt size stays flat no
+matter how long the conversation grows.
+"""
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from utils.config import (
+    CONTEXT_DEFAULT_BUDGET, CONTEXT_BUDGETS, CONTEXT_ANSWER_RESERVE,
+    CONTEXT_RECENT_TURNS, CONTEXT_SHARE, CONTEXT_SUMMARY_MODEL, CONTEXT_SUMMARY_TOKENS
+)
+
+logger = logging.getLogger(__name__)
+
+Message = Dict[str, str]
+
+_PIECE = re.compile(r"\w+|[^\w\s]")
+MESSAGE_OVERHEAD = 4
+SUMMARY_CACHE_SIZE = 2048
+
+
+def count_tokens(text: str) -> int:
+    """Approximate BPE token count: one per word or symbol, plus one per extra 4 chars."""
+    return sum(1 + (len(p) - 1) // 4 for p in _PIECE.findall(text))
+
+
+def message_tokens(message: Message) -> int:
+    return MESSAGE_OVERHEAD + count_tokens(message.get("content", ""))
+
+
+def truncate_tokens(text: str, limit: int) -> str:
+    """Cut text to roughly `limit` tokens on a piece boundary."""
+    if limit <= 0:
+        return ""
+    used = 0
+    for m in _PIECE.finditer(text):
+        used += 1 + (len(m.group()) - 1) // 4
+        if used > limit:
+            return text[:m.start()].rstrip() + " …"
+    return text
+
+
+def budget_for(model: str) -> int:
+    budget = CONTEXT_BUDGETS.get(model, CONTEXT_BUDGETS.get(model.split(":")[0], CONTEXT_DEFAULT_BUDGET))
+    return max(budget - CONTEXT_ANSWER_RESERVE, 256)
+
+
+# --- Rolling summaries ---
+def _chain(prev: str, message: Message) -> str:
+    return hashlib.sha1(f"{prev}\x1e{message.get('role')}\x1f{message.get('content')}".encode()).hexdigest()
+
+
+def extractive_summary(previous: str, messages: List[Message], max_tokens: int) -> str:
+    """Cheap fallback: first sentence of every turn appended to the previous summary."""
+    lines = [previous] if previous else []
+    for m in messages:
+        first = re.split(r"(?<=[.!?؟])\s", m.get("content", "").strip(), maxsplit=1)[0]
+        lines.append(f"{m.get('role')}: {truncate_tokens(first, 60)}")
+    return truncate_tokens("\n".join(lines), max_tokens)
+
+
+def llm_summary(previous: str, messages: List[Message], max_tokens: int) -> str:
+    from utils.ollama_pool import get_pool
+
+    transcript = "\n".join(f"{m.get('role')}: {m.get('content')}" for m in messages)
+    prompt = (
+        f"Update the running summary of a conversation. Keep facts, decisions, names and "
+        f"open questions; drop pleasantries. Answer with the summary only, under {max_tokens} tokens.\n\n"
+        f"Current summary:\n{previous or '(empty)'}\n\nNew messages:\n{transcript}"
+    )
+    response = get_pool().chat(CONTEXT_SUMMARY_MODEL, [{"role": "user", "content": prompt}],
+                               {"num_predict": max_tokens})
+    return truncate_tokens(response['message']['content'].strip(), max_tokens)
+
+
+class SummaryCache:
+    def __init__(self, summarizer: Callable[[str, List[Message], int], str] = llm_summary,
+                 max_tokens: int = CONTEXT_SUMMARY_TOKENS, size: int = SUMMARY_CACHE_SIZE):
+        self.summarizer = summarizer
+        self.max_tokens = max_tokens
+        self.size = size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        return None
+
+    def _put(self, key: str, summary: str) -> None:
+        with self._lock:
+            self._cache[key] = summary
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+
+    def summarize(self, messages: List[Message]) -> str:
+        """Summary of `messages`, extending the longest cached prefix summary."""
+        if not messages:
+            return ""
+        keys, h = [], ""
+        for m in messages:
+            h = _chain(h, m)
+            keys.append(h)
+        start, previous = 0, ""
+        for i in range(len(keys) - 1, -1, -1):
+            cached = self._get(keys[i])
+            if cached is not None:
+                start, previous = i + 1, cached
+                break
+        if start == len(messages):
+            return previous
+        new = messages[start:]
+        try:
+            summary = self.summarizer(previous, new, self.max_tokens)
+        except Exception as e:
+            logger.warning(f"Summarizer failed, using extractive summary: {str(e)}")
+            summary = extractive_summary(previous, new, self.max_tokens)
+        self._put(keys[-1], summary)
+        return summary
+
+
+# --- Prompt assembly ---
+@dataclass
+class PromptReport:
+    budget: int = 0
+    prompt_tokens: int = 0
+    verbatim_turns: int = 0
+    summarized_turns: int = 0
+    context_tokens: int = 0
+    context_trimmed: bool = False
+
+    def as_dict(self) -> Dict:
+        return dict(self.__dict__)
+
+
+def fit_context(context: str, limit: int) -> Tuple[str, bool]:
+    """Keep whole passages (split on blank lines) while they fit, then truncate one."""
+    if count_tokens(context) <= limit:
+        return context, False
+    kept, used = [], 0
+    for passage in context.split("\n\n"):
+        cost = count_tokens(passage)
+        if used + cost > limit:
+            rest = limit - used
+            if rest > 32:
+                kept.append(truncate_tokens(passage, rest))
+            break
+        kept.append(passage)
+        used += cost
+    return "\n\n".join(kept), True
+
+
+class ContextBuilder:
+    def __init__(self, summaries: Optional[SummaryCache] = None,
+                 recent_turns: int = CONTEXT_RECENT_TURNS, context_share: float = CONTEXT_SHARE):
+        self.summaries = summaries or SummaryCache()
+        self.recent_turns = recent_turns
+        self.context_share = context_share
+
+    def build(self, messages: List[Message], context: Optional[str], model: str,
+              context_preamble: str = "") -> Tuple[List[Message], PromptReport]:
+        report = PromptReport(budget=budget_for(model))
+        system = [m for m in messages if m.get("role") == "system"]
+        turns = [m for m in messages if m.get("role") != "system"]
+        latest, history = (turns[-1:], turns[:-1]) if turns else ([], [])
+
+        fixed = sum(message_tokens(m) for m in system + latest)
+        remaining = report.budget - fixed
+
+        # retrieved context: at most context_share of the budget
+        context_message = None
+        if context:
+            limit = min(int(report.budget * self.context_share), remaining - MESSAGE_OVERHEAD - count_tokens(context_preamble))
+            text, report.context_trimmed = fit_context(context, max(limit, 0))
+            if text:
+                context_message = {"role": "system", "content": context_preamble + text}
+                report.context_tokens = count_tokens(text)
+                remaining -= message_tokens(context_message)
+
+        # recent turns verbatim, newest first, while they fit next to a summary
+        summary_reserve = self.summaries.max_tokens + MESSAGE_OVERHEAD if len(history) > self.recent_turns else 0
+        recent: List[Message] = []
+        used = 0
+        for m in reversed(history[-self.recent_turns:] if self.recent_turns else []):
+            cost = message_tokens(m)
+            if used + cost > remaining - summary_reserve:
+                summary_reserve = self.summaries.max_tokens + MESSAGE_OVERHEAD
+                break
+            recent.insert(0, m)
+            used += cost
+        older = history[:len(history) - len(recent)]
+
+        summary_message = None
+        if older:
+            summary = self.summaries.summarize(older)
+            summary = truncate_tokens(summary, max(remaining - used - MESSAGE_OVERHEAD, 0))
+            if summary:
+                summary_message = {"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"}
+
+        out = list(system)
+        if context_message:
+            out.append(context_message)
+        if summary_message:
+            out.append(summary_message)
+        out.extend(recent)
+        out.extend(latest)
+
+        report.verbatim_turns = len(recent) + len(latest)
+        report.summarized_turns = len(older)
+        report.prompt_tokens = sum(message_tokens(m) for m in out)
+        return out, report
+
+    def summarize_history(self, messages: List[Message]) -> None:
+        """
+        Summarise the turns build() will fold away whatever the budget (all
+        but the last recent_turns), so it can run before the context and
+        model are known; build() then only extends the cached summary.
+        """
+        history = [m for m in messages if m.get("role") != "system"][:-1]
+        if len(history) > self.recent_turns:
+            self.summaries.summarize(history[:len(history) - self.recent_turns])
+
+
+_builder: Optional[ContextBuilder] = None
+
+
+def get_context_builder() -> ContextBuilder:
+    global _builder
+    if _builder is None:
+        _builder = ContextBuilder()
+    return _builder
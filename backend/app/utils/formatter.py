@@ -1,11 +1,9 @@
 # backend/app/utils/formatter.py
 
-import matplotlib.pyplot as plt
 from io import BytesIO
 import base64
 import re
 import json
-import jsonschema
 
 
 def format_table(data, headers):
@@ -25,6 +23,7 @@ def to_mermaid(steps: list[str], theme: str = "default") -> str:
 
 
 def chart_to_base64(data: list[float]) -> str:
+    import matplotlib.pyplot as plt
     plt.figure()
     plt.plot(data)
     buf = BytesIO()
@@ -37,9 +36,13 @@ def to_base64_image_tag(data: list[float]) -> str:
     b64 = chart_to_base64(data)
     return f"![chart](data:image/png;base64,{b64})"
 
-def replace_footnotes(text: str) -> str:
+def replace_footnotes(text: str, seen: list = None) -> str:
     # [^1]: footnote text
     notes = re.findall(r'\[\^(\d+)\]:\s*(.*?)$', text, re.MULTILINE)
+    if seen is not None:
+        # definitions from earlier parts of the same answer apply first, as if it were one text
+        notes = seen + [n for n in notes if n not in seen]
+        seen[:] = notes
     for num, note in notes:
         text = text.replace(f'[^{num}]: {note}', f"<sup id='fnref{num}'><a href='#fn{num}'>[{num}]</a></sup>\n<div id='fn{num}' class='footnote'>{note}</div>")
     return text
@@ -71,6 +74,8 @@ def replace_admonitions(text: str) -> str:
 
 
 def extract_and_validate_json(text: str) -> str:
+    import jsonschema
+
     def _validate(m):
         block = m.group(1)
         try:
@@ -0,0 +1,74 @@
+# backend/app/utils/lazy.py
+import importlib
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# module name -> seconds spent in the first (real) import
+_IMPORT_TIMES: Dict[str, float] = {}
+_IMPORT_LOCK = threading.Lock()
+
+
+def import_module(name: str):
+    """Import a module once and record how long the first import took."""
+    if name in _IMPORT_TIMES:
+        return importlib.import_module(name)
+    with _IMPORT_LOCK:
+        if name not in _IMPORT_TIMES:
+            start = time.perf_counter()
+            module = importlib.import_module(name)
+            _IMPORT_TIMES[name] = time.perf_counter() - start
+            logger.debug(f"Imported {name} in {_IMPORT_TIMES[name] * 1000:.1f} ms")
+            return module
+    return importlib.import_module(name)
+
+
+class LazyModule:
+    """Module proxy that performs the real import on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+def import_times() -> Dict[str, float]:
+    """Seconds spent importing each lazily loaded module so far."""
+    return dict(_IMPORT_TIMES)
+
+
+def preload(names: Iterable[str], background: bool = True) -> Optional[threading.Thread]:
+    """Import modules ahead of first use, by default on a daemon thread."""
+    names = list(names)
+
+    def _run():
+        for name in names:
+            try:
+                import_module(name)
+            except Exception as e:
+                logger.warning(f"Preloading {name} failed: {str(e)}")
+
+    if not background:
+        _run()
+        return None
+    thread = threading.Thread(target=_run, name="edris-preload", daemon=True)
+    thread.start()
+    return thread
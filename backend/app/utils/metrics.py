@@ -0,0 +1,198 @@
+# backend/app/utils/metrics.py
+"""
+Stage timing spans and Prometheus metrics.
+
+`span("stage")` times a block and records it in the `edris_stage_seconds`
+histogram; inside a `trace()` block the span is also appended to the
+request's breakdown, which endpoints can return to the caller. Like the
+scheduler's queue-time accounting, the active trace lives in a context
+variable, so spans opened in run_in_threadpool workers land in the same
+breakdown.
+
+`render()` produces the Prometheus text exposition format for GET /metrics.
+The metric types are implemented here (a few dozen lines) rather than
+pulling in prometheus_client; other modules can contribute gauges and
+counters through `register_collector`.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# seconds; covers ~1 ms embedding lookups to multi-minute generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+Labels = Tuple[Tuple[str, str], ...]
+# (name, type, help, [(labels, value)])
+Sample = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    parts = []
+    for k, v in labels:
+        v = v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, List] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _labels(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def total(self, **labels: str) -> Tuple[float, int]:
+        """(sum, count) observed for one label set."""
+        with self._lock:
+            series = self._series.get(_labels(labels))
+            return (series[-2], series[-1]) if series else (0.0, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(k, list(v)) for k, v in sorted(self._series.items())]
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_fmt_labels(key + (('le', _fmt_value(float(bound))),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(key + (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(series[-2])}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in items)
+        return lines
+
+
+STAGE_SECONDS = Histogram("edris_stage_seconds", "Duration of request and ingestion stages")
+REQUEST_SECONDS = Histogram("edris_request_seconds", "End-to-end duration of API requests")
+MODEL_CALL_SECONDS = Histogram("edris_model_call_seconds", "Duration of Ollama calls, excluding queue time")
+REQUESTS = Counter("edris_requests_total", "API requests by endpoint and outcome")
+CRITICAL_PATH_SECONDS = Histogram("edris_critical_path_seconds", "Critical path of request stage graphs")
+SPECULATIVE_STAGES = Counter("edris_speculative_stages_total", "Speculative stages by stage and outcome (used/discarded)")
+PROFILES_SAVED = Counter("edris_profiles_saved_total", "Request profiles saved by endpoint and reason (slow/sampled)")
+COALESCED_CALLS = Counter("edris_coalesced_calls_total", "Model calls by path and role: leader (made upstream) or joined (shared a leader's)")
+
+_metrics = [STAGE_SECONDS, REQUEST_SECONDS, MODEL_CALL_SECONDS, REQUESTS, CRITICAL_PATH_SECONDS, SPECULATIVE_STAGES,
+            PROFILES_SAVED, COALESCED_CALLS]
+_collectors: List[Callable[[], Iterable[Sample]]] = []
+
+
+def register_collector(collector: Callable[[], Iterable[Sample]]) -> None:
+    """Add a callback producing (name, type, help, [(labels, value)]) samples at scrape time."""
+    _collectors.append(collector)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            samples = list(collector())
+        except Exception:
+            continue
+        for name, kind, help, values in samples:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_fmt_labels(_labels(l))} {_fmt_value(v)}" for l, v in values)
+    return "\n".join(lines) + "\n"
+
+
+# --- Spans ---
+@dataclass
+class Trace:
+    """Stage timings of one request, in the order the stages finished."""
+    spans: List[Dict] = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+    # stage graph report (utils/stages.py), when the endpoint runs one
+    graph: Optional[Dict] = None
+
+    def as_dict(self) -> Dict:
+        stages: Dict[str, float] = {}
+        for s in self.spans:
+            stages[s["stage"]] = round(stages.get(s["stage"], 0.0) + s["seconds"], 4)
+        out = {"total": round(time.perf_counter() - self.started, 4), "stages": stages}
+        if self.graph is not None:
+            out["graph"] = self.graph
+        return out
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        current = _trace.get()
+        if current is not None:
+            current.spans.append({"stage": stage, "seconds": elapsed})
+
+
+@contextmanager
+def trace(endpoint: str) -> Iterator[Trace]:
+    """Collect spans opened inside this block and record the request duration."""
+    current = Trace()
+    token = _trace.set(current)
+    outcome = "error"
+    try:
+        yield current
+        outcome = "ok"
+    finally:
+        _trace.reset(token)
+        REQUEST_SECONDS.observe(time.perf_counter() - current.started, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, outcome=outcome)
@@ -0,0 +1,340 @@
+# backend/app/utils/ollama_pool.py
+"""
+Pool of Ollama backends.
+
+Every model call first takes a slot from the model scheduler
+(utils/scheduler.py), so concurrency limits hold across all backends.
+
+Requests go to a healthy backend that serves the model, preferring backends
+where the model is already loaded (model affinity, learned from /api/ps and
+from successful calls) and, among those, the one with the fewest
+outstanding requests. Connection errors, timeouts and 5xx responses count
+as failures: the request is retried on another backend, and a backend that
+fails `max_failures` times in a row is ejected for `eject_seconds`. A
+background thread polls every backend's /api/ps as an active health check.
+
+Model requests carry the keep_alive configured in utils/residency.py, and
+their `load_duration` is reported back to it to count cold loads.
+
+With `ollama.coalesce`, identical calls in flight at the same time (same
+path, model and normalised payload) share one upstream request, streamed
+or not (utils/singleflight.py).
+"""
+import json
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Set
+import requests
+from utils.metrics import MODEL_CALL_SECONDS
+from utils.residency import get_residency
+from utils.scheduler import get_scheduler
+from utils.singleflight import Singleflight, call_key
+from utils.config import (
+    OLLAMA_BACKENDS, OLLAMA_HEALTH_INTERVAL, OLLAMA_MAX_FAILURES,
+    OLLAMA_EJECT_SECONDS, OLLAMA_RETRIES, OLLAMA_TIMEOUT, OLLAMA_COALESCE
+)
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaUnavailableError(RuntimeError):
+    """No backend could serve the request."""
+
+
+@dataclass
+class Backend:
+    url: str
+    # empty means "any model"
+    models: Set[str] = field(default_factory=set)
+    healthy: bool = True
+    outstanding: int = 0
+    failures: int = 0
+    ejected_until: float = 0.0
+    loaded: Set[str] = field(default_factory=set)
+    requests: int = 0
+
+    def serves(self, model: Optional[str]) -> bool:
+        return not model or not self.models or _base(model) in {_base(m) for m in self.models}
+
+    def available(self, now: float) -> bool:
+        return self.healthy and now >= self.ejected_until
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url, "models": sorted(self.models), "healthy": self.healthy,
+            "ejected": time.time() < self.ejected_until, "outstanding": self.outstanding,
+            "failures": self.failures, "loaded": sorted(self.loaded), "requests": self.requests,
+        }
+
+
+def _base(model: str) -> str:
+    """'llava' and 'llava:latest' name the same model."""
+    return model if ":" in model else f"{model}:latest"
+
+
+class OllamaPool:
+    def __init__(
+        self,
+        backends: List[Dict[str, Any]],
+        max_failures: int = OLLAMA_MAX_FAILURES,
+        eject_seconds: float = OLLAMA_EJECT_SECONDS,
+        retries: int = OLLAMA_RETRIES,
+        timeout: float = OLLAMA_TIMEOUT,
+        coalesce: bool = OLLAMA_COALESCE,
+    ):
+        self.backends = [
+            Backend(url=b["url"].rstrip("/"), models=set(b.get("models") or []))
+            for b in backends
+        ]
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.retries = retries
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._health_thread: Optional[threading.Thread] = None
+        self.session = requests.Session()
+        self.flights = Singleflight() if coalesce else None
+
+    # --- Selection ---
+    def pick(self, model: Optional[str] = None, exclude: Set[str] = frozenset()) -> Backend:
+        now = time.time()
+        with self._lock:
+            candidates = [b for b in self.backends
+                          if b.url not in exclude and b.serves(model) and b.available(now)]
+            if not candidates:
+                # everything is ejected or unhealthy: try anything that serves the model
+                candidates = [b for b in self.backends if b.url not in exclude and b.serves(model)]
+            if not candidates:
+                raise OllamaUnavailableError(f"No Ollama backend available for model {model}")
+            if model:
+                warm = [b for b in candidates if _base(model) in b.loaded]
+                candidates = warm or candidates
+            least = min(b.outstanding for b in candidates)
+            backend = random.choice([b for b in candidates if b.outstanding == least])
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def _release(self, backend: Backend, ok: Optional[bool], model: Optional[str] = None) -> None:
+        """ok=None: no verdict on the backend (the consumer of a stream stopped reading)."""
+        with self._lock:
+            backend.outstanding -= 1
+            if ok is None:
+                return
+            if ok:
+                backend.failures = 0
+                if model:
+                    backend.loaded.add(_base(model))
+                return
+            backend.failures += 1
+            now = time.time()
+            if backend.failures >= self.max_failures and now >= backend.ejected_until:
+                backend.ejected_until = now + self.eject_seconds
+                logger.warning(f"Ejecting Ollama backend {backend.url} for {self.eject_seconds}s")
+
+    # --- Requests ---
+    def post(self, path: str, payload: Dict[str, Any], model: Optional[str] = None,
+             timeout: Optional[float] = None, observe: bool = True) -> Dict[str, Any]:
+        if self.flights is None:
+            return self._call(path, payload, model, timeout, observe)
+        return self.flights.do(call_key(path, model, payload),
+                               lambda: self._call(path, payload, model, timeout, observe), label=path)
+
+    def _call(self, path: str, payload: Dict[str, Any], model: Optional[str],
+              timeout: Optional[float], observe: bool) -> Dict[str, Any]:
+        if not model:
+            return self._post(path, payload, model, timeout)
+        residency = get_residency()
+        payload = {"keep_alive": residency.keep_alive(model), **payload}
+        with get_scheduler().slot(model):
+            start = time.perf_counter()
+            data = self._post(path, payload, model, timeout)
+            MODEL_CALL_SECONDS.observe(time.perf_counter() - start, model=model, path=path)
+        if observe:
+            residency.observe(model, data)
+        return data
+
+    def _post(self, path: str, payload: Dict[str, Any], model: Optional[str],
+              timeout: Optional[float]) -> Dict[str, Any]:
+        tried: Set[str] = set()
+        last_error: Optional[Exception] = None
+        for _ in range(self.retries + 1):
+            try:
+                backend = self.pick(model, exclude=tried)
+            except OllamaUnavailableError:
+                break
+            tried.add(backend.url)
+            try:
+                resp = self.session.post(backend.url + path, json=payload, timeout=timeout or self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+                resp = None
+            if resp is None or resp.status_code >= 500:
+                if resp is not None:
+                    last_error = OllamaUnavailableError(f"{resp.status_code}: {resp.text[:200]}")
+                self._release(backend, False)
+                logger.warning(f"Ollama backend {backend.url} failed: {last_error}; retrying")
+                continue
+            if resp.status_code == 404:
+                # model missing on this backend; not a health problem
+                self._release(backend, True)
+                with self._lock:
+                    backend.loaded.discard(_base(model or ""))
+                last_error = OllamaUnavailableError(f"{backend.url}: {resp.text[:200]}")
+                continue
+            self._release(backend, True, model if resp.ok else None)
+            # any other 4xx means the request itself is bad; retrying will not help
+            resp.raise_for_status()
+            return resp.json()
+        raise OllamaUnavailableError(f"All Ollama backends failed for {path}: {last_error}")
+
+    def stream(self, path: str, payload: Dict[str, Any], model: Optional[str] = None,
+               timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """POST with stream=True and yield NDJSON objects; retries only before the first byte."""
+        if self.flights is None:
+            yield from self._stream_call(path, payload, model, timeout)
+            return
+        # a caller joining an identical stream gets the chunks so far, then the live ones
+        yield from self.flights.stream(call_key(path, model, payload),
+                                       lambda: self._stream_call(path, payload, model, timeout), label=path)
+
+    def _stream_call(self, path: str, payload: Dict[str, Any], model: Optional[str],
+                     timeout: Optional[float]) -> Iterator[Dict[str, Any]]:
+        if not model:
+            yield from self._stream(path, payload, model, timeout)
+            return
+        residency = get_residency()
+        payload = {"keep_alive": residency.keep_alive(model), **payload}
+        with get_scheduler().slot(model):
+            start = time.perf_counter()
+            for chunk in self._stream(path, payload, model, timeout):
+                if chunk.get("done"):
+                    MODEL_CALL_SECONDS.observe(time.perf_counter() - start, model=model, path=path)
+                    residency.observe(model, chunk)
+                yield chunk
+
+    def _stream(self, path: str, payload: Dict[str, Any], model: Optional[str],
+                timeout: Optional[float]) -> Iterator[Dict[str, Any]]:
+        tried: Set[str] = set()
+        last_error: Optional[Exception] = None
+        for _ in range(self.retries + 1):
+            try:
+                backend = self.pick(model, exclude=tried)
+            except OllamaUnavailableError:
+                break
+            tried.add(backend.url)
+            try:
+                resp = self.session.post(backend.url + path, json={**payload, "stream": True},
+                                         timeout=timeout or self.timeout, stream=True)
+                resp.raise_for_status()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                last_error = e
+                self._release(backend, False)
+                continue
+            # stays None if the consumer stops early (GeneratorExit): that is not the backend's fault
+            ok = None
+            try:
+                for line in resp.iter_lines():
+                    if line:
+                        yield json.loads(line)
+                ok = True
+                return
+            except requests.RequestException:
+                ok = False
+                raise
+            finally:
+                resp.close()
+                self._release(backend, ok, model if ok else None)
+        raise OllamaUnavailableError(f"All Ollama backends failed for {path}: {last_error}")
+
+    def chat(self, model: str, messages: List[Dict[str, str]],
+             options: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        payload = {"model": model, "messages": messages, "stream": False, **kwargs}
+        if options:
+            payload["options"] = options
+        return self.post("/api/chat", payload, model=model)
+
+    def chat_stream(self, model: str, messages: List[Dict[str, str]],
+                    options: Optional[Dict[str, Any]] = None, **kwargs) -> Iterator[str]:
+        """Content deltas of a streamed chat answer, in order."""
+        payload = {"model": model, "messages": messages, **kwargs}
+        if options:
+            payload["options"] = options
+        for chunk in self.stream("/api/chat", payload, model=model):
+            content = chunk.get("message", {}).get("content")
+            if content:
+                yield content
+
+    def generate(self, model: str, prompt: str, **kwargs) -> Dict[str, Any]:
+        return self.post("/api/generate", {"model": model, "prompt": prompt, "stream": False, **kwargs},
+                         model=model)
+
+    def embeddings(self, model: str, prompt: str, **kwargs) -> List[float]:
+        data = self.post("/api/embeddings", {"model": model, "prompt": prompt, **kwargs}, model=model)
+        return data.get("embedding", [])
+
+    def embed(self, model: str, inputs: List[str], **kwargs) -> List[List[float]]:
+        """Embed many texts in one call (/api/embed)."""
+        data = self.post("/api/embed", {"model": model, "input": inputs, **kwargs}, model=model)
+        return data.get("embeddings", [])
+
+    # --- Health ---
+    def check_health(self) -> None:
+        for backend in self.backends:
+            try:
+                resp = self.session.get(backend.url + "/api/ps", timeout=2)
+                resp.raise_for_status()
+                loaded = {_base(m.get("name") or m.get("model", "")) for m in resp.json().get("models", [])}
+                # reachability only; an ejected backend still serves out its ejection
+                with self._lock:
+                    backend.healthy = True
+                    backend.loaded = loaded
+            except Exception as e:
+                with self._lock:
+                    if backend.healthy:
+                        logger.warning(f"Ollama backend {backend.url} failed health check: {e}")
+                    backend.healthy = False
+
+    def start_health_checks(self, interval: float = OLLAMA_HEALTH_INTERVAL) -> None:
+        if self._health_thread is not None or interval <= 0:
+            return
+
+        def _loop():
+            while True:
+                self.check_health()
+                time.sleep(interval)
+
+        self._health_thread = threading.Thread(target=_loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def status(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [b.as_dict() for b in self.backends]
+
+    def metrics(self):
+        now = time.time()
+        with self._lock:
+            return [
+                ("edris_ollama_backend_up", "gauge", "1 if the backend is healthy and not ejected",
+                 [({"backend": b.url}, int(b.available(now))) for b in self.backends]),
+                ("edris_ollama_backend_outstanding", "gauge", "Requests in flight per backend",
+                 [({"backend": b.url}, b.outstanding) for b in self.backends]),
+                ("edris_ollama_coalescing_flights", "gauge", "Distinct upstream calls shared by coalesced callers",
+                 [({}, self.flights.inflight() if self.flights else 0)]),
+            ]
+
+
+_pool: Optional[OllamaPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> OllamaPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = OllamaPool(OLLAMA_BACKENDS)
+    return _pool
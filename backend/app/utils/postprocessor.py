@@ -1,36 +1,145 @@
+# backend/app/utils/postprocessor.py
+"""
+Rendering of model answers: code fences, admonitions, JSON blocks,
+footnotes, [LATEX], [TABLE] and [MERMAID] markers.
+
+`post_process` renders a complete answer. `IncrementalPostProcessor` does
+the same for a streamed one: it takes token deltas and emits rendered
+fragments as soon as the text up to a blank line holds no unfinished
+construct (an open ``` fence or ```json block, [LATEX] or [MERMAID]
+without its closing tag, a footnote marker still waiting for its text).
+Every transformation in post_process is local to such a block, so the
+concatenated fragments equal post_process of the whole answer. Only the
+unfinished tail is held back, up to POSTPROCESS_MAX_PENDING characters;
+past that the block is rendered at the last blank line anyway.
+
+Footnote definitions are the exception: post_process replaces each one
+throughout the answer, so the definitions seen so far are carried over
+and applied to later blocks. Two cases cannot be reproduced without
+buffering the whole answer: a definition whose text also appears in an
+earlier, already emitted block, and a transformation failing on a later
+block (the batch fallback returns the entire answer unrendered behind an
+error note).
+"""
+import logging
 import re
+from typing import Optional
+from utils.config import POSTPROCESS_MAX_PENDING
 from utils.formatter import format_table, to_latex, to_mermaid , to_base64_image_tag
 from utils.formatter import chart_to_base64 ,highlight_code_blocks
 from utils.formatter import replace_footnotes, generate_toc
 from utils.formatter import replace_admonitions ,extract_and_validate_json
 
+logger = logging.getLogger(__name__)
+
+_LATEX = re.compile(r"\[LATEX\](.*?)\[/LATEX\]", flags=re.DOTALL)
+_MERMAID = re.compile(r"\[MERMAID\](.*?)\[/MERMAID\]", flags=re.DOTALL)
+_JSON_BLOCK = re.compile(r"```json\n([\s\S]*?)\n```")
+_FOOTNOTE_OPEN = re.compile(r"\[\^\d+\]:\s*\Z")
+
+
+def _structure(text: str) -> str:
+    text = highlight_code_blocks(text)
+    return replace_admonitions(text)
+
+
+def _render(text: str, footnotes: Optional[list] = None) -> str:
+    text = extract_and_validate_json(text)
+    text = replace_footnotes(text, footnotes)
+    # handle LaTeX
+    text = _LATEX.sub(lambda m: to_latex(m.group(1)), text)
+    # handle TABLE
+    if "[TABLE]" in text:
+        # placeholder example, real data should be passed
+        text = text.replace("[TABLE]", format_table(
+            [["H1", "H2"], ["A", "B"]], ["H1", "H2"]))
+    # handle MERMAID
+    text = _MERMAID.sub(lambda m: to_mermaid(m.group(1).split(";")), text)
+    return text
+
+
+def _error(e: Exception, text: str) -> str:
+    # fallback: return original text with error note
+    return f"<div class='postprocess-error'>Error: {e}</div>\n" + text
+
 
 def post_process(text: str, original_prompt: str) -> str:
     try:
-        text = highlight_code_blocks(text)
-        text = replace_admonitions(text)
-        text = extract_and_validate_json(text)
-        text = replace_footnotes(text)
-        # handle LaTeX
-        text = re.sub(
-            r"\[LATEX\](.*?)\[/LATEX\]",
-            lambda m: to_latex(m.group(1)),
-            text,
-            flags=re.DOTALL
-        )
-        # handle TABLE
-        if "[TABLE]" in text:
-            # placeholder example, real data should be passed
-            text = text.replace("[TABLE]", format_table(
-                [["H1", "H2"], ["A", "B"]], ["H1", "H2"]))
-        # handle MERMAID
-        text = re.sub(
-            r"\[MERMAID\](.*?)\[/MERMAID\]",
-            lambda m: to_mermaid(m.group(1).split(";")),
-            text,
-            flags=re.DOTALL
-        )
-        return text
+        return _render(_structure(text))
     except Exception as e:
-        # fallback: return original text with error note
-        return f"<div class='postprocess-error'>Error: {e}</div>\n" + text
+        return _error(e, text)
+
+
+def _unclosed(pattern: re.Pattern, opener: str, text: str) -> bool:
+    """An opener left after the last complete match: its block continues past text."""
+    last = 0
+    for m in pattern.finditer(text):
+        last = m.end()
+    return opener in text[last:]
+
+
+class IncrementalPostProcessor:
+    def __init__(self, original_prompt: str = "", max_pending: int = POSTPROCESS_MAX_PENDING):
+        self.original_prompt = original_prompt
+        self.max_pending = max_pending
+        self.pending = ""
+        self.emitted = 0
+        self.failed = False
+        # footnote definitions seen so far, applied to later blocks too
+        self.footnotes: list = []
+
+    def feed(self, delta: str) -> str:
+        """Add a token delta; return whatever can be rendered now (often "")."""
+        # a blank line ending before this delta was already found unsafe, and stays so
+        since = max(len(self.pending) - 1, 0)
+        self.pending += delta
+        cut = self._boundary(since) if "\n\n" in self.pending[since:] else None
+        if cut is None and len(self.pending) > self.max_pending:
+            last = self.pending.rfind("\n\n")
+            if last != -1:
+                cut = last + 2
+                logger.debug(f"Rendering an unfinished block of {cut} characters")
+        if cut is None:
+            return ""
+        block, self.pending = self.pending[:cut], self.pending[cut:]
+        return self._emit(block)
+
+    def finish(self) -> str:
+        """Render the rest at the end of the stream."""
+        block, self.pending = self.pending, ""
+        return self._emit(block) if block else ""
+
+    def _emit(self, block: str) -> str:
+        if self.failed:
+            out = block
+        else:
+            try:
+                out = _render(_structure(block), self.footnotes)
+            except Exception as e:
+                self.failed = True
+                # identical to post_process when the first block already fails
+                out = _error(e, block) if not self.emitted else block
+        self.emitted += len(block)
+        return out
+
+    def _boundary(self, since: int) -> Optional[int]:
+        """End of the longest prefix ending in a blank line at or after since with no open construct."""
+        text = self.pending
+        cut = text.rfind("\n\n")
+        while cut >= since:
+            end = cut + 2
+            if self._closed(text[:end]):
+                return end
+            cut = text.rfind("\n\n", 0, cut)
+        return None
+
+    @staticmethod
+    def _closed(block: str) -> bool:
+        if block.count("```") % 2:
+            return False
+        if _unclosed(_LATEX, "[LATEX]", block) or _unclosed(_MERMAID, "[MERMAID]", block):
+            return False
+        if _FOOTNOTE_OPEN.search(block):
+            return False
+        # JSON blocks are matched after fences and admonitions are rewritten
+        return "```json\n" not in block or not _unclosed(_JSON_BLOCK, "```json\n", _structure(block))
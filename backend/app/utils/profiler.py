@@ -0,0 +1,309 @@
+# backend/app/utils/profiler.py
+"""
+Stack-sampling profiles of slow requests.
+
+With `profiling.enabled`, ProfilingMiddleware records every request to the
+configured paths (/chat, /knowledge/upload by default) and keeps the
+profile of those that took longer than PROFILING_THRESHOLD -- or, for a
+PROFILING_SAMPLE_RATE fraction of the rest, regardless. Nothing is
+instrumented: one sampler thread reads the stack of every thread
+(sys._current_frames) each PROFILING_INTERVAL while a recorded request is
+in flight, and sleeps otherwise. Per request, samples are aggregated as
+(thread, stack) -> seconds, so memory grows with the number of distinct
+stacks, not with duration.
+
+Samples cover the whole process while the request ran: the event loop,
+the threadpool workers its stages run on, the ingestion workers of an
+upload's background build, and whatever concurrent requests were doing.
+Threads idling in a wait or select outside app code, and the health-check
+and residency loops, are left out; waits inside app code (a scheduler
+slot, a model call) are kept, since that is often where the time goes.
+A coroutine suspended in an await is on no thread's stack: its time shows
+up under the threadpool worker running the stage it awaits.
+
+Profiles are written to PROFILING_DIR as speedscope JSON (one profile per
+thread, open at https://www.speedscope.app) or as collapsed stacks for
+flamegraph.pl / inferno. The directory is capped at PROFILING_MAX_FILES
+files and PROFILING_MAX_MB megabytes, oldest removed first; GET /profiles
+lists them.
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Dict, List, Optional, Tuple
+from utils.config import (
+    PROFILING_DIR, PROFILING_FORMAT, PROFILING_INTERVAL_MS, PROFILING_MAX_FILES, PROFILING_MAX_MB,
+    PROFILING_MAX_STACKS, PROFILING_PATHS, PROFILING_SAMPLE_RATE, PROFILING_THRESHOLD
+)
+from utils.metrics import PROFILES_SAVED
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = str(Path(__file__).resolve().parents[1])
+EXTENSIONS = {"speedscope": ".speedscope.json", "collapsed": ".collapsed.txt"}
+# innermost frames of a thread with nothing to do
+_IDLE = {("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get"),
+         ("socket.py", "accept"), ("threading.py", "_wait_for_tstate_lock")}
+# the app's periodic loops (they sleep in C, where frames cannot show it)
+_BACKGROUND = {"ollama-health", "model-residency", "edris-preload"}
+# <stamp>_<endpoint>_<ms>ms_<reason>_<n><extension>
+_NAME = re.compile(r"^(\d{8}T\d{6})_(.+)_(\d+)ms_(slow|sampled)_\d+\.")
+
+Stack = Tuple[CodeType, ...]
+
+
+def _stack(frame: FrameType) -> Stack:
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+    return tuple(codes)
+
+
+def _idle(stack: Stack) -> bool:
+    leaf = stack[-1]
+    if (Path(leaf.co_filename).name, leaf.co_name) not in _IDLE:
+        return False
+    return not any(code.co_filename.startswith(APP_DIR) for code in stack)
+
+
+def _frame_name(code: CodeType) -> str:
+    filename = code.co_filename
+    if filename.startswith(APP_DIR):
+        filename = filename[len(APP_DIR) + 1:]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+@dataclass
+class Recording:
+    endpoint: str
+    started: float = field(default_factory=time.perf_counter)
+    created: datetime = field(default_factory=datetime.now)
+    # (thread id, stack) -> seconds observed
+    stacks: Dict[Tuple[int, Stack], float] = field(default_factory=dict)
+    threads: Dict[int, str] = field(default_factory=dict)
+    samples: int = 0
+    dropped: int = 0
+    seconds: float = 0.0
+
+    def add(self, tid: int, stack: Stack, dt: float, max_stacks: int) -> None:
+        key = (tid, stack)
+        if key not in self.stacks and len(self.stacks) >= max_stacks:
+            self.dropped += 1
+            return
+        self.stacks[key] = self.stacks.get(key, 0.0) + dt
+
+
+# --- Output formats ---
+def to_speedscope(rec: Recording) -> Dict:
+    frames: List[Dict] = []
+    index: Dict[CodeType, int] = {}
+    by_thread: Dict[int, Tuple[List[List[int]], List[float]]] = {}
+    for (tid, stack), seconds in rec.stacks.items():
+        ids = []
+        for code in stack:
+            if code not in index:
+                index[code] = len(frames)
+                frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+            ids.append(index[code])
+        samples, weights = by_thread.setdefault(tid, ([], []))
+        samples.append(ids)
+        weights.append(round(seconds * 1000, 3))
+    profiles = []
+    for tid, (samples, weights) in sorted(by_thread.items(), key=lambda kv: -sum(kv[1][1])):
+        profiles.append({"type": "sampled", "name": rec.threads.get(tid, str(tid)), "unit": "milliseconds",
+                         "startValue": 0, "endValue": round(sum(weights), 3),
+                         "samples": samples, "weights": weights})
+    return {"$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{rec.endpoint} {rec.seconds * 1000:.0f} ms ({rec.created:%Y-%m-%d %H:%M:%S})",
+            "exporter": "edris", "activeProfileIndex": 0,
+            "shared": {"frames": frames}, "profiles": profiles}
+
+
+def to_collapsed(rec: Recording) -> str:
+    """One "thread;outer;...;inner <microseconds>" line per stack (flamegraph.pl, inferno)."""
+    lines = []
+    for (tid, stack), seconds in rec.stacks.items():
+        names = [rec.threads.get(tid, str(tid))] + [_frame_name(c) for c in stack]
+        lines.append(f"{';'.join(n.replace(';', ':') for n in names)} {max(int(seconds * 1e6), 1)}")
+    return "\n".join(sorted(lines)) + "\n"
+
+
+# --- Sampler ---
+class SamplingProfiler:
+    def __init__(self, directory: Path = PROFILING_DIR, interval_ms: float = PROFILING_INTERVAL_MS,
+                 fmt: str = PROFILING_FORMAT, max_files: int = PROFILING_MAX_FILES,
+                 max_mb: float = PROFILING_MAX_MB, max_stacks: int = PROFILING_MAX_STACKS):
+        if fmt not in EXTENSIONS:
+            raise ValueError(f"Unknown profile format {fmt!r}, expected one of {sorted(EXTENSIONS)}")
+        self.directory = Path(directory)
+        self.interval = interval_ms / 1000
+        self.fmt = fmt
+        self.max_files = max_files
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.max_stacks = max_stacks
+        self._active: List[Recording] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._counter = 0
+        # time spent sampling, to keep an eye on the overhead
+        self.sampling_seconds = 0.0
+        self.ticks = 0
+
+    def start(self, endpoint: str) -> Recording:
+        rec = Recording(endpoint)
+        with self._lock:
+            self._active.append(rec)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return rec
+
+    def stop(self, rec: Recording) -> float:
+        with self._lock:
+            self._active.remove(rec)
+            if not self._active:
+                self._wake.clear()
+        rec.seconds = time.perf_counter() - rec.started
+        return rec.seconds
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        last = time.perf_counter()
+        while True:
+            if not self._wake.is_set():
+                self._wake.wait()
+                last = time.perf_counter()
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            try:
+                self._sample(me, now - last)
+            except Exception as e:
+                logger.warning(f"Profiler sample failed: {e}")
+            last = now
+            self.sampling_seconds += time.perf_counter() - now
+            self.ticks += 1
+
+    def _sample(self, me: int, dt: float) -> None:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks = [(tid, _stack(frame)) for tid, frame in sys._current_frames().items()
+                  if tid != me and names.get(tid) not in _BACKGROUND]
+        stacks = [(tid, stack) for tid, stack in stacks if stack and not _idle(stack)]
+        with self._lock:
+            for rec in self._active:
+                rec.samples += 1
+                for tid, stack in stacks:
+                    rec.threads.setdefault(tid, names.get(tid, str(tid)))
+                    rec.add(tid, stack, dt, self.max_stacks)
+
+    # --- Storage ---
+    def save(self, rec: Recording, reason: str) -> Optional[Path]:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with self._lock:
+                self._counter += 1
+                n = self._counter
+            slug = re.sub(r"[^A-Za-z0-9]+", "-", rec.endpoint).strip("-").lower() or "request"
+            path = self.directory / (f"{rec.created:%Y%m%dT%H%M%S}_{slug}_{rec.seconds * 1000:.0f}ms_"
+                                     f"{reason}_{n}{EXTENSIONS[self.fmt]}")
+            if self.fmt == "speedscope":
+                path.write_text(json.dumps(to_speedscope(rec)), encoding="utf-8")
+            else:
+                path.write_text(to_collapsed(rec), encoding="utf-8")
+            PROFILES_SAVED.inc(endpoint=rec.endpoint.split(" ")[0], reason=reason)
+            if rec.dropped:
+                logger.info(f"Profile {path.name}: {rec.dropped} samples past {self.max_stacks} distinct stacks dropped")
+            self._evict()
+            return path
+        except Exception as e:
+            logger.error(f"Error saving profile of {rec.endpoint}: {str(e)}")
+            return None
+
+    def _files(self) -> List[Path]:
+        if not self.directory.exists():
+            return []
+        files = [p for p in self.directory.iterdir() if p.is_file() and _NAME.match(p.name)]
+        return sorted(files, key=lambda p: p.stat().st_mtime_ns)
+
+    def _evict(self) -> None:
+        files = self._files()
+        total = sum(p.stat().st_size for p in files)
+        while files and (len(files) > self.max_files or total > self.max_bytes):
+            oldest = files.pop(0)
+            total -= oldest.stat().st_size
+            oldest.unlink(missing_ok=True)
+
+    def list(self) -> List[Dict]:
+        """Saved profiles, newest first."""
+        out = []
+        for p in reversed(self._files()):
+            stamp, endpoint, ms, reason = _NAME.match(p.name).groups()
+            out.append({"name": p.name, "endpoint": endpoint, "duration_ms": int(ms), "reason": reason,
+                        "created": datetime.strptime(stamp, "%Y%m%dT%H%M%S").isoformat(),
+                        "format": next((f for f, ext in EXTENSIONS.items() if p.name.endswith(ext)), None),
+                        "bytes": p.stat().st_size})
+        return out
+
+    def file(self, name: str) -> Optional[Path]:
+        """A saved profile by name; None for unknown names or anything outside the directory."""
+        if not _NAME.match(name) or "/" in name or "\\" in name:
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+    def status(self) -> Dict:
+        return {"interval_ms": self.interval * 1000, "format": self.fmt, "active": len(self._active),
+                "ticks": self.ticks, "sampling_ms_per_tick":
+                    round(self.sampling_seconds / self.ticks * 1000, 3) if self.ticks else None}
+
+
+_profiler: Optional[SamplingProfiler] = None
+
+
+def get_profiler() -> SamplingProfiler:
+    global _profiler
+    if _profiler is None:
+        _profiler = SamplingProfiler()
+    return _profiler
+
+
+# --- ASGI middleware ---
+class ProfilingMiddleware:
+    """Record requests to `paths` (prefixes); save those over `threshold` seconds or sampled."""
+
+    def __init__(self, app, paths: List[str] = PROFILING_PATHS, threshold: float = PROFILING_THRESHOLD,
+                 sample_rate: float = PROFILING_SAMPLE_RATE):
+        self.app = app
+        self.paths = [p.rstrip("/") for p in paths]
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+
+    def _matches(self, path: str) -> bool:
+        return any(path == p or path.startswith(p + "/") for p in self.paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._matches(scope["path"]):
+            return await self.app(scope, receive, send)
+        profiler = get_profiler()
+        # the response and any background task (an upload's index build) are inside the window
+        rec = profiler.start(f"{scope['method']} {scope['path']}")
+        sampled = random.random() < self.sample_rate
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            seconds = profiler.stop(rec)
+            reason = "slow" if seconds >= self.threshold else "sampled" if sampled else None
+            if reason:
+                asyncio.get_running_loop().run_in_executor(None, profiler.save, rec, reason)
@@ -0,0 +1,198 @@
+# backend/app/utils/residency.py
+"""
+Model residency: keep the models the chat path needs loaded in Ollama.
+
+Ollama loads a model on first use and unloads it after `keep_alive` idle
+time, so the first request after a quiet period pays a cold load, often
+more than one for a Persian message (translate, answer, translate back).
+The residency manager
+
+- preloads the configured models on a background thread at startup (an
+  empty /api/generate or /api/embeddings call loads a model without doing
+  any work),
+- stamps every pool request with the model's keep_alive,
+- re-warms configured models that dropped out of every backend's /api/ps,
+- counts cold loads: responses whose `load_duration` exceeds
+  `cold_load_threshold` seconds on request traffic (preloads are counted
+  separately).
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+from utils.config import (
+    RESIDENCY_PRELOAD, RESIDENCY_KEEP_ALIVE, RESIDENCY_KEEP_ALIVE_OVERRIDES,
+    RESIDENCY_EMBEDDING_MODELS, RESIDENCY_COLD_LOAD_THRESHOLD, RESIDENCY_REWARM_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+KeepAlive = Union[str, int]
+
+
+def _base(model: str) -> str:
+    return model if ":" in model else f"{model}:latest"
+
+
+@dataclass
+class ModelResidency:
+    keep_alive: KeepAlive
+    calls: int = 0
+    cold_loads: int = 0
+    cold_load_seconds: float = 0.0
+    preloads: int = 0
+    last_load_s: Optional[float] = None
+    last_used: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "keep_alive": self.keep_alive, "calls": self.calls, "cold_loads": self.cold_loads,
+            "cold_load_seconds": round(self.cold_load_seconds, 3), "preloads": self.preloads,
+            "last_load_s": None if self.last_load_s is None else round(self.last_load_s, 3),
+            "last_used": self.last_used,
+        }
+
+
+class ResidencyManager:
+    def __init__(
+        self,
+        preload: List[str] = RESIDENCY_PRELOAD,
+        keep_alive: KeepAlive = RESIDENCY_KEEP_ALIVE,
+        overrides: Dict[str, KeepAlive] = RESIDENCY_KEEP_ALIVE_OVERRIDES,
+        embedding_models: List[str] = RESIDENCY_EMBEDDING_MODELS,
+        cold_load_threshold: float = RESIDENCY_COLD_LOAD_THRESHOLD,
+    ):
+        self.preload_models = list(preload)
+        self.default_keep_alive = keep_alive
+        self.overrides = {_base(m): v for m, v in overrides.items()}
+        self.embedding_models = {_base(m) for m in embedding_models}
+        self.cold_load_threshold = cold_load_threshold
+        self.models: Dict[str, ModelResidency] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def keep_alive(self, model: str) -> KeepAlive:
+        return self.overrides.get(_base(model), self.default_keep_alive)
+
+    def _entry(self, model: str) -> ModelResidency:
+        key = _base(model)
+        entry = self.models.get(key)
+        if entry is None:
+            entry = self.models[key] = ModelResidency(self.keep_alive(model))
+        return entry
+
+    def observe(self, model: str, response: Dict[str, Any], preload: bool = False) -> None:
+        """Record a finished call; `load_duration` (ns) tells whether Ollama had to load the model."""
+        load_s = (response.get("load_duration") or 0) / 1e9
+        with self._lock:
+            entry = self._entry(model)
+            entry.last_used = time.time()
+            entry.last_load_s = load_s
+            if preload:
+                entry.preloads += 1
+                return
+            entry.calls += 1
+            if load_s >= self.cold_load_threshold:
+                entry.cold_loads += 1
+                entry.cold_load_seconds += load_s
+                cold = True
+            else:
+                cold = False
+        if cold:
+            logger.info(f"Cold load of {model} took {load_s:.2f}s")
+
+    # --- Preloading ---
+    def warm(self, model: str) -> bool:
+        """Load `model` on a backend without generating anything."""
+        from utils.ollama_pool import get_pool
+
+        pool = get_pool()
+        try:
+            if _base(model) in self.embedding_models:
+                data = pool.post("/api/embeddings", {"model": model, "prompt": ""},
+                                 model=model, observe=False)
+            else:
+                data = pool.post("/api/generate", {"model": model, "prompt": "", "stream": False},
+                                 model=model, observe=False)
+        except Exception as e:
+            logger.warning(f"Preloading {model} failed: {str(e)}")
+            return False
+        self.observe(model, data, preload=True)
+        return True
+
+    def preload(self) -> Dict[str, bool]:
+        from utils.scheduler import PRIORITY_BULK, model_priority
+
+        start = time.perf_counter()
+        with model_priority(PRIORITY_BULK):
+            result = {m: self.warm(m) for m in self.preload_models}
+        logger.info(f"Preloaded {sum(result.values())}/{len(result)} models in {time.perf_counter() - start:.1f}s")
+        return result
+
+    def missing(self) -> List[str]:
+        """Configured models not loaded on any backend, as last seen by the pool's health checks."""
+        from utils.ollama_pool import get_pool
+
+        loaded = {m for b in get_pool().status() for m in b["loaded"]}
+        return [m for m in self.preload_models if _base(m) not in loaded]
+
+    def start(self, rewarm_interval: float = RESIDENCY_REWARM_INTERVAL) -> None:
+        """Preload in the background, then re-warm evicted models every `rewarm_interval` seconds."""
+        if self._thread is not None or not self.preload_models:
+            return
+
+        def _loop():
+            from utils.scheduler import PRIORITY_BULK, model_priority
+
+            self.preload()
+            while rewarm_interval > 0:
+                time.sleep(rewarm_interval)
+                with model_priority(PRIORITY_BULK):
+                    for model in self.missing():
+                        logger.info(f"{model} is no longer resident; re-warming")
+                        self.warm(model)
+
+        self._thread = threading.Thread(target=_loop, name="model-residency", daemon=True)
+        self._thread.start()
+
+    def status(self) -> Dict[str, Any]:
+        from utils.ollama_pool import get_pool
+
+        resident: Dict[str, List[str]] = {}
+        for b in get_pool().status():
+            for m in b["loaded"]:
+                resident.setdefault(m, []).append(b["url"])
+        with self._lock:
+            models = {m: e.as_dict() for m, e in self.models.items()}
+        for m in self.preload_models:
+            models.setdefault(_base(m), ModelResidency(self.keep_alive(m)).as_dict())
+        for m, info in models.items():
+            info["resident_on"] = resident.get(m, [])
+        return {"preload": self.preload_models, "cold_load_threshold": self.cold_load_threshold,
+                "models": models}
+
+    def metrics(self):
+        with self._lock:
+            models = list(self.models.items())
+            return [
+                ("edris_model_cold_loads_total", "counter", "Calls that had to load the model first",
+                 [({"model": m}, e.cold_loads) for m, e in models]),
+                ("edris_model_cold_load_seconds_total", "counter", "Seconds spent in cold loads",
+                 [({"model": m}, e.cold_load_seconds) for m, e in models]),
+                ("edris_model_preloads_total", "counter", "Models loaded by the residency manager",
+                 [({"model": m}, e.preloads) for m, e in models]),
+            ]
+
+
+_manager: Optional[ResidencyManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_residency() -> ResidencyManager:
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = ResidencyManager()
+    return _manager
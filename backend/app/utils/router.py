@@ -1,27 +1,42 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Body
-import ollama
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Optional
+import asyncio
 import re
 import logging
-from langdetect import detect
-import requests
 from datetime import datetime
 import os
 import sys
 import json
 from pathlib import Path
 import uuid
-from langchain.vectorstores import FAISS
-from langchain.embeddings import OpenAIEmbeddings, HuggingFaceEmbeddings
-from langchain.schema.document import Document
+from collections import Counter
+from functools import partial
 from  experts.translator import translate_english_to_persian, translate_persian_to_english
 from experts.translator import detect_language
+from experts.gating import get_router as get_expert_router
+from utils.ollama_pool import get_pool
+from utils.context_builder import get_context_builder
+from knowledge.images import get_preparer
+from knowledge.index_cache import get_index_cache
+from knowledge.rerank import get_reranker
+from knowledge.symbols import definition_context
+from utils.metrics import span, trace
+from utils.stages import StageGraph
+from utils.postprocessor import IncrementalPostProcessor, post_process
+from utils.scheduler import (
+    QueueFullError, PRIORITY_BATCH, model_priority, measure_queue_time
+)
 
 # Import your existing modules
 sys.path.append(str(Path(__file__).parent.parent))
 from knowledge.loader import load_file, build_vectorstore
-from .config import VECTORSTORE_PATH
+from .config import (
+    VECTORSTORE_PATH, ALGORITHMS_FULLCOMPLETE_MAX,
+    CHAT_MULTILINGUAL_RETRIEVAL, CHAT_PREWARM_SUMMARY, CHAT_SPECULATIVE_RETRIEVAL
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -35,28 +50,39 @@ DOCUMENT_DB_PATH = os.path.join(os.path.dirname(VECTORSTORE_PATH), "documents.js
 class ChatMessage(BaseModel):
     role: str
     content: str
+    # base64 images (as in Ollama's chat API); routed to the vision expert
+    images: Optional[List[str]] = None
 
 class ChatRequest(BaseModel):
     messages: List[ChatMessage]
-    model: str = "deepseek-r1"
+    # "auto" lets the expert router choose; any other value is used as the Ollama model
+    model: str = "auto"
     stream: bool = False
     options: Optional[Dict[str, Any]] = None
+    # return per-stage timings with the response
+    timings: bool = False
+    # render code, LaTeX, Mermaid, JSON blocks and footnotes (utils/postprocessor.py)
+    render: bool = False
 
 class ChatResponse(BaseModel):
     response: str
     processing_time: float
+    routing: Optional[Dict[str, Any]] = None
+    # seconds spent waiting for model slots (admission control)
+    queue_time: float = 0.0
+    # token budget / history compaction report for the prompt sent
+    prompt: Optional[Dict[str, Any]] = None
+    # per-stage seconds, when requested
+    timings: Optional[Dict[str, Any]] = None
 
 # Database operations - Implement directly instead of using db_manager
 def get_vectorstore(vectorstore_path=VECTORSTORE_PATH):
-    """Load or create a vector store"""
+    """Load the vector store (cached; embedded with the same model as at ingest)"""
     try:
-        if os.path.exists(vectorstore_path):
-            # Choose the embeddings model you're using
-            embeddings = HuggingFaceEmbeddings()  # or OpenAIEmbeddings() if you're using that
-            return FAISS.load_local(vectorstore_path, embeddings)
-        else:
+        db = get_index_cache().get(Path(vectorstore_path))
+        if db is None:
             logger.warning(f"Vector store not found at {vectorstore_path}")
-            return None
+        return db
     except Exception as e:
         logger.error(f"Error loading vector store: {str(e)}")
         return None
@@ -176,28 +202,24 @@ def format_algorithm_explanation(algorithm_name: str, algorithm_data: dict) -> s
     
     return explanation
 
-async def process_fullcomplete_request(query: str):
+def process_fullcomplete_request(query: str):
     """Process request with fullcomplete command to explain algorithms in detail"""
     # Extract the actual query without the fullcomplete command
     base_query = query.replace("fullcomplete", "").strip()
     
     # Get the vector store
-    vectorstore = get_vectorstore()
+    with span("fullcomplete.load_index"):
+        vectorstore = get_vectorstore()
     if not vectorstore:
         return "Vector store not found. Please ensure documents have been processed."
     
-    # Get relevant documents from the vector store
-    docs = vectorstore.similarity_search(base_query, k=5)
-    
-    # Extract algorithm names from retrieved documents
-    algorithm_names = []
-    for doc in docs:
-        # This regex pattern looks for algorithm names - adjust based on your document structure
-        matches = re.findall(r'Algorithm:\s*([A-Za-z0-9\s\-_]+)', doc.page_content)
-        algorithm_names.extend(matches)
+    # Get relevant documents from the vector store (reranked candidates, not the raw top-k)
+    with span("fullcomplete.search"):
+        docs, _ = get_reranker().retrieve(vectorstore, base_query, max_passages=5)
     
-    # Remove duplicates and clean names
-    algorithm_names = list(set([name.strip() for name in algorithm_names]))
+    # Algorithm names were extracted at ingest (chunk metadata); most mentioned first
+    mentions = Counter(name for doc in docs for name in doc.metadata.get("algorithms") or [])
+    algorithm_names = [name for name, _ in mentions.most_common(ALGORITHMS_FULLCOMPLETE_MAX)]
     
     # If no algorithms found, return a helpful message
     if not algorithm_names:
@@ -206,16 +228,18 @@ async def process_fullcomplete_request(query: str):
     # For each algorithm, get detailed information and format it
     response_text = f"# Detailed Algorithm Explanations for: {base_query}\n\n"
     
-    for alg_name in algorithm_names:
-        # Get detailed info about this algorithm
-        alg_query = f"Provide detailed explanation, pseudocode, diagrams, complexity analysis, advantages and disadvantages of {alg_name} algorithm"
-        
-        # Query your vector store for detailed information
-        alg_docs = vectorstore.similarity_search(alg_query, k=3)
-        
+    # Query the vector store for every algorithm at once (one embedding batch, one search)
+    alg_queries = [
+        f"Provide detailed explanation, pseudocode, diagrams, complexity analysis, advantages and disadvantages of {alg_name} algorithm"
+        for alg_name in algorithm_names
+    ]
+    with span("fullcomplete.search"):
+        retrieved = get_reranker().retrieve_many(vectorstore, alg_queries)
+    
+    for alg_name, (alg_docs, _) in zip(algorithm_names, retrieved):
         # Extract and process the information
         algorithm_data = {
-            "explanation": "\n".join([doc.page_content for doc in alg_docs]),
+            "explanation": "\n".join([doc.content for doc in alg_docs]),
             "pseudocode": "",
             "time_complexity": "",
             "space_complexity": "",
@@ -238,8 +262,9 @@ async def process_fullcomplete_request(query: str):
         
         try:
             # Here you would call your LLM to structure the algorithm information
-            llm_response = ollama.chat(model="deepseek-r1", 
-                                      messages=[{"role": "user", "content": prompt}])
+            with span("fullcomplete.generate"):
+                llm_response = get_pool().chat("deepseek-r1",
+                                               [{"role": "user", "content": prompt}])
             
             # Parse the LLM response to extract structured information
             response_text_llm = llm_response['message']['content']
@@ -275,75 +300,283 @@ async def process_fullcomplete_request(query: str):
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
-    start_time = datetime.now()
     """Chat endpoint for processing user messages"""
+    if request.stream:
+        return StreamingResponse(_stream_chat(request), media_type="application/x-ndjson")
+    return await _handle_chat(request)
+
+
+async def _stream_chat(request: ChatRequest):
+    """
+    NDJSON: {"delta": ...} lines as the answer is generated (rendered block
+    by block when request.render is set), then {"done": true, ...} with the
+    fields of ChatResponse, or {"error": ..., "status_code": ...}. The
+    deltas concatenate to the final "response".
+    """
+    loop = asyncio.get_running_loop()
+    deltas: asyncio.Queue = asyncio.Queue()
+    # stages call the sink from threadpool threads
+    sink = lambda delta: loop.call_soon_threadsafe(deltas.put_nowait, delta)
+    task = asyncio.create_task(_handle_chat(request, sink))
+    try:
+        while True:
+            get = asyncio.ensure_future(deltas.get())
+            await asyncio.wait({get, task}, return_when=asyncio.FIRST_COMPLETED)
+            if not get.done():
+                get.cancel()
+                break
+            yield json.dumps({"delta": get.result()}, ensure_ascii=False) + "\n"
+        while not deltas.empty():
+            yield json.dumps({"delta": deltas.get_nowait()}, ensure_ascii=False) + "\n"
+        try:
+            result = task.result()
+        except HTTPException as e:
+            yield json.dumps({"error": e.detail, "status_code": e.status_code}, ensure_ascii=False) + "\n"
+            return
+        yield json.dumps({"done": True, **result}, ensure_ascii=False, default=str) + "\n"
+    finally:
+        # client gone: stop generating
+        task.cancel()
+
+
+async def _handle_chat(request: ChatRequest, sink: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    with trace("chat") as timings, measure_queue_time() as queue_stats:
+        try:
+            result = await _process_chat(request, sink)
+        except QueueFullError as e:
+            raise HTTPException(
+                status_code=429, detail=str(e),
+                headers={"Retry-After": str(int(e.retry_after))}
+            )
+    result["queue_time"] = queue_stats.seconds
+    breakdown = timings.as_dict()
+    logger.info(f"Chat handled in {breakdown['total']:.3f}s: {breakdown['stages']}")
+    if "graph" in breakdown:
+        graph = breakdown["graph"]
+        logger.info(f"Critical path {' > '.join(graph['critical_path'])}: "
+                    f"{graph['critical_ms']:.0f} ms of {graph['serial_ms']:.0f} ms serial")
+    if request.timings:
+        result["timings"] = breakdown
+    return result
+
+PROMPT_PREAMBLE = "The following information may be helpful for answering the user's question:\n\n"
+
+
+def _symbol_context(text: str):
+    """Stage: definitions of the identifiers asked about, by exact lookup (code questions)."""
+    def run(vectorstore):
+        if not vectorstore:
+            return None, None
+        try:
+            symbols = get_index_cache().symbols(Path(VECTORSTORE_PATH), vectorstore)
+            if not symbols:
+                return None, None
+            blocks, report = definition_context(vectorstore, symbols, text)
+            return ("\n\n".join(blocks) if blocks else None), report
+        except Exception as e:
+            logger.error(f"Error resolving symbols: {str(e)}")
+            return None, None
+    return run
+
+
+def _vector_context(text: str):
+    """Stage: retrieve many, rerank few within the retrieval token budget."""
+    def run(vectorstore):
+        if not vectorstore:
+            return None, None
+        try:
+            context_docs, retrieval = get_reranker().retrieve(vectorstore, text)
+            return "\n\n".join([doc.content for doc in context_docs]), retrieval
+        except Exception as e:
+            logger.error(f"Error retrieving context: {str(e)}")
+            return None, None
+    return run
+
+
+async def _process_chat(request: ChatRequest, sink: Optional[Callable[[str], None]] = None):
+    """Answer a chat request; with a sink, the answer text is also passed to it as it is produced."""
+    start_time = datetime.now()
+    # Model calls block while waiting for a scheduler slot, so stages run in
+    # the threadpool; independent ones overlap (utils/stages.py)
+    graph = StageGraph("chat")
     try:
         # Get the latest user message
-        logger.info(f"Received chat request: {request}")
+        logger.debug(f"Received chat request: {request}")
         if not request.messages or len(request.messages) == 0:
             raise HTTPException(status_code=400, detail="No messages provided")
         
         latest_message = request.messages[-1].content
-        original_language = detect_language(latest_message)
+        builder = get_context_builder()
+
+        # Started right away, before the language or the command are known:
+        # the index load, image preparation and the summary of older turns
+        # do not depend on them, and are dropped for fullcomplete requests
+        graph.add("detect_language", partial(detect_language, latest_message))
+        graph.add("retrieve.load_index", get_vectorstore, speculative=True)
+        if any(msg.images for msg in request.messages):
+            # downsampled, deduplicated and cached by hash before the vision call
+            graph.add("image.prepare", lambda: [get_preparer().payloads(msg.images) if msg.images else None
+                                                for msg in request.messages], speculative=True)
+        turns = [m for m in request.messages if m.role != "system"]
+        if CHAT_PREWARM_SUMMARY and len(turns) - 1 > builder.recent_turns:
+            history = [{"role": m.role, "content": m.content} for m in request.messages]
+            graph.add("history", partial(builder.summarize_history, history), speculative=True)
+
+        original_language = await graph.result("detect_language")
         is_persian = original_language == 'fa'
         
         # Step 1: Language Detection and Translation
+        text_stage = "detect_language"
         working_text = latest_message
         if is_persian:
             logger.info("Detected Persian input, translating to English")
-            working_text = translate_persian_to_english(latest_message)
+            graph.add("translate_in", partial(translate_persian_to_english, latest_message), after=("detect_language",))
+            if CHAT_MULTILINGUAL_RETRIEVAL:
+                # the embedder reads Persian: retrieve on the original while it is translated
+                graph.add("retrieve.original", _vector_context(latest_message), "retrieve.load_index",
+                          speculative=True)
+            text_stage = "translate_in"
+            working_text = await graph.result("translate_in")
         
+        routing = None
+        prompt_info = None
+        # text already passed to the sink, when the answer was streamed
+        shown: Optional[List[str]] = None
+
         # Step 2: Check for fullcomplete command
         is_fullcomplete = "fullcomplete" in working_text.lower()
         
         # Process the request
         if is_fullcomplete:
             logger.info("Processing fullcomplete request")
-            response_text = await process_fullcomplete_request(working_text)
+            for name in ("retrieve.original", "retrieve.load_index", "image.prepare", "history"):
+                graph.discard(name)
+
+            async def fullcomplete():
+                with model_priority(PRIORITY_BATCH):
+                    return await run_in_threadpool(process_fullcomplete_request, working_text)
+
+            graph.add("fullcomplete", fullcomplete, after=(text_stage,))
+            response_text = await graph.result("fullcomplete")
         else:
             # Standard chat processing
             logger.info(f"Processing regular chat with model: {request.model}")
+            has_images = bool(request.messages[-1].images)
+            
+            # Pick the expert first: the prompt budget depends on the model
+            expert_router = get_expert_router()
+            if request.model == "auto":
+                graph.add("route", partial(expert_router.route, working_text, has_images=has_images),
+                          after=(text_stage,))
+
+            # Code questions resolve definitions by exact lookup; vector
+            # retrieval starts alongside and is dropped if they resolve exactly
+            graph.add("retrieve.symbols", _symbol_context(working_text), "retrieve.load_index", after=(text_stage,))
+            retrieval_stage = "retrieve.original" if "retrieve.original" in graph else "retrieve"
+            if retrieval_stage == "retrieve" and CHAT_SPECULATIVE_RETRIEVAL:
+                graph.add("retrieve", _vector_context(working_text), "retrieve.load_index", after=(text_stage,),
+                          speculative=True)
+            definitions, symbol_report = await graph.result("retrieve.symbols")
+            retrieval = None
+            context = definitions
+            context_stages = ["retrieve.symbols"]
+            if definitions is not None and symbol_report["exact"]:
+                graph.discard(retrieval_stage)
+            else:
+                # no definition, or only guesses from a dotted name's last part: vector hits lead
+                if retrieval_stage not in graph:
+                    graph.add("retrieve", _vector_context(working_text), "retrieve.load_index",
+                              after=("retrieve.symbols",))
+                context, retrieval = await graph.result(retrieval_stage)
+                context_stages.append(retrieval_stage)
+                if definitions is not None:
+                    context = f"{context}\n\n{definitions}" if context else definitions
+
+            decision = None
+            model = request.model
+            if "route" in graph:
+                decision = await graph.result("route")
+                routing = decision.as_dict()
+                model = decision.expert.model
+                logger.info(f"Routed to expert {decision.expert.name} ({model})")
+
             # Modify messages to use translated content if needed
+            payloads = await graph.result("image.prepare") if "image.prepare" in graph else None
             processed_messages = []
-            for msg in request.messages:
+            for i, msg in enumerate(request.messages):
                 if msg.role == "user" and msg.content == latest_message and is_persian:
                     # Only translate the latest user message
-                    processed_messages.append({"role": msg.role, "content": working_text})
+                    processed = {"role": msg.role, "content": working_text}
                 else:
-                    processed_messages.append({"role": msg.role, "content": msg.content})
-            
-            # For a basic retrieval-augmented approach, get relevant context
-            vectorstore = get_vectorstore()
-            if vectorstore:
-                try:
-                    context_docs = vectorstore.similarity_search(working_text, k=3)
-                    context = "\n\n".join([doc.page_content for doc in context_docs])
-                    
-                    # Add context to the system message
-                    context_message = {
-                        "role": "system", 
-                        "content": f"The following information may be helpful for answering the user's question:\n\n{context}"
-                    }
-                    processed_messages.insert(0, context_message)
-                except Exception as e:
-                    logger.error(f"Error retrieving context: {str(e)}")
-            
-            # Call Ollama for regular chat
-            print(f"Trying to chat with model: {processed.model}")
-            print(f"Messages: {processed.messages}")
-            ollama_response = ollama.chat(
-                model=request.model,
-                messages=processed_messages,
-                stream=request.stream,
-                options=request.options
-            )
-            logger.info(f"Ollama response: {response}")
-            response_text = ollama_response['message']['content']
+                    processed = {"role": msg.role, "content": msg.content}
+                if payloads and payloads[i] is not None:
+                    processed["images"] = payloads[i]
+                processed_messages.append(processed)
+
+            # Fit history and context into the model's prompt budget, once
+            # the summary of older turns is cached
+            prompt_deps = [n for n in ("route", "image.prepare", "history") if n in graph] + context_stages
+            graph.add("build_prompt", partial(builder.build, processed_messages, context, model, PROMPT_PREAMBLE),
+                      after=tuple(prompt_deps))
+
+            # A Persian answer is streamed only once translated, i.e. as a whole
+            if sink is not None and not is_persian:
+                shown = []
+
+            def stream_answer(deltas) -> str:
+                """Pass the answer on as it arrives, rendered block by block if asked; return it raw."""
+                renderer = IncrementalPostProcessor(latest_message) if request.render else None
+                answer = []
+                for delta in deltas:
+                    answer.append(delta)
+                    out = renderer.feed(delta) if renderer else delta
+                    if out:
+                        shown.append(out)
+                        sink(out)
+                tail = renderer.finish() if renderer else ""
+                if tail:
+                    shown.append(tail)
+                    sink(tail)
+                return "".join(answer)
+
+            # Call the routed expert, or the explicitly requested model
+            async def generate(built):
+                if decision is not None:
+                    with expert_router.track(decision.expert.name, working_text):
+                        if shown is not None:
+                            return await run_in_threadpool(
+                                stream_answer, decision.expert.stream_chat(built[0], request.options))
+                        return await run_in_threadpool(decision.expert.chat, built[0], request.options)
+                logger.info(f"Calling model: {request.model}")
+                if shown is not None:
+                    return await run_in_threadpool(
+                        stream_answer, get_pool().chat_stream(request.model, built[0], request.options))
+                ollama_response = await run_in_threadpool(get_pool().chat, request.model, built[0], request.options)
+                return ollama_response['message']['content']
+
+            graph.add("generate", generate, "build_prompt")
+            processed_messages, prompt_report = await graph.result("build_prompt")
+            prompt_info = prompt_report.as_dict()
+            if retrieval is not None:
+                prompt_info["retrieval"] = retrieval.as_dict()
+            if symbol_report is not None and symbol_report["resolved"]:
+                prompt_info["symbols"] = symbol_report
+            response_text = await graph.result("generate")
         
         # Step 4: Translate response back if original was Persian
         if is_persian:
             logger.info("Translating response back to Persian")
-            response_text = translate_english_to_persian(response_text)
+            graph.add("translate_out", partial(translate_english_to_persian, response_text),
+                      after=("fullcomplete" if is_fullcomplete else "generate",))
+            response_text = await graph.result("translate_out")
+
+        if shown is not None:
+            response_text = "".join(shown)
+        else:
+            if request.render:
+                response_text = post_process(response_text, latest_message)
+            if sink is not None:
+                sink(response_text)
         
         # Calculate processing time
         end_time = datetime.now()
@@ -351,12 +584,18 @@ async def chat_endpoint(request: ChatRequest):
         
         return {
             "response": response_text,
-            "processing_time": processing_time
+            "processing_time": processing_time,
+            "routing": routing,
+            "prompt": prompt_info
         }
         
+    except (HTTPException, QueueFullError):
+        raise
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+    finally:
+        await graph.finish()
 
 # Document processing endpoint
 @router.post("/process")
@@ -0,0 +1,218 @@
+# backend/app/utils/scheduler.py
+"""
+Admission control for model calls.
+
+Every call to a model passes through a per-model slot: at most
+`concurrency` calls run at once and the rest wait in a bounded priority
+queue (interactive chat before fullcomplete before ingestion embeddings).
+When the queue is full a new call either evicts a lower-priority waiter or
+is rejected immediately with QueueFullError, which the API turns into
+429 + Retry-After. Waiting is thread-blocking, so call sites in async code
+run model calls through run_in_threadpool.
+
+Priority and queue-time accounting travel in context variables, so code
+deep in the call stack (the Ollama pool) does not need extra arguments.
+"""
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+from utils.config import (
+    SCHEDULER_DEFAULT_CONCURRENCY, SCHEDULER_CONCURRENCY,
+    SCHEDULER_MAX_QUEUE, SCHEDULER_MAX_WAIT
+)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_BULK = 2
+
+_priority: ContextVar[int] = ContextVar("model_priority", default=PRIORITY_INTERACTIVE)
+_queue_stats: ContextVar[Optional["QueueStats"]] = ContextVar("queue_stats", default=None)
+
+
+class QueueFullError(Exception):
+    def __init__(self, model: str, retry_after: float, reason: str = "queue full"):
+        super().__init__(f"Model '{model}' is overloaded ({reason}); retry after {retry_after:.0f}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+@dataclass
+class QueueStats:
+    """Queue time accumulated by every model call made in one request."""
+    seconds: float = 0.0
+    waits: List[Dict] = field(default_factory=list)
+
+
+@dataclass
+class Ticket:
+    model: str
+    priority: int
+    queue_time: float = 0.0
+    started: float = 0.0
+
+
+class _Waiter:
+    __slots__ = ("event", "granted", "rejected")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+        self.rejected = False
+
+
+class _ModelQueue:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiters: List = []  # heap of (priority, seq, waiter)
+        self.service_s = 1.0  # EWMA of call duration, for Retry-After
+        self.rejected = 0
+
+    def pending(self) -> int:
+        return sum(1 for _, _, w in self.waiters if not (w.granted or w.rejected))
+
+
+class ModelScheduler:
+    def __init__(
+        self,
+        concurrency: Dict[str, int] = SCHEDULER_CONCURRENCY,
+        default_concurrency: int = SCHEDULER_DEFAULT_CONCURRENCY,
+        max_queue: int = SCHEDULER_MAX_QUEUE,
+        max_wait: float = SCHEDULER_MAX_WAIT,
+    ):
+        self.concurrency = concurrency
+        self.default_concurrency = default_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._queues: Dict[str, _ModelQueue] = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+
+    def _queue(self, model: str) -> _ModelQueue:
+        q = self._queues.get(model)
+        if q is None:
+            limit = self.concurrency.get(model, self.concurrency.get(model.split(":")[0], self.default_concurrency))
+            q = self._queues[model] = _ModelQueue(limit)
+        return q
+
+    def _retry_after(self, q: _ModelQueue) -> float:
+        return max(1.0, math.ceil((q.pending() + 1) / q.limit * q.service_s))
+
+    def acquire(self, model: str, priority: Optional[int] = None, timeout: Optional[float] = None) -> Ticket:
+        priority = _priority.get() if priority is None else priority
+        ticket = Ticket(model, priority)
+        start = time.perf_counter()
+        with self._lock:
+            q = self._queue(model)
+            if q.active < q.limit and not q.pending():
+                q.active += 1
+                ticket.started = time.perf_counter()
+                return ticket
+            if q.pending() >= self.max_queue:
+                live = [(p, s, w) for p, s, w in q.waiters if not (w.granted or w.rejected)]
+                worst = max(live, key=lambda x: (x[0], x[1])) if live else None
+                if worst is None or worst[0] <= priority:
+                    q.rejected += 1
+                    raise QueueFullError(model, self._retry_after(q))
+                # a more urgent call displaces the newest lowest-priority waiter
+                worst[2].rejected = True
+                worst[2].event.set()
+            waiter = _Waiter()
+            heapq.heappush(q.waiters, (priority, next(self._seq), waiter))
+
+        waiter.event.wait(self.max_wait if timeout is None else timeout)
+        with self._lock:
+            if not waiter.granted:
+                waiter.rejected = True
+                q.rejected += 1
+                raise QueueFullError(model, self._retry_after(q),
+                                     "displaced by higher-priority work" if waiter.event.is_set() else "wait timed out")
+        ticket.queue_time = time.perf_counter() - start
+        ticket.started = time.perf_counter()
+        stats = _queue_stats.get()
+        if stats is not None:
+            stats.seconds += ticket.queue_time
+            stats.waits.append({"model": model, "priority": priority, "seconds": round(ticket.queue_time, 4)})
+        return ticket
+
+    def release(self, ticket: Ticket) -> None:
+        elapsed = time.perf_counter() - ticket.started
+        with self._lock:
+            q = self._queue(ticket.model)
+            q.service_s = 0.2 * elapsed + 0.8 * q.service_s
+            q.active -= 1
+            while q.waiters and q.active < q.limit:
+                _, _, waiter = heapq.heappop(q.waiters)
+                if waiter.granted or waiter.rejected:
+                    continue
+                waiter.granted = True
+                q.active += 1
+                waiter.event.set()
+
+    @contextmanager
+    def slot(self, model: str, priority: Optional[int] = None) -> Iterator[Ticket]:
+        ticket = self.acquire(model, priority)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def status(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                model: {"limit": q.limit, "active": q.active, "queued": q.pending(),
+                        "rejected": q.rejected, "service_s": round(q.service_s, 3)}
+                for model, q in self._queues.items()
+            }
+
+    def metrics(self):
+        with self._lock:
+            queues = list(self._queues.items())
+            return [
+                ("edris_model_active", "gauge", "Model calls holding a slot",
+                 [({"model": m}, q.active) for m, q in queues]),
+                ("edris_model_queued", "gauge", "Model calls waiting for a slot",
+                 [({"model": m}, q.pending()) for m, q in queues]),
+                ("edris_model_rejected_total", "counter", "Model calls rejected by admission control",
+                 [({"model": m}, q.rejected) for m, q in queues]),
+            ]
+
+
+@contextmanager
+def model_priority(level: int) -> Iterator[None]:
+    """Run model calls made inside this block at the given priority."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@contextmanager
+def measure_queue_time() -> Iterator[QueueStats]:
+    """Collect queue time of model calls made inside this block (including worker threads)."""
+    stats = QueueStats()
+    token = _queue_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _queue_stats.reset(token)
+
+
+_scheduler: Optional[ModelScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> ModelScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = ModelScheduler()
+    return _scheduler
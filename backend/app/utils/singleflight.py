@@ -0,0 +1,194 @@
+# backend/app/utils/singleflight.py
+"""
+Coalescing of identical in-flight calls.
+
+When the same question arrives from many users at once, each request would
+otherwise make its own embedding, translation and chat call with the same
+payload. `Singleflight.do(key, fn)` runs fn once per key at a time: the
+first caller (the leader) makes the call, callers arriving while it runs
+wait and get the same result, or the same exception. Nothing is cached;
+once the call returns, the next caller starts a new one.
+
+`Singleflight.stream(key, open_stream)` does the same for streamed
+generations. The upstream stream is read by a pump thread into a replay
+buffer, so a caller joining late gets the chunks produced so far and then
+the live ones, and a slow or departed consumer does not hold up the
+others. The upstream is closed when the last consumer leaves.
+
+Results are shared between callers and must be treated as read-only.
+
+`call_key` builds the key OllamaPool uses: path, model and payload with
+every prompt text Unicode-normalised (NFC) and stripped, and without
+fields that do not change the output (keep_alive, stream). Retrieved
+context is part of the prompt, so calls made against different index
+generations never share a key.
+"""
+import contextvars
+import hashlib
+import json
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from utils.metrics import COALESCED_CALLS
+
+# payload fields that do not change what the model returns
+_IGNORED = ("keep_alive", "stream")
+
+
+def _norm(text: Any) -> Any:
+    return unicodedata.normalize("NFC", text).strip() if isinstance(text, str) else text
+
+
+def call_key(path: str, model: Optional[str], payload: Dict[str, Any]) -> str:
+    body = {k: v for k, v in payload.items() if k not in _IGNORED}
+    if "messages" in body:
+        body["messages"] = [{**m, "content": _norm(m.get("content"))} for m in body["messages"]]
+    for name in ("prompt", "input"):
+        if isinstance(body.get(name), list):
+            body[name] = [_norm(t) for t in body[name]]
+        elif name in body:
+            body[name] = _norm(body[name])
+    raw = json.dumps([path, model, body], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Call:
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    error: Optional[BaseException] = None
+
+
+@dataclass
+class _Stream:
+    cond: threading.Condition = field(default_factory=threading.Condition)
+    chunks: List[Any] = field(default_factory=list)
+    done: bool = False
+    error: Optional[BaseException] = None
+    consumers: int = 1
+
+
+class Singleflight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _Stream] = {}
+
+    def do(self, key: str, fn: Callable[[], Any], label: str = "") -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            COALESCED_CALLS.inc(path=label, role="joined")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        COALESCED_CALLS.inc(path=label, role="leader")
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stream(self, key: str, open_stream: Callable[[], Iterator[Any]], label: str = "") -> Iterator[Any]:
+        with self._lock:
+            flight = self._streams.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._streams[key] = _Stream()
+            else:
+                with flight.cond:
+                    flight.consumers += 1
+        COALESCED_CALLS.inc(path=label, role="leader" if leader else "joined")
+        if leader:
+            # the pump runs with the leader's context: its model priority and queue-time accounting
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(self._pump, key, flight, open_stream),
+                             name="ollama-stream", daemon=True).start()
+        return _Follower(self, key, flight)
+
+    def _pump(self, key: str, flight: _Stream, open_stream: Callable[[], Iterator[Any]]) -> None:
+        upstream = None
+        try:
+            upstream = open_stream()
+            for chunk in upstream:
+                with flight.cond:
+                    flight.chunks.append(chunk)
+                    flight.cond.notify_all()
+                    if not flight.consumers:
+                        break
+        except BaseException as e:
+            flight.error = e
+        finally:
+            if upstream is not None and hasattr(upstream, "close"):
+                upstream.close()
+            with self._lock:
+                if self._streams.get(key) is flight:
+                    del self._streams[key]
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+
+    def _leave(self, key: str, flight: _Stream) -> None:
+        with self._lock, flight.cond:
+            flight.consumers -= 1
+            # nobody left: the pump stops at its next chunk, so nobody may join a truncated stream
+            if not flight.consumers and self._streams.get(key) is flight:
+                del self._streams[key]
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._streams)
+
+
+class _Follower:
+    """
+    One consumer's view of a streamed flight. It leaves the flight once:
+    when exhausted, on close(), or when dropped without being read.
+    """
+
+    def __init__(self, owner: Singleflight, key: str, flight: _Stream):
+        self._owner = owner
+        self._key = key
+        self._flight = flight
+        self._i = 0
+        self._left = False
+
+    def __iter__(self) -> "_Follower":
+        return self
+
+    def __next__(self) -> Any:
+        if self._left:
+            raise StopIteration
+        flight = self._flight
+        try:
+            with flight.cond:
+                while self._i >= len(flight.chunks) and not flight.done:
+                    flight.cond.wait()
+                if self._i < len(flight.chunks):
+                    self._i += 1
+                    return flight.chunks[self._i - 1]
+        except BaseException:
+            self.close()
+            raise
+        self.close()
+        if flight.error is not None:
+            raise flight.error
+        raise StopIteration
+
+    def close(self) -> None:
+        if not self._left:
+            self._left = True
+            self._owner._leave(self._key, self._flight)
+
+    def __del__(self):
+        self.close()
@@ -0,0 +1,176 @@
+# backend/app/utils/stages.py
+"""
+Per-request stage graph: independent stages run concurrently.
+
+A request handler adds stages with the names of the stages they depend on
+(whose results the stage receives) and the stages they only run after; each
+stage is an asyncio task that waits for its dependencies and then
+runs, so stages whose inputs are ready overlap instead of queueing behind
+each other (retrieval next to translation, history summarisation next to
+retrieval, routing next to image preparation). Blocking callables run in
+the threadpool, coroutine functions on the event loop; every stage is
+timed with span(name), so /metrics and the request breakdown keep their
+stage names.
+
+Stages can be speculative: started before the handler knows it will need
+the result and dropped with discard() (or at finish() if nobody asked for
+it). A discarded stage's task is cancelled; work already handed to a
+threadpool worker finishes in the background and its result is ignored.
+
+finish() cancels whatever is still pending and records the report: per
+stage start/end relative to the request, status and dependencies, plus the
+critical path -- the chain of stages, walking back from the last one used,
+through the dependency that finished last -- which is what bounds the
+request's latency. The report is attached to the active trace, so
+`timings: true` responses include it.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from utils.metrics import CRITICAL_PATH_SECONDS, SPECULATIVE_STAGES, current_trace, span
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Stage:
+    name: str
+    deps: Tuple[str, ...]
+    speculative: bool = False
+    task: Optional[asyncio.Task] = None
+    start: Optional[float] = None
+    end: Optional[float] = None
+    used: bool = False
+    discarded: bool = False
+    error: Optional[str] = None
+
+    @property
+    def status(self) -> str:
+        if self.discarded or (self.speculative and not self.used):
+            return "discarded"
+        if self.error is not None:
+            return "failed"
+        if self.end is None:
+            return "cancelled"
+        return "done" if self.used else "unused"
+
+
+@dataclass
+class StageGraph:
+    endpoint: str
+    started: float = field(default_factory=time.perf_counter)
+    stages: Dict[str, Stage] = field(default_factory=dict)
+
+    def add(self, name: str, fn: Callable, *deps: str, after: Tuple[str, ...] = (),
+            speculative: bool = False) -> Stage:
+        """
+        Start stage `name` once `deps` and `after` are done; fn receives the
+        results of `deps` in order (`after` only orders the stage).
+        """
+        if name in self.stages:
+            raise ValueError(f"Stage {name} already added")
+        missing = [d for d in deps + tuple(after) if d not in self.stages]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages {missing}")
+        stage = Stage(name, tuple(deps) + tuple(after), speculative)
+        self.stages[name] = stage
+        stage.task = asyncio.ensure_future(self._run(stage, fn, len(deps)))
+        return stage
+
+    async def _run(self, stage: Stage, fn: Callable, n_args: int) -> Any:
+        try:
+            results = [await self.result(d) for d in stage.deps]
+            args = results[:n_args]
+            stage.start = time.perf_counter()
+            with span(stage.name):
+                if asyncio.iscoroutinefunction(fn):
+                    value = await fn(*args)
+                else:
+                    value = await run_in_threadpool(fn, *args)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            stage.error = f"{type(e).__name__}: {e}"
+            raise
+        stage.end = time.perf_counter()
+        return value
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.stages
+
+    async def result(self, name: str) -> Any:
+        """Wait for a stage and mark it used (a speculative stage is then kept)."""
+        stage = self.stages[name]
+        stage.used = True
+        # shield: one waiter giving up must not cancel the stage for the others
+        return await asyncio.shield(stage.task)
+
+    def discard(self, name: str) -> None:
+        """Drop a stage whose result will not be used."""
+        stage = self.stages.get(name)
+        if stage is None or stage.used:
+            return
+        stage.discarded = True
+        if not stage.task.done():
+            stage.task.cancel()
+
+    async def finish(self) -> Dict:
+        """Cancel leftover stages, record metrics and return the report."""
+        pending = [s.task for s in self.stages.values() if not s.task.done()]
+        for stage in self.stages.values():
+            if not stage.used:
+                stage.discarded = stage.discarded or stage.speculative
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        for stage in self.stages.values():
+            if stage.task.done() and not stage.task.cancelled() and stage.task.exception() is not None \
+                    and not stage.used:
+                logger.warning(f"Unused stage {stage.name} failed: {stage.error}")
+            if stage.speculative:
+                SPECULATIVE_STAGES.inc(stage=stage.name, outcome="used" if stage.used else "discarded")
+
+        report = self.report()
+        CRITICAL_PATH_SECONDS.observe(report["critical_ms"] / 1000, endpoint=self.endpoint)
+        current = current_trace()
+        if current is not None:
+            current.graph = report
+        return report
+
+    def critical_path(self) -> List[str]:
+        done = {n: s for n, s in self.stages.items() if s.used and s.end is not None}
+        if not done:
+            return []
+        name = max(done, key=lambda n: done[n].end)
+        path = [name]
+        while True:
+            deps = [d for d in done[name].deps if d in done]
+            if not deps:
+                break
+            name = max(deps, key=lambda d: done[d].end)
+            path.append(name)
+        return path[::-1]
+
+    def report(self) -> Dict:
+        def ms(t: Optional[float]) -> Optional[float]:
+            return None if t is None else round((t - self.started) * 1000, 1)
+
+        stages = {}
+        for name, s in self.stages.items():
+            stages[name] = {"start_ms": ms(s.start), "end_ms": ms(s.end), "status": s.status,
+                            "deps": list(s.deps)}
+            if s.error is not None:
+                stages[name]["error"] = s.error
+        path = self.critical_path()
+        busy = [s.end - s.start for s in self.stages.values() if s.used and s.end is not None]
+        return {
+            "stages": stages,
+            "critical_path": path,
+            "critical_ms": ms(self.stages[path[-1]].end) if path else 0.0,
+            # what the used stages would have taken one after another
+            "serial_ms": round(sum(busy) * 1000, 1),
+        }
@@ -0,0 +1,115 @@
+# backend/benchmarks/algorithms.py
+"""
+Algorithm-name extraction: the three regex passes vs the one-pass gazetteer.
+
+Generates course-note prose with corpus.TextSource (sentences naming the
+corpus algorithms) mixed with the phrasing that used to produce noise
+("the algorithm terminates", "this method is stable", "methods"), then
+extracts names per section two ways:
+
+  regex      the former extract_algorithms: three case-insensitive findall passes
+  gazetteer  knowledge/gazetteer.py: Aho-Corasick over tokens plus context rules
+
+and reports throughput, recall of the corpus algorithms and the share of
+extracted names that are not algorithms.
+
+    python backend/benchmarks/algorithms.py --sections 2000 --json algorithms.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Set
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+REPO_CONFIG = Path(__file__).resolve().parents[2] / "config.yaml"
+os.environ.setdefault("EDRIS_CONFIG", str(REPO_CONFIG))
+sys.path.insert(0, str(APP_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from corpus import ALGORITHMS, TextSource  # noqa: E402
+
+NOISE = [
+    "The algorithm terminates once the queue is empty.",
+    "This method is stable and easy to implement.",
+    "Methods based on sampling trade accuracy for speed.",
+    "Our procedure runs in linear time on sparse graphs.",
+    "A greedy algorithm does not always find the optimum.",
+    "The proposed method improves the bound by a log factor.",
+]
+
+
+def regex_extract(text: str) -> List[str]:
+    """extract_algorithms before the gazetteer."""
+    patterns = [
+        r"Algorithm[:\s]+([\w\-]+)",
+        r"([\w\-]+)\s+algorithm",
+        r"(?:procedure|method)[:\s]*([\w\-]+)"
+    ]
+    algos = set()
+    for p in patterns:
+        for m in re.findall(p, text, flags=re.IGNORECASE):
+            algos.add(m.strip())
+    return list(algos)
+
+
+def make_sections(count: int, words: int, noise: float, seed: int) -> List[str]:
+    src = TextSource(seed)
+    rng = random.Random(seed)
+    sections = []
+    for _ in range(count):
+        sentences = src.paragraph(words).split(". ")
+        for i in range(len(sentences)):
+            if rng.random() < noise:
+                sentences.insert(i, rng.choice(NOISE).rstrip("."))
+        sections.append(". ".join(sentences))
+    return sections
+
+
+def run(extract: Callable[[str], List[str]], sections: List[str], truth: Set[str]) -> Dict:
+    start = time.perf_counter()
+    found = [extract(s) for s in sections]
+    seconds = time.perf_counter() - start
+    names = [n for f in found for n in f]
+    expected = sum(len({a for a in truth if a.lower() in s.lower()}) for s in sections)
+    hits = sum(len({n.lower() for n in f} & {a.lower() for a in truth}) for f in found)
+    noise = sum(n.lower() not in {a.lower() for a in truth} for n in names)
+    mb = sum(len(s) for s in sections) / 1e6
+    return {"seconds": round(seconds, 3), "mb_per_s": round(mb / seconds, 2),
+            "recall": round(hits / max(expected, 1), 4), "names": len(names),
+            "noise": round(noise / max(len(names), 1), 4),
+            "noise_examples": sorted({n for n in names if n.lower() not in {a.lower() for a in truth}})[:8]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare regex and gazetteer algorithm extraction")
+    parser.add_argument("--sections", type=int, default=1000)
+    parser.add_argument("--words", type=int, default=300)
+    parser.add_argument("--noise", type=float, default=0.1, help="share of generic 'the algorithm' sentences")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    from knowledge.gazetteer import AlgorithmExtractor
+
+    sections = make_sections(args.sections, args.words, args.noise, args.seed)
+    truth = set(ALGORITHMS)
+    rows = {"regex": run(regex_extract, sections, truth),
+            "gazetteer": run(AlgorithmExtractor().extract, sections, truth)}
+
+    mb = sum(len(s) for s in sections) / 1e6
+    print(f"{len(sections)} sections, {mb:.1f} MB")
+    print(f"{'mode':<11}{'MB/s':>7}{'recall':>8}{'noise':>8}  examples of noise")
+    for mode, r in rows.items():
+        print(f"{mode:<11}{r['mb_per_s']:>7}{r['recall']:>8.1%}{r['noise']:>8.1%}  {', '.join(r['noise_examples'])}")
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps({"settings": vars(args) | {"json_path": None},
+                                                    **rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
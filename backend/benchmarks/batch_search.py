@@ -0,0 +1,98 @@
+# backend/benchmarks/batch_search.py
+"""
+Single-query vs batch search throughput.
+
+Builds a throwaway space index of --docs synthetic passages (embedded by a
+fake Ollama), then answers --queries queries twice: once by looping
+search_space (one embedding call and one FAISS search per query) and once
+with search_space_batch (one /api/embed call per embedding batch, one
+matrix FAISS search per request batch).
+
+    python backend/benchmarks/batch_search.py --docs 20000 --queries 2000 --ollama-latency 0.01
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+REPO_CONFIG = Path(__file__).resolve().parents[2] / "config.yaml"
+os.environ.setdefault("EDRIS_CONFIG", str(REPO_CONFIG))
+sys.path.insert(0, str(APP_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from corpus import TextSource  # noqa: E402
+from fake_ollama import FakeOllama, serve  # noqa: E402
+from serving import free_port  # noqa: E402
+
+
+def build_index(index_dir: Path, fake: FakeOllama, docs: int, dim: int, seed: int) -> None:
+    from langchain_community.vectorstores import FAISS
+    from experts.embedder import get_embedding
+
+    src = TextSource(seed)
+    texts = [src.paragraph(60) for _ in range(docs)]
+    pairs = [(t, fake.embedding(t, dim)) for t in texts]
+    FAISS.from_embeddings(pairs, get_embedding, metadatas=[{"source": f"doc{i}"} for i in range(docs)]) \
+        .save_local(str(index_dir))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare looped single-query search with batch search")
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=200, help="queries per batch request")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--embedding-dim", type=int, default=1024)
+    parser.add_argument("--ollama-latency", type=float, default=0.005, help="fake Ollama seconds per call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    import knowledge.manager as manager
+    import utils.ollama_pool as ollama_pool
+
+    fake = FakeOllama(latency=args.ollama_latency)
+    port = free_port()
+    server = serve(port, fake, args.embedding_dim)
+    ollama_pool._pool = ollama_pool.OllamaPool([{"url": f"http://127.0.0.1:{port}"}])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager.SPACES_DIR = Path(tmp)
+        build_index(Path(tmp) / "bench" / "vectorstore", fake, args.docs, args.embedding_dim, args.seed)
+        rng = random.Random(args.seed + 1)
+        words = TextSource(args.seed + 2)
+        queries = [" ".join(words.paragraph(6).split()[:rng.randint(2, 6)]) for _ in range(args.queries)]
+
+        manager.search_space("bench", queries[0], args.k)  # load and cache the index
+        start = time.perf_counter()
+        single = [manager.search_space("bench", q, args.k) for q in queries]
+        single_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batched = []
+        for i in range(0, len(queries), args.batch):
+            batched.extend(manager.search_space_batch("bench", queries[i:i + args.batch], args.k))
+        batch_s = time.perf_counter() - start
+    server.shutdown()
+
+    agree = sum(s == [h["content"] for h in b] for s, b in zip(single, batched)) / len(queries)
+    report = {
+        "settings": vars(args) | {"json_path": None},
+        "single": {"seconds": round(single_s, 3), "qps": round(len(queries) / single_s, 1)},
+        "batch": {"seconds": round(batch_s, 3), "qps": round(len(queries) / batch_s, 1)},
+        "speedup": round(single_s / batch_s, 1),
+        "same_results": round(agree, 4),
+    }
+    print(f"single: {report['single']['qps']} q/s, batch: {report['batch']['qps']} q/s "
+          f"({report['speedup']}x), identical results for {agree:.1%} of queries")
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
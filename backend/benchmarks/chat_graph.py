@@ -0,0 +1,122 @@
+# backend/benchmarks/chat_graph.py
+"""
+Chat latency with the stage graph: wall time vs the serial sum of stages.
+
+Builds a small index from the serving benchmark corpus, then sends /chat
+requests in-process (FastAPI TestClient, fake Ollama with --latency seconds
+per model call) with `timings: true`, in four shapes:
+
+  en          English question, no history
+  en+history  English question after --history turns (summary not cached)
+  fa          Persian question (translated in and out)
+  fa+history  Persian question after --history turns
+
+For each it reports the median wall time, the median serial sum of the
+stages that were used (what the old strictly serial handler paid), the
+most common critical path and how often speculative stages were dropped.
+
+    python backend/benchmarks/chat_graph.py --latency 0.2 --requests 10
+    python backend/benchmarks/chat_graph.py --multilingual --json chat_graph.json
+"""
+import argparse
+import collections
+import json
+import os
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import yaml
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_ollama import FakeOllama, serve  # noqa: E402
+from serving import CORPUS, free_port, write_config  # noqa: E402
+
+QUESTIONS = {
+    "en": "How does Dijkstra's algorithm handle weighted edges?",
+    "fa": "الگوریتم دایکسترا چگونه با یال‌های وزن‌دار کار می‌کند؟",
+}
+
+
+def history(turns: int, seed: int) -> List[Dict]:
+    out = []
+    for i in range(turns):
+        out.append({"role": "user", "content": f"Question {seed}-{i} about sorting and hashing trade-offs?"})
+        out.append({"role": "assistant", "content": f"Answer {seed}-{i}: mergesort is stable, hashing is fast."})
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure /chat wall time against the serial sum of its stages")
+    parser.add_argument("--latency", type=float, default=0.15, help="seconds per fake model call")
+    parser.add_argument("--requests", type=int, default=8, help="requests per shape")
+    parser.add_argument("--history", type=int, default=6, help="earlier exchanges in the +history shapes")
+    parser.add_argument("--multilingual", action="store_true", help="retrieve on the Persian text during translation")
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    root = Path(tmp.name)
+    port = free_port()
+    server = serve(port, FakeOllama(latency=args.latency))
+    config_path = root / "config.yaml"
+    write_config(config_path, f"http://127.0.0.1:{port}")
+    config = yaml.safe_load(config_path.read_text(encoding="utf-8"))
+    config["vectorstore"].update(docs_path=str(root / "docs"), store_path=str(root / "store"),
+                                 algos_path=str(root / "store" / "algos"))
+    config.setdefault("chat", {})["multilingual_retrieval"] = args.multilingual
+    config["context"]["recent_turns"] = 2
+    config_path.write_text(yaml.safe_dump(config, allow_unicode=True), encoding="utf-8")
+    os.environ["EDRIS_CONFIG"] = str(config_path)
+    sys.path.insert(0, str(APP_DIR))
+
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from knowledge.loader import build_vectorstore
+    from utils.router import router
+
+    (root / "docs").mkdir()
+    for name, text in CORPUS.items():
+        (root / "docs" / name).write_text(text, encoding="utf-8")
+    build_vectorstore(str(root / "docs"), root / "store")
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+
+    rows = {}
+    for shape in ("en", "en+history", "fa", "fa+history"):
+        lang, _, with_history = shape.partition("+")
+        wall, serial, paths, dropped = [], [], collections.Counter(), collections.Counter()
+        for i in range(args.requests):
+            messages = history(args.history, hash((shape, i))) if with_history else []
+            messages.append({"role": "user", "content": f"{QUESTIONS[lang]} ({shape} {i})"})
+            response = client.post("/chat", json={"messages": messages, "timings": True})
+            response.raise_for_status()
+            graph = response.json()["timings"]["graph"]
+            wall.append(response.json()["timings"]["total"] * 1000)
+            serial.append(graph["serial_ms"])
+            paths[" > ".join(graph["critical_path"])] += 1
+            dropped.update(n for n, s in graph["stages"].items() if s["status"] == "discarded")
+        rows[shape] = {"wall_ms": round(statistics.median(wall), 1), "serial_ms": round(statistics.median(serial), 1),
+                       "critical_path": paths.most_common(1)[0][0], "discarded": dict(dropped)}
+    server.shutdown()
+
+    print(f"{args.latency * 1000:.0f} ms per model call, {args.requests} requests per shape")
+    print(f"{'shape':<12}{'wall ms':>9}{'serial ms':>11}{'saved':>7}  critical path")
+    for shape, r in rows.items():
+        saved = 1 - r["wall_ms"] / r["serial_ms"] if r["serial_ms"] else 0.0
+        print(f"{shape:<12}{r['wall_ms']:>9}{r['serial_ms']:>11}{saved:>7.0%}  {r['critical_path']}")
+        if r["discarded"]:
+            print(f"{'':<12}discarded: {r['discarded']}")
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps({"settings": vars(args) | {"json_path": None},
+                                                    "results": rows}, indent=2, ensure_ascii=False))
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
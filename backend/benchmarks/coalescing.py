@@ -0,0 +1,130 @@
+# backend/benchmarks/coalescing.py
+"""
+A burst of identical questions with and without call coalescing.
+
+Boots the app under uvicorn against a fake Ollama, then sends --burst
+identical /chat requests at once (English, Persian, and English streamed
+with joiners arriving --stagger seconds apart), with `ollama.coalesce`
+off and on. Reports the calls that reached the fake Ollama, the median
+and slowest latency per burst, and whether every caller got the same
+answer.
+
+    python backend/benchmarks/coalescing.py --burst 32 --latency 0.1
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import requests
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_ollama import FakeOllama, serve  # noqa: E402
+from serving import free_port, start_app, wait_until, write_config  # noqa: E402
+
+QUESTIONS = {
+    "en": "What is the time complexity of Dijkstra's algorithm?",
+    "fa": "پیچیدگی زمانی الگوریتم دایکسترا چیست؟",
+}
+
+
+def ask(base: str, question: str, stream: bool) -> str:
+    body = {"messages": [{"role": "user", "content": question}], "stream": stream}
+    if not stream:
+        response = requests.post(f"{base}/chat", json=body, timeout=600)
+        response.raise_for_status()
+        return response.json()["response"]
+    with requests.post(f"{base}/chat", json=body, stream=True, timeout=600) as response:
+        response.raise_for_status()
+        events = [json.loads(line) for line in response.iter_lines() if line]
+    return "".join(e.get("delta", "") for e in events)
+
+
+def burst(base: str, question: str, count: int, stream: bool, stagger: float) -> Dict:
+    answers: List[str] = [""] * count
+    latency: List[float] = [0.0] * count
+
+    def one(i: int):
+        time.sleep(i * stagger)
+        start = time.perf_counter()
+        answers[i] = ask(base, question, stream)
+        latency[i] = time.perf_counter() - start
+
+    threads = [threading.Thread(target=one, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {"p50_ms": round(statistics.median(latency) * 1000, 1), "max_ms": round(max(latency) * 1000, 1),
+            "same_answer": len(set(answers)) == 1}
+
+
+def run_mode(coalesce: bool, args, fake: FakeOllama, ollama_url: str, tmp: Path) -> Dict:
+    config_path = tmp / f"coalesce-{coalesce}.yaml"
+    write_config(config_path, ollama_url)
+    config = yaml.safe_load(config_path.read_text(encoding="utf-8"))
+    config["ollama"]["coalesce"] = coalesce
+    config_path.write_text(yaml.safe_dump(config, allow_unicode=True), encoding="utf-8")
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    log_path = tmp / f"coalesce-{coalesce}.log"
+    app = start_app(port, config_path, log_path)
+    rows = {}
+    try:
+        wait_until(lambda: requests.get(f"{base}/health").ok, 120, "app startup")
+        for shape, lang, stream, stagger in (("en", "en", False, 0.0), ("fa", "fa", False, 0.0),
+                                             ("en stream", "en", True, args.stagger)):
+            # a fresh question per mode, so nothing is answered from the reranker's caches
+            question = f"{QUESTIONS[lang]} ({'on' if coalesce else 'off'})"
+            before = fake.requests
+            rows[shape] = burst(base, question, args.burst, stream, stagger)
+            rows[shape]["upstream_calls"] = fake.requests - before
+    except Exception:
+        print(log_path.read_text()[-4000:], file=sys.stderr)
+        raise
+    finally:
+        app.terminate()
+        app.wait(timeout=30)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upstream calls and latency of identical concurrent requests")
+    parser.add_argument("--burst", type=int, default=32, help="identical requests sent at once")
+    parser.add_argument("--latency", type=float, default=0.1, help="fake Ollama seconds per call")
+    parser.add_argument("--token-rate", type=float, default=200.0)
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    parser.add_argument("--stagger", type=float, default=0.02, help="seconds between streamed joiners")
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    fake = FakeOllama(latency=args.latency, token_rate=args.token_rate, answer_tokens=args.answer_tokens)
+    port = free_port()
+    server = serve(port, fake)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for coalesce in (False, True):
+            results["on" if coalesce else "off"] = run_mode(coalesce, args, fake, f"http://127.0.0.1:{port}",
+                                                            Path(tmp))
+    server.shutdown()
+
+    print(f"bursts of {args.burst} identical requests, {args.latency * 1000:.0f} ms per model call")
+    print(f"{'shape':<11}{'coalesce':>9}{'upstream':>10}{'p50 ms':>9}{'max ms':>9}  same answer")
+    for shape in results["off"]:
+        for mode in ("off", "on"):
+            r = results[mode][shape]
+            print(f"{shape:<11}{mode:>9}{r['upstream_calls']:>10}{r['p50_ms']:>9}{r['max_ms']:>9}  {r['same_answer']}")
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps({"settings": vars(args) | {"json_path": None},
+                                                    "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# backend/benchmarks/code_symbols.py
+"""
+Code questions: context from symbol lookup vs vector retrieval vs whole files.
+
+Ingests a source tree (default: this backend) with the real pipeline, so
+Python files are cut at function/class boundaries and the symbol index is
+built, using the bag-of-words fake Ollama from rerank.py for embeddings.
+For a sample of functions and methods it asks "How does <name>() work?"
+and builds codegemma's context three ways:
+
+  file     the whole defining file, as callers pasted it before
+  vector   reranked FAISS retrieval over the code chunks (the chat path)
+  symbols  exact lookup in the symbol index (knowledge/symbols.py)
+
+and reports context tokens, how often the defining chunk is in the
+context, and lookup time.
+
+    python backend/benchmarks/code_symbols.py --questions 300 --json code_symbols.json
+    python backend/benchmarks/code_symbols.py --src /path/to/project
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+REPO_CONFIG = Path(__file__).resolve().parents[2] / "config.yaml"
+os.environ.setdefault("EDRIS_CONFIG", str(REPO_CONFIG))
+sys.path.insert(0, str(APP_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_ollama import serve  # noqa: E402
+from rerank import BagOfWordsOllama  # noqa: E402
+from serving import free_port  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare symbol lookup with vector retrieval for code questions")
+    parser.add_argument("--src", default=str(APP_DIR), help="source tree to ingest (*.py)")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--embedding-dim", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    from knowledge.loader import OllamaEmbeddings
+    from knowledge.pipeline import IngestionPipeline
+    from knowledge.rerank import Reranker
+    from knowledge.symbols import definition_context
+    from utils.context_builder import count_tokens
+    import utils.ollama_pool as ollama_pool
+
+    port = free_port()
+    server = serve(port, BagOfWordsOllama(), args.embedding_dim)
+    ollama_pool._pool = ollama_pool.OllamaPool([{"url": f"http://127.0.0.1:{port}"}])
+
+    files = sorted(p for p in Path(args.src).rglob("*.py") if "__pycache__" not in p.parts)
+    pipeline = IngestionPipeline(OllamaEmbeddings(), dedup="off", captions=False)
+    db, stats = pipeline.run(files)
+    symbols = pipeline.symbol_index
+    print(f"Indexed {stats.chunks} chunks, {len(symbols)} symbols from {stats.files} files")
+
+    candidates = [d for defs in symbols.definitions.values() for d in defs
+                  if d.kind in ("function", "method") and not d.symbol.rsplit(".", 1)[-1].startswith("__")]
+    rng = random.Random(args.seed)
+    sample = rng.sample(candidates, min(args.questions, len(candidates)))
+    file_tokens: Dict[str, int] = {}
+    reranker = Reranker()
+    rows: Dict[str, List[Dict]] = {"file": [], "vector": [], "symbols": []}
+    for d in sample:
+        question = f"How does {d.symbol}() work and what does it return?"
+        gold = db.docstore.search(db.index_to_docstore_id[d.rows[0]]).page_content
+        if d.source not in file_tokens:
+            file_tokens[d.source] = count_tokens(Path(d.source).read_text(encoding="utf-8", errors="ignore"))
+        rows["file"].append({"tokens": file_tokens[d.source], "hit": True, "ms": 0.0})
+
+        start = time.perf_counter()
+        kept, report = reranker.retrieve(db, question)
+        ms = (time.perf_counter() - start) * 1000
+        rows["vector"].append({"tokens": report.context_tokens, "hit": any(p.content == gold for p in kept), "ms": ms})
+
+        start = time.perf_counter()
+        blocks, report = definition_context(db, symbols, question)
+        ms = (time.perf_counter() - start) * 1000
+        rows["symbols"].append({"tokens": report["tokens"], "hit": any(gold in b for b in blocks), "ms": ms})
+    server.shutdown()
+
+    def summary(r: List[Dict]) -> Dict:
+        return {"definition_in_context": round(sum(x["hit"] for x in r) / len(r), 4),
+                "mean_context_tokens": round(statistics.mean(x["tokens"] for x in r), 1),
+                "p50_ms": round(statistics.median(x["ms"] for x in r), 3)}
+
+    result = {"settings": vars(args) | {"json_path": None, "chunks": stats.chunks, "symbols": len(symbols)},
+              **{mode: summary(r) for mode, r in rows.items()}}
+    print(f"{len(sample)} questions")
+    print(f"{'mode':<9}{'found':>8}{'tokens':>9}{'p50 ms':>9}")
+    for mode in rows:
+        s = result[mode]
+        print(f"{mode:<9}{s['definition_in_context']:>8.1%}{s['mean_context_tokens']:>9}{s['p50_ms']:>9}")
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
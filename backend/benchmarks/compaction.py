@@ -0,0 +1,99 @@
+# backend/benchmarks/compaction.py
+"""
+Index compaction: memory, search speed and recall per setting.
+
+Generates --docs synthetic embeddings with the structure real ones have
+(a low-rank signal plus noise, so most variance lives in a few hundred
+directions), then builds the exact float32 index and one compact index per
+projection / dimension / quantizer combination with knowledge/compaction.py,
+and reports serialised size, per-query search time and recall@k against
+the exact index for held-out query vectors.
+
+    python backend/benchmarks/compaction.py --docs 50000 --dim 4096 --json compaction.json
+    python backend/benchmarks/compaction.py --dims 512 256 128 --quantizers fp16 int8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+REPO_CONFIG = Path(__file__).resolve().parents[2] / "config.yaml"
+os.environ.setdefault("EDRIS_CONFIG", str(REPO_CONFIG))
+sys.path.insert(0, str(APP_DIR))
+
+
+def embeddings(n: int, dim: int, rank: int, noise: float, rng) -> np.ndarray:
+    basis = rng.standard_normal((rank, dim)).astype("float32")
+    weights = rng.standard_normal((n, rank)).astype("float32") * np.linspace(1.0, 0.05, rank, dtype="float32")
+    x = weights @ basis + noise * rng.standard_normal((n, dim)).astype("float32")
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def measure(index, queries, truth, k: int):
+    start = time.perf_counter()
+    _, ids = index.search(queries, k)
+    ms = (time.perf_counter() - start) / len(queries) * 1000
+    recall = sum(len(set(a) & set(b)) for a, b in zip(ids, truth)) / truth.size
+    return round(ms, 4), round(recall, 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare compact FAISS indexes with the exact one")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=1024, help="embedding width (4096 for the larger models)")
+    parser.add_argument("--rank", type=int, default=128, help="intrinsic dimension of the synthetic signal")
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--methods", nargs="+", default=["pca", "random"])
+    parser.add_argument("--dims", nargs="+", type=int, default=[512, 256, 128])
+    parser.add_argument("--quantizers", nargs="+", default=["none", "fp16", "int8"])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    import faiss
+    from knowledge.compaction import CompactionSpec, build_compact_index, index_bytes
+
+    rng = np.random.default_rng(args.seed)
+    data = embeddings(args.docs + args.queries, args.dim, args.rank, args.noise, rng)
+    vectors, queries = data[:args.docs], data[args.docs:]
+
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+    exact_ms, _ = measure(exact, queries, truth, args.k)
+    exact_bytes = index_bytes(exact)
+    rows = [{"method": "exact", "dim": args.dim, "quantizer": "none", "bytes": exact_bytes, "ratio": 1.0,
+             "ms_per_query": exact_ms, "recall_at_k": 1.0, "fit_s": 0.0}]
+
+    settings = [("none", args.dim, q) for q in args.quantizers if q != "none"]
+    settings += [(m, d, q) for m in args.methods for d in args.dims if d < args.dim for q in args.quantizers]
+    for method, dim, quantizer in settings:
+        spec = CompactionSpec(method=method, dim=dim, quantizer=quantizer)
+        start = time.perf_counter()
+        index = build_compact_index(vectors, spec)
+        fit_s = time.perf_counter() - start
+        ms, recall = measure(index, queries, truth, args.k)
+        size = index_bytes(index)
+        rows.append({"method": method, "dim": dim, "quantizer": quantizer, "bytes": size,
+                     "ratio": round(exact_bytes / size, 2), "ms_per_query": ms, "recall_at_k": recall,
+                     "fit_s": round(fit_s, 2)})
+
+    print(f"{args.docs} x {args.dim}d vectors, recall@{args.k} over {args.queries} queries")
+    print(f"{'method':<8}{'dim':>6}  {'quant':<6}{'MB':>9}{'smaller':>9}{'ms/q':>9}{'recall':>8}")
+    for r in rows:
+        print(f"{r['method']:<8}{r['dim']:>6}  {r['quantizer']:<6}{r['bytes'] / 1e6:>9.2f}{r['ratio']:>8}x"
+              f"{r['ms_per_query']:>9.3f}{r['recall_at_k']:>8.3f}")
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps({"settings": vars(args) | {"json_path": None},
+                                                    "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
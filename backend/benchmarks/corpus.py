@@ -0,0 +1,199 @@
+# backend/benchmarks/corpus.py
+"""
+Synthetic multi-format corpus for ingestion benchmarks.
+
+Writes TXT, MD, CSV, PDF (text layer), scanned PDF (image-only pages, so
+the loader has to OCR them), DOCX and PPTX files filled with deterministic
+pseudo-technical prose: the same seed always produces the same corpus.
+Sentences mention algorithm names the way real course notes do, so
+algorithm extraction has something to find. --revisions adds edited
+copies of a share of the files (same text with a few sentences rewritten),
+like users re-uploading a revised deck, for near-duplicate detection.
+
+    python backend/benchmarks/corpus.py /tmp/corpus --txt 50 --pdf 10 --scanned-pdf 2 --words 2000
+"""
+import argparse
+import csv
+import random
+from pathlib import Path
+from typing import Dict, List
+
+ALGORITHMS = [
+    "Dijkstra", "Bellman-Ford", "Kruskal", "Prim", "Quicksort", "Mergesort", "Heapsort",
+    "KMP", "Rabin-Karp", "Floyd-Warshall", "Tarjan", "Kosaraju", "A-star", "Ford-Fulkerson",
+]
+WORDS = (
+    "graph node edge weight path queue heap stack array tree root leaf hash table key value "
+    "index search sort merge split pivot partition recursion iteration invariant proof bound "
+    "complexity linear logarithmic quadratic memory cache latency throughput buffer stream "
+    "batch vector matrix distance cost minimum maximum optimal greedy dynamic state transition"
+).split()
+
+FORMATS = ["txt", "md", "csv", "pdf", "scanned_pdf", "docx", "pptx"]
+
+
+class TextSource:
+    def __init__(self, seed: int, edit_rate: float = 0.0, edit_seed: int = 0):
+        self.rng = random.Random(seed)
+        # revised copies: the same sentence stream with some sentences replaced
+        self.edit_rate = edit_rate
+        self.edits = random.Random(edit_seed)
+
+    def _sentence(self, rng: random.Random) -> str:
+        if rng.random() < 0.15:
+            return f"The {rng.choice(ALGORITHMS)} algorithm " + " ".join(
+                rng.choices(WORDS, k=rng.randint(6, 14))) + "."
+        words = rng.choices(WORDS, k=rng.randint(8, 20))
+        return " ".join(words).capitalize() + "."
+
+    def sentence(self) -> str:
+        s = self._sentence(self.rng)
+        if self.edit_rate and self.edits.random() < self.edit_rate:
+            return self._sentence(self.edits)
+        return s
+
+    def paragraph(self, words: int) -> str:
+        out: List[str] = []
+        n = 0
+        while n < words:
+            s = self.sentence()
+            out.append(s)
+            n += len(s.split())
+        return " ".join(out)
+
+    def sections(self, words: int, per_section: int = 300) -> List[Dict[str, str]]:
+        return [
+            {"title": f"{self.rng.choice(ALGORITHMS)} {self.rng.choice(WORDS)}",
+             "body": self.paragraph(min(per_section, words - i))}
+            for i in range(0, max(words, 1), per_section)
+        ]
+
+
+def write_txt(path: Path, src: TextSource, words: int) -> None:
+    paras = [src.paragraph(120) for _ in range(max(words // 120, 1))]
+    path.write_text("\n\n".join(paras), encoding="utf-8")
+
+
+def write_md(path: Path, src: TextSource, words: int) -> None:
+    parts = []
+    for s in src.sections(words):
+        parts.append(f"## {s['title']}\n\n{s['body']}")
+    path.write_text("# Notes\n\n" + "\n\n".join(parts), encoding="utf-8")
+
+
+def write_csv(path: Path, src: TextSource, words: int) -> None:
+    rows = max(words // 12, 1)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "algorithm", "time_ms", "memory_mb", "notes"])
+        for i in range(rows):
+            writer.writerow([i, src.rng.choice(ALGORITHMS), round(src.rng.uniform(0.1, 500), 3),
+                             src.rng.randint(1, 4096), src.paragraph(8)])
+
+
+def _pdf_pages(src: TextSource, words: int, per_page: int = 350) -> List[str]:
+    return [src.paragraph(min(per_page, words - i)) for i in range(0, max(words, 1), per_page)]
+
+
+def write_pdf(path: Path, src: TextSource, words: int) -> None:
+    import fitz
+
+    with fitz.open() as doc:
+        for text in _pdf_pages(src, words):
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 545, 792), text, fontsize=10)
+        doc.save(str(path))
+
+
+def write_scanned_pdf(path: Path, src: TextSource, words: int) -> None:
+    """Render each page to an image and keep only the image, like a scanner would."""
+    import fitz
+
+    with fitz.open() as out, fitz.open() as scratch:
+        for text in _pdf_pages(src, words):
+            page = scratch.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 545, 792), text, fontsize=10)
+            pix = page.get_pixmap(dpi=150, colorspace=fitz.csGRAY)
+            scanned = out.new_page(width=page.rect.width, height=page.rect.height)
+            scanned.insert_image(scanned.rect, stream=pix.tobytes("jpeg"))
+        out.save(str(path), deflate=True)
+
+
+def write_docx(path: Path, src: TextSource, words: int) -> None:
+    from docx import Document
+
+    doc = Document()
+    for s in src.sections(words):
+        doc.add_heading(s["title"], level=2)
+        doc.add_paragraph(s["body"])
+    table = doc.add_table(rows=1, cols=3)
+    table.rows[0].cells[0].text, table.rows[0].cells[1].text, table.rows[0].cells[2].text = "algorithm", "time", "space"
+    for name in src.rng.sample(ALGORITHMS, 5):
+        cells = table.add_row().cells
+        cells[0].text, cells[1].text, cells[2].text = name, "O(n log n)", "O(n)"
+    doc.save(str(path))
+
+
+def write_pptx(path: Path, src: TextSource, words: int) -> None:
+    from pptx import Presentation
+
+    prs = Presentation()
+    layout = prs.slide_layouts[1]
+    for s in src.sections(words, per_section=80):
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = s["title"]
+        slide.placeholders[1].text = s["body"]
+    prs.save(str(path))
+
+
+WRITERS = {
+    "txt": (write_txt, ".txt"), "md": (write_md, ".md"), "csv": (write_csv, ".csv"),
+    "pdf": (write_pdf, ".pdf"), "scanned_pdf": (write_scanned_pdf, ".pdf"),
+    "docx": (write_docx, ".docx"), "pptx": (write_pptx, ".pptx"),
+}
+
+
+def generate(out_dir: Path, counts: Dict[str, int], words: int = 1500, seed: int = 0,
+             revisions: float = 0.0, edit_rate: float = 0.05) -> List[Path]:
+    """Write counts[format] files of ~`words` words each, plus revised copies of
+    a `revisions` share of them; return their paths."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    picker = random.Random(seed)
+    paths = []
+    for fmt in FORMATS:
+        writer, ext = WRITERS[fmt]
+        for i in range(counts.get(fmt, 0)):
+            file_seed = seed * 100003 + FORMATS.index(fmt) * 7919 + i
+            path = out_dir / f"{fmt}_{i:04d}{ext}"
+            writer(path, TextSource(file_seed), words)
+            paths.append(path)
+            if revisions and picker.random() < revisions:
+                path = out_dir / f"{fmt}_{i:04d}_rev{ext}"
+                writer(path, TextSource(file_seed, edit_rate, file_seed + 1), words)
+                paths.append(path)
+    return paths
+
+
+def add_format_args(parser: argparse.ArgumentParser, defaults: Dict[str, int]) -> None:
+    for fmt in FORMATS:
+        parser.add_argument(f"--{fmt.replace('_', '-')}", dest=fmt, type=int, default=defaults.get(fmt, 0),
+                            help=f"number of {fmt.replace('_', ' ')} files")
+    parser.add_argument("--words", type=int, default=1500, help="approximate words per file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--revisions", type=float, default=0.0,
+                        help="share of files that also get a revised near-duplicate copy")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic ingestion corpus")
+    parser.add_argument("out_dir", type=Path)
+    add_format_args(parser, {"txt": 10, "md": 10, "csv": 5, "pdf": 5, "docx": 5, "pptx": 5})
+    args = parser.parse_args()
+    paths = generate(args.out_dir, {fmt: getattr(args, fmt) for fmt in FORMATS}, args.words, args.seed,
+                     args.revisions)
+    size = sum(p.stat().st_size for p in paths)
+    print(f"wrote {len(paths)} files ({size / 1e6:.1f} MB) to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
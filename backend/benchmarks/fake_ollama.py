@@ -0,0 +1,205 @@
+# backend/benchmarks/fake_ollama.py
+"""
+Stand-in Ollama server for local testing and benchmarks.
+
+Implements the endpoints the backend uses (/api/chat, /api/generate,
+/api/embeddings, /api/embed, /api/ps, /api/tags) with canned, deterministic
+output. A model is "loaded" on its first request (paying --load-time once)
+and shows up in /api/ps afterwards, so model affinity can be observed.
+Answers are --answer-tokens words produced at --token-rate tokens/s (or a
+fixed `script` split into words), and "stream": true requests get one
+NDJSON line per token.
+
+    # three backends on ports 11501-11503, one of them flaky
+    python backend/benchmarks/fake_ollama.py --port 11501 --count 3
+    python backend/benchmarks/fake_ollama.py --port 11504 --fail-rate 0.5
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+class FakeOllama:
+    def __init__(self, models: Optional[List[str]] = None, latency: float = 0.0,
+                 load_time: float = 0.0, fail_rate: float = 0.0,
+                 token_rate: float = 0.0, answer_tokens: int = 32, script: Optional[str] = None):
+        self.models = set(models or [])
+        self.latency = latency
+        self.load_time = load_time
+        self.fail_rate = fail_rate
+        # 0 means "infinitely fast"
+        self.token_rate = token_rate
+        self.answer_tokens = answer_tokens
+        self.script = script
+        self.loaded: Dict[str, float] = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def serves(self, model: str) -> bool:
+        return not self.models or model in self.models or model.split(":")[0] in self.models
+
+    def touch(self, model: str) -> float:
+        """Mark the model resident; return the simulated load duration."""
+        with self.lock:
+            self.requests += 1
+            cold = model not in self.loaded
+            self.loaded[model] = time.time()
+        if cold and self.load_time:
+            time.sleep(self.load_time)
+        return self.load_time if cold else 0.0
+
+    def answer(self, prompt: str, model: str) -> str:
+        return "".join(self.tokens(prompt, model))
+
+    def tokens(self, prompt: str, model: str) -> List[str]:
+        if self.script is not None:
+            return re.findall(r"\s*\S+|\s+$", self.script)
+        digest = hashlib.sha1(f"{model}:{prompt}".encode()).hexdigest()[:8]
+        head = f"[{model}] answer {digest} to: {prompt[:80]}".split(" ")
+        words = head + [f"w{i}" for i in range(max(self.answer_tokens - len(head), 0))]
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    def token_delay(self) -> float:
+        return 1.0 / self.token_rate if self.token_rate else 0.0
+
+    def embedding(self, text: str, dim: int = 1024) -> List[float]:
+        out: List[float] = []
+        counter = 0
+        while len(out) < dim:
+            block = hashlib.sha256(f"{counter}:{text}".encode()).digest()
+            out.extend(v / 2 ** 31 for v in struct.unpack("<8i", block))
+            counter += 1
+        return out[:dim]
+
+
+def make_handler(fake: FakeOllama, embedding_dim: int):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: Dict):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path in ("/api/ps", "/api/tags"):
+                models = [{"name": m, "model": m} for m in (
+                    fake.loaded if self.path == "/api/ps" else (fake.models or fake.loaded))]
+                return self._send(200, {"models": models})
+            self._send(404, {"error": "not found"})
+
+        def _stream(self, model: str, tokens: List[str], key: str, load: float):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def emit(obj: Dict):
+                line = json.dumps(obj).encode() + b"\n"
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+
+            delay = fake.token_delay()
+            for tok in tokens:
+                if delay:
+                    time.sleep(delay)
+                body = {"message": {"role": "assistant", "content": tok}} if key == "message" else {"response": tok}
+                emit({"model": model, "done": False, **body})
+            done = {"message": {"role": "assistant", "content": ""}} if key == "message" else {"response": ""}
+            emit({"model": model, "done": True, "load_duration": int(load * 1e9),
+                  "eval_count": len(tokens), **done})
+            self.wfile.write(b"0\r\n\r\n")
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            model = payload.get("model", "")
+            if fake.fail_rate and random.random() < fake.fail_rate:
+                return self._send(500, {"error": "injected failure"})
+            if model and not fake.serves(model):
+                return self._send(404, {"error": f"model '{model}' not found"})
+            load = fake.touch(model)
+            if fake.latency:
+                time.sleep(fake.latency)
+            now = datetime.now(timezone.utc).isoformat()
+            if self.path in ("/api/chat", "/api/generate"):
+                if self.path == "/api/chat":
+                    prompt, key = (payload.get("messages") or [{}])[-1].get("content", ""), "message"
+                else:
+                    prompt, key = payload.get("prompt", ""), "response"
+                # an empty generate only loads the model
+                tokens = fake.tokens(prompt, model) if (prompt or key == "message") else []
+                if payload.get("stream", True):
+                    return self._stream(model, tokens, key, load)
+                if tokens and fake.token_delay():
+                    time.sleep(fake.token_delay() * len(tokens))
+                text = "".join(tokens)
+                body = {"message": {"role": "assistant", "content": text}} if key == "message" else {"response": text}
+                return self._send(200, {
+                    "model": model, "created_at": now, "done": True, **body,
+                    "load_duration": int(load * 1e9), "eval_count": len(tokens),
+                })
+            if self.path == "/api/embed":
+                inputs = payload.get("input", "")
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                return self._send(200, {"model": model,
+                                        "embeddings": [fake.embedding(t, embedding_dim) for t in inputs],
+                                        "load_duration": int(load * 1e9)})
+            if self.path == "/api/embeddings":
+                return self._send(200, {"embedding": fake.embedding(payload.get("prompt", ""), embedding_dim),
+                                       "load_duration": int(load * 1e9)})
+            self._send(404, {"error": "not found"})
+
+    return Handler
+
+
+def serve(port: int, fake: FakeOllama, embedding_dim: int = 1024, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Start a server on a daemon thread and return it (call .shutdown() to stop)."""
+    server = ThreadingHTTPServer((host, port), make_handler(fake, embedding_dim))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=f"fake-ollama-{port}", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run stand-in Ollama servers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11501)
+    parser.add_argument("--count", type=int, default=1, help="servers on consecutive ports")
+    parser.add_argument("--models", nargs="*", default=[], help="models served (default: any)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    parser.add_argument("--load-time", type=float, default=0.0, help="seconds for a model's first call")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of calls answered with 500")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="generated tokens per second (0: instant)")
+    parser.add_argument("--answer-tokens", type=int, default=32, help="tokens per answer")
+    parser.add_argument("--embedding-dim", type=int, default=1024)
+    args = parser.parse_args()
+
+    for i in range(args.count):
+        fake = FakeOllama(args.models, args.latency, args.load_time, args.fail_rate,
+                          args.token_rate, args.answer_tokens)
+        serve(args.port + i, fake, args.embedding_dim, args.host)
+        print(f"fake ollama listening on http://{args.host}:{args.port + i}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# backend/benchmarks/images.py
+"""
+Image captioning cost: naive vs the knowledge/images.py pipeline.
+
+Generates synthetic slide decks: every page carries the deck logo and a
+figure, and a share of figures (--reuse) reappear in other decks,
+re-encoded at a different JPEG quality. Each picture is then "captioned"
+by a stub vision expert whose latency is a fixed cost plus a cost per
+payload byte (--latency, --mb-per-s), three ways:
+
+  naive    every picture, at its original size, one request at a time
+  cold     prepare (downsample) + perceptual-hash dedup + batched captioning
+  rebuild  the same corpus again, captions served from the on-disk cache
+
+and reports vision calls, payload megabytes and seconds for each.
+
+    python backend/benchmarks/images.py --decks 20 --pages 15 --json images.json
+    python backend/benchmarks/images.py --latency 0.5 --workers 4
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+REPO_CONFIG = Path(__file__).resolve().parents[2] / "config.yaml"
+os.environ.setdefault("EDRIS_CONFIG", str(REPO_CONFIG))
+sys.path.insert(0, str(APP_DIR))
+
+
+class StubVision:
+    """Stands in for LlavaExpert: sleeps latency + payload transfer time, counts calls and bytes."""
+    model = "stub-vision"
+
+    def __init__(self, latency: float, mb_per_s: float):
+        self.latency = latency
+        self.bytes_per_s = mb_per_s * 1e6
+        self.calls = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def caption(self, payload: str, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+            self.bytes += len(payload)
+        time.sleep(self.latency + len(payload) / self.bytes_per_s)
+        return f"a picture ({len(payload)} bytes)"
+
+
+def picture(seed: int, width: int, height: int):
+    from PIL import Image, ImageDraw
+
+    rng = np.random.default_rng(seed)
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    for _ in range(20):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        w, h = rng.integers(width // 20, width // 3, 2)
+        draw.rectangle([x, y, x + int(w), y + int(h)], fill=tuple(int(v) for v in rng.integers(0, 255, 3)))
+    # sensor-like noise, so encoded sizes resemble photos and screenshots rather than flat fills
+    noisy = np.asarray(img, dtype="float32") + rng.normal(0, 12, (height, width, 1)).astype("float32")
+    return Image.fromarray(np.clip(noisy, 0, 255).astype("uint8"))
+
+
+def encode(img, fmt: str = "PNG", quality: int = 90) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, quality=quality)
+    return buf.getvalue()
+
+
+def make_corpus(decks: int, pages: int, reuse: float, size: int, seed: int) -> List[bytes]:
+    rng = np.random.default_rng(seed)
+    images, figures = [], []
+    for d in range(decks):
+        logo = encode(picture(10_000 + d, size // 4, size // 4))
+        for p in range(pages):
+            images.append(logo)
+            if figures and rng.random() < reuse:
+                # the same figure pasted into another deck, re-encoded
+                fig_seed = figures[int(rng.integers(len(figures)))]
+                images.append(encode(picture(fig_seed, size, size * 3 // 4), "JPEG", int(rng.integers(50, 95))))
+            else:
+                fig_seed = d * 1000 + p
+                figures.append(fig_seed)
+                images.append(encode(picture(fig_seed, size, size * 3 // 4)))
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare naive image captioning with the image pipeline")
+    parser.add_argument("--decks", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=12)
+    parser.add_argument("--reuse", type=float, default=0.2, help="share of figures copied from other decks")
+    parser.add_argument("--size", type=int, default=1600, help="figure width in pixels")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per vision call")
+    parser.add_argument("--mb-per-s", type=float, default=20.0, help="payload transfer/decode rate")
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    import base64
+    from knowledge.images import CaptionCache, Captioner, ImageBatcher, ImagePreparer
+
+    images = make_corpus(args.decks, args.pages, args.reuse, args.size, args.seed)
+    rows = []
+
+    vision = StubVision(args.latency, args.mb_per_s)
+    start = time.perf_counter()
+    for data in images:
+        vision.caption(base64.b64encode(data).decode(), "")
+    rows.append({"mode": "naive", "images": len(images), "calls": vision.calls,
+                 "mb": round(vision.bytes / 1e6, 2), "seconds": round(time.perf_counter() - start, 2)})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = Path(tmp) / "captions.jsonl"
+        for mode in ("cold", "rebuild"):
+            vision = StubVision(args.latency, args.mb_per_s)
+            captioner = Captioner(vision, batch=args.batch, workers=args.workers, cache=CaptionCache(cache_path))
+            batcher = ImageBatcher(captioner, ImagePreparer())
+            start = time.perf_counter()
+            for b in range(0, len(images), args.batch * 4):
+                batcher.describe(batcher.unique(images[b:b + args.batch * 4]))
+            rows.append({"mode": mode, "images": len(images), "calls": vision.calls,
+                         "mb": round(vision.bytes / 1e6, 2), "seconds": round(time.perf_counter() - start, 2),
+                         **{k: v for k, v in batcher.report.as_dict().items() if k != "seen"}})
+
+    print(f"{len(images)} images in {args.decks} decks x {args.pages} pages")
+    print(f"{'mode':<9}{'calls':>7}{'MB sent':>9}{'seconds':>9}  dedup/cache")
+    for r in rows:
+        extra = f"{r['duplicates']} duplicates, {r['skipped']} skipped, {r['cached']} cached" if "cached" in r else ""
+        print(f"{r['mode']:<9}{r['calls']:>7}{r['mb']:>9}{r['seconds']:>9}  {extra}")
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps({"settings": vars(args) | {"json_path": None},
+                                                    "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# backend/benchmarks/ingestion.py
+"""
+Ingestion throughput benchmark.
+
+Generates a synthetic corpus (corpus.py), or takes an existing directory,
+and runs the real IngestionPipeline over it in-process with a stub
+embedder: vectors are derived from a hash of the chunk text, so results
+are deterministic and need neither Ollama nor a network. Reports busy
+seconds and throughput per stage (parse, OCR, chunk, embed, index write,
+save), peak RSS and the size of the saved index. With --revisions, part
+of the corpus is re-uploaded as edited copies; compare --dedup off with the
+default to see what near-duplicate detection saves.
+
+    python backend/benchmarks/ingestion.py --txt 200 --pdf 50 --docx 20 --json ingest.json
+    python backend/benchmarks/ingestion.py --corpus /data/uploads --embed-latency 0.05
+    python backend/benchmarks/ingestion.py --revisions 0.5 --dedup off
+
+Parse and chunk run on the producer thread concurrently with embed and
+index, so the stage seconds can add up to more than the wall time. OCR is
+part of parse and is also reported on its own (scanned PDFs need the
+tesseract binary).
+"""
+import argparse
+import hashlib
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+REPO_CONFIG = Path(__file__).resolve().parents[2] / "config.yaml"
+os.environ.setdefault("EDRIS_CONFIG", str(REPO_CONFIG))
+sys.path.insert(0, str(APP_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from corpus import FORMATS, add_format_args, generate  # noqa: E402
+
+
+class StubEmbeddings:
+    """Deterministic unit vectors from a hash of the text; optional per-batch latency."""
+
+    def __init__(self, dim: int = 1024, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+        self.calls = 0
+
+    def _vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        v = np.random.default_rng(seed).standard_normal(self.dim).astype("float32")
+        return (v / np.linalg.norm(v)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+    def __call__(self, text: str) -> List[float]:
+        return self.embed_query(text)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def run(files: List[Path], store: Path, dim: int, latency: float, batch_size: int, dedup: str) -> Dict:
+    from knowledge.pipeline import IngestionPipeline
+    from utils.metrics import STAGE_SECONDS
+
+    rss_before = peak_rss_mb()
+    ocr_before = STAGE_SECONDS.total(stage="ingest.ocr")
+    embeddings = StubEmbeddings(dim, latency)
+    start = time.perf_counter()
+    db, stats = IngestionPipeline(embeddings, batch_size=batch_size, dedup=dedup).run(files)
+    save_s = 0.0
+    if db is not None:
+        t = time.perf_counter()
+        db.save_local(str(store))
+        save_s = time.perf_counter() - t
+    wall = time.perf_counter() - start
+    ocr_s, ocr_pages = (a - b for a, b in zip(STAGE_SECONDS.total(stage="ingest.ocr"), ocr_before))
+
+    input_bytes = sum(f.stat().st_size for f in files)
+    stages = dict(stats.stages)
+    stages["ocr"] = ocr_s
+    stages["save"] = save_s
+    units = {"parse": ("segments", stats.segments), "ocr": ("pages", ocr_pages),
+             "chunk": ("chunks", stats.chunks), "embed": ("chunks", stats.chunks),
+             "index": ("chunks", stats.chunks), "save": ("chunks", stats.chunks),
+             "dedup": ("chunks", stats.dedup.chunks_seen if stats.dedup else 0)}
+    per_stage = {}
+    for name, seconds in stages.items():
+        unit, n = units.get(name, ("items", 0))
+        per_stage[name] = {"seconds": round(seconds, 4), unit: n,
+                           f"{unit}_per_s": round(n / seconds, 1) if seconds else None}
+    per_stage["parse"]["mb_per_s"] = round(input_bytes / 1e6 / stages["parse"], 2) if stages.get("parse") else None
+
+    return {
+        "files": stats.files, "failed": stats.failed, "segments": stats.segments,
+        "chunks": stats.chunks, "algorithms": len(stats.algorithms),
+        "input_mb": round(input_bytes / 1e6, 3), "wall_s": round(wall, 3),
+        "chunks_per_s": round(stats.chunks / wall, 1) if wall else None,
+        "stages": per_stage,
+        "peak_rss_mb": round(peak_rss_mb(), 1), "peak_rss_before_mb": round(rss_before, 1),
+        "index_mb": round(dir_size(store) / 1e6, 3) if db is not None else 0.0,
+        "embedding_dim": dim, "embed_batches": embeddings.calls,
+        "dedup": stats.dedup.as_dict() if stats.dedup else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark document ingestion with a stub embedder")
+    parser.add_argument("--corpus", type=Path, help="ingest this directory instead of a generated corpus")
+    add_format_args(parser, {"txt": 40, "md": 20, "csv": 10, "pdf": 10, "docx": 10, "pptx": 10})
+    parser.add_argument("--embedding-dim", type=int, default=1024)
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="seconds added per embedding batch")
+    parser.add_argument("--batch-size", type=int, default=None, help="chunks per embedding batch")
+    parser.add_argument("--dedup", choices=["link", "skip", "off"], default=None,
+                        help="near-duplicate handling (default: config)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated corpus and index")
+    parser.add_argument("--json", dest="json_path", help="write the report to this file")
+    args = parser.parse_args()
+
+    from knowledge.loader import supported_extensions
+    from utils.config import DEDUP_MODE, EMBED_BATCH_SIZE
+
+    counts = {fmt: getattr(args, fmt) for fmt in FORMATS}
+    if counts.get("scanned_pdf") and not shutil.which("tesseract"):
+        print("warning: tesseract not found; scanned PDFs will fail to ingest", file=sys.stderr)
+
+    workdir = Path(tempfile.mkdtemp(prefix="edris-ingest-"))
+    try:
+        if args.corpus:
+            files = [p for ext in supported_extensions() for p in args.corpus.rglob(f"*{ext}")]
+            gen_s = 0.0
+        else:
+            t = time.perf_counter()
+            files = generate(workdir / "corpus", counts, args.words, args.seed, args.revisions)
+            gen_s = time.perf_counter() - t
+        report = run(files, workdir / "store", args.embedding_dim, args.embed_latency,
+                     args.batch_size or EMBED_BATCH_SIZE, args.dedup or DEDUP_MODE)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    report["settings"] = {"corpus": str(args.corpus) if args.corpus else counts, "words": args.words,
+                          "seed": args.seed, "batch_size": args.batch_size or EMBED_BATCH_SIZE,
+                          "revisions": args.revisions, "dedup": args.dedup or DEDUP_MODE,
+                          "embed_latency": args.embed_latency, "generate_s": round(gen_s, 2)}
+
+    print(f"{report['files']} files ({report['input_mb']} MB) -> {report['chunks']} chunks "
+          f"in {report['wall_s']:.2f}s ({report['chunks_per_s']} chunks/s); "
+          f"{len(report['failed'])} failed")
+    for name, s in report["stages"].items():
+        rate = ", ".join(f"{v} {k}" for k, v in s.items() if k.endswith("_per_s") and v)
+        print(f"  {name:<6} {s['seconds']:8.3f}s  {rate}")
+    if report["dedup"]:
+        d = report["dedup"]
+        print(f"dedup: {d['skipped']}/{d['chunks_seen']} chunks not embedded ({d['skipped_share']:.1%}), "
+              f"{len(d['duplicate_documents'])} near-duplicate documents")
+    print(f"peak RSS {report['peak_rss_mb']} MB, index {report['index_mb']} MB")
+    if args.keep:
+        print(f"corpus and index kept in {workdir}")
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
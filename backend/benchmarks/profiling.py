@@ -0,0 +1,135 @@
+# backend/benchmarks/profiling.py
+"""
+Overhead of the slow-request profiler, and what a saved profile shows.
+
+Runs en/fa chat requests from the serving workload, then one upload (its
+index build runs in the same request), three times against a fresh app:
+
+  off      profiling disabled
+  record   enabled with a threshold nothing reaches: every request is sampled, none kept
+  save     enabled with threshold 0: every request is sampled and written out
+
+and reports chat latency per mode, the sampler's cost per tick and, for
+the last mode, the saved profiles (GET /profiles) and the app functions
+with the most inclusive time in the slowest chat and upload profiles.
+
+    python backend/benchmarks/profiling.py --requests 60 --concurrency 4 --interval-ms 5
+"""
+import argparse
+import collections
+import json
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+import requests
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_ollama import FakeOllama, serve  # noqa: E402
+from serving import drive, free_port, prepare_space, start_app, summarize, wait_until, write_config  # noqa: E402
+
+MIX = {"en": 2.0, "fa": 1.0}
+
+
+def top_frames(profile: Dict, limit: int) -> List[List]:
+    """Inclusive milliseconds per app function over all threads of a speedscope profile."""
+    frames = profile["shared"]["frames"]
+    totals: Dict[int, float] = collections.Counter()
+    for p in profile["profiles"]:
+        for stack, weight in zip(p["samples"], p["weights"]):
+            for i in set(stack):
+                totals[i] += weight
+    rows = [(frames[i], ms) for i, ms in totals.items() if "/backend/app/" in frames[i]["file"]]
+    rows.sort(key=lambda r: -r[1])
+    return [[f"{f['name']} ({f['file'].split('/backend/app/')[1]}:{f['line']})", round(ms, 1)]
+            for f, ms in rows[:limit]]
+
+
+def run_mode(mode: str, args, ollama_url: str, tmp: Path) -> Dict:
+    config_path = tmp / f"{mode}.yaml"
+    write_config(config_path, ollama_url)
+    config = yaml.safe_load(config_path.read_text(encoding="utf-8"))
+    config["profiling"] = {"enabled": mode != "off", "interval_ms": args.interval_ms,
+                           "threshold_seconds": 0.0 if mode == "save" else 1e9,
+                           "dir": str(tmp / "profiles"), "max_files": args.max_files}
+    config_path.write_text(yaml.safe_dump(config, allow_unicode=True), encoding="utf-8")
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    app = start_app(port, config_path, tmp / f"{mode}.log")
+    space = f"bench-{uuid.uuid4().hex[:8]}"
+    try:
+        wait_until(lambda: requests.get(f"{base}/health").ok, 120, "app startup")
+        drive(base, space, MIX, args.warmup, args.concurrency, args.seed + 1)
+        run = drive(base, space, MIX, args.requests, args.concurrency, args.seed)
+        # last, so the cap evicts chat profiles before it
+        prepare_space(base, space, 120)
+        out = {"latency_ms": summarize(run["results"], run["wall_s"])["overall"]["latency_ms"]}
+        index = requests.get(f"{base}/profiles").json()
+        out["sampling_ms_per_tick"] = index.get("sampling_ms_per_tick")
+        if mode == "save":
+            profiles = index["profiles"]
+            out["profiles"] = len(profiles)
+            out["bytes"] = sum(p["bytes"] for p in profiles)
+            out["by_endpoint"] = dict(collections.Counter(p["endpoint"] for p in profiles))
+            out["slowest"] = {}
+            for endpoint in ("chat", "knowledge-upload"):
+                mine = [p for p in profiles if p["endpoint"].startswith(f"post-{endpoint}")]
+                if mine:
+                    slowest = max(mine, key=lambda p: p["duration_ms"])
+                    body = requests.get(f"{base}/profiles/{slowest['name']}").json()
+                    out["slowest"][endpoint] = {"name": slowest["name"], "top": top_frames(body, args.top)}
+        return out
+    except Exception:
+        print((tmp / f"{mode}.log").read_text()[-4000:], file=sys.stderr)
+        raise
+    finally:
+        requests.delete(f"{base}/spaces/{space}", timeout=10)
+        app.terminate()
+        app.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the slow-request profiler")
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=6)
+    parser.add_argument("--interval-ms", type=float, default=10)
+    parser.add_argument("--max-files", type=int, default=20, help="profile directory cap (eviction)")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake Ollama seconds per call")
+    parser.add_argument("--token-rate", type=float, default=400.0)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    fake_port = free_port()
+    server = serve(fake_port, FakeOllama(latency=args.latency, token_rate=args.token_rate))
+    rows = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("off", "record", "save"):
+            rows[mode] = run_mode(mode, args, f"http://127.0.0.1:{fake_port}", Path(tmp))
+    server.shutdown()
+
+    print(f"{args.requests} chat requests, concurrency {args.concurrency}, sampling every {args.interval_ms} ms")
+    print(f"{'mode':<8}{'p50 ms':>9}{'p95 ms':>9}{'ms/tick':>9}")
+    for mode, r in rows.items():
+        lat = r["latency_ms"]
+        print(f"{mode:<8}{lat['p50']:>9}{lat['p95']:>9}{r['sampling_ms_per_tick'] or '-':>9}")
+    save = rows["save"]
+    print(f"\nsaved {save['profiles']} profiles ({save['bytes'] / 1024:.0f} KiB, capped at {args.max_files}): "
+          f"{save['by_endpoint']}")
+    for slowest in save["slowest"].values():
+        print(f"\n{slowest['name']}")
+        for name, ms in slowest["top"]:
+            print(f"  {ms:>9.1f} ms  {name}")
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps({"settings": vars(args) | {"json_path": None},
+                                                    "results": rows}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
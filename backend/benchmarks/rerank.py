@@ -0,0 +1,178 @@
+# backend/benchmarks/rerank.py
+"""
+Raw top-k retrieval vs two-stage retrieval (over-fetch + rerank + budget).
+
+Builds a throwaway index of synthetic course-note passages. Each question
+has exactly one gold passage containing its answer, hidden among passages
+about the same algorithm. Embeddings come from a fake Ollama that hashes
+words into a bag-of-words vector, so similarity is meaningful but coarse,
+like a real embedder on long chunks. For every question the benchmark
+builds the chat prompt twice, once from the raw FAISS top-k (what chat
+used to send) and once from knowledge/rerank.py, and reports prompt and
+context tokens, how often the gold passage made it into the prompt (the
+relevance proxy), and the reranking cost with a cold and a warm cache.
+
+    python backend/benchmarks/rerank.py --topics 300 --distractors 20 --json rerank.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+REPO_CONFIG = Path(__file__).resolve().parents[2] / "config.yaml"
+os.environ.setdefault("EDRIS_CONFIG", str(REPO_CONFIG))
+sys.path.insert(0, str(APP_DIR))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from corpus import ALGORITHMS, TextSource  # noqa: E402
+from fake_ollama import FakeOllama, serve  # noqa: E402
+from serving import free_port  # noqa: E402
+
+SYLLABLES = "ka lo mi nu re sa ti vo ze xu qa ru".split()
+
+
+class BagOfWordsOllama(FakeOllama):
+    """Embeddings are signed feature-hashed content words plus a little noise."""
+
+    def __init__(self, noise: float = 0.3, **kwargs):
+        super().__init__(**kwargs)
+        self.noise = noise
+
+    def embedding(self, text: str, dim: int = 1024) -> List[float]:
+        from knowledge.rerank import terms
+
+        v = np.zeros(dim, dtype="float32")
+        for word in terms(text):
+            h = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+            v[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+        v /= np.linalg.norm(v) or 1.0
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+        v += self.noise * np.random.default_rng(seed).standard_normal(dim).astype("float32") / np.sqrt(dim)
+        return (v / np.linalg.norm(v)).tolist()
+
+
+def make_corpus(topics: int, distractors: int, words: int, seed: int):
+    """Passages and (question, gold passage index) pairs."""
+    rng = random.Random(seed)
+    src = TextSource(seed)
+
+    def term():
+        return "".join(rng.choice(SYLLABLES) for _ in range(3))
+
+    passages: List[str] = []
+    questions = []
+    for _ in range(topics):
+        alg = rng.choice(ALGORITHMS)
+        prop, value = term(), term()
+        gold = (f"{src.paragraph(words // 2)} For {alg} the {prop} setting is {value}; "
+                f"the {prop} value matters. {src.paragraph(words // 2)}")
+        questions.append((f"What {prop} setting does the {alg} algorithm use?", len(passages)))
+        passages.append(gold)
+        # hard negatives: same algorithm, other settings
+        for _ in range(distractors):
+            passages.append(f"{src.paragraph(words // 2)} For {alg} the {term()} setting is {term()}; "
+                            f"the {alg} algorithm {src.paragraph(words // 2)}")
+    return passages, questions
+
+
+def prompt_tokens(question: str, passages: List[str], model: str) -> Dict:
+    from utils.context_builder import ContextBuilder, SummaryCache, count_tokens
+
+    builder = ContextBuilder(SummaryCache(summarizer=lambda *a: ""))
+    context = "\n\n".join(passages)
+    _, report = builder.build([{"role": "user", "content": question}], context or None, model,
+                              "The following information may be helpful for answering the user's question:\n\n")
+    return {"prompt": report.prompt_tokens, "context": report.context_tokens, "raw_context": count_tokens(context)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare raw top-k context with reranked, budgeted context")
+    parser.add_argument("--topics", type=int, default=200, help="questions, one gold passage each")
+    parser.add_argument("--distractors", type=int, default=15, help="same-algorithm passages per question")
+    parser.add_argument("--words", type=int, default=160, help="words per passage")
+    parser.add_argument("--k", type=int, default=3, help="raw top-k sent by the old chat path")
+    parser.add_argument("--fetch-k", type=int, default=None, help="candidates to rerank (default: config)")
+    parser.add_argument("--model", default="deepseek-r1:latest", help="model whose prompt budget applies")
+    parser.add_argument("--embedding-dim", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    from langchain_community.vectorstores import FAISS
+    from experts.embedder import get_embedding
+    from knowledge.rerank import Reranker
+    import utils.ollama_pool as ollama_pool
+
+    fake = BagOfWordsOllama()
+    port = free_port()
+    server = serve(port, fake, args.embedding_dim)
+    ollama_pool._pool = ollama_pool.OllamaPool([{"url": f"http://127.0.0.1:{port}"}])
+
+    passages, questions = make_corpus(args.topics, args.distractors, args.words, args.seed)
+    pairs = [(p, fake.embedding(p, args.embedding_dim)) for p in passages]
+    with tempfile.TemporaryDirectory() as tmp:
+        FAISS.from_embeddings(pairs, get_embedding, metadatas=[{"row": i} for i in range(len(passages))]) \
+            .save_local(tmp)
+        db = FAISS.load_local(tmp, get_embedding, allow_dangerous_deserialization=True)
+
+    reranker = Reranker(**({"fetch_k": args.fetch_k} if args.fetch_k else {}))
+    rows: Dict[str, List[Dict]] = {"raw": [], "reranked": []}
+    cold, warm = [], []
+    for question, gold in questions:
+        vector = np.asarray([fake.embedding(question, args.embedding_dim)], dtype="float32")
+        _, ids = db.index.search(vector, args.k)
+        raw = [passages[i] for i in ids[0] if i >= 0]
+        rows["raw"].append(prompt_tokens(question, raw, args.model) | {"hit": passages[gold] in raw, "passages": len(raw)})
+
+        reranker.retrieve(db, question)  # embeds the query, so cold timing below is rerank only
+        reranker.scores = type(reranker.scores)(reranker.scores.size)
+        start = time.perf_counter()
+        kept, report = reranker.retrieve(db, question)
+        cold.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        reranker.retrieve(db, question)
+        warm.append(time.perf_counter() - start)
+        texts = [p.content for p in kept]
+        rows["reranked"].append(prompt_tokens(question, texts, args.model)
+                                | {"hit": passages[gold] in texts, "passages": len(texts)})
+    server.shutdown()
+
+    def summary(r: List[Dict]) -> Dict:
+        return {
+            "gold_in_prompt": round(sum(x["hit"] for x in r) / len(r), 4),
+            "mean_prompt_tokens": round(statistics.mean(x["prompt"] for x in r), 1),
+            "mean_context_tokens": round(statistics.mean(x["context"] for x in r), 1),
+            "mean_passages": round(statistics.mean(x["passages"] for x in r), 2),
+        }
+
+    report = {
+        "settings": vars(args) | {"json_path": None, "passages": len(passages),
+                                  "fetch_k": reranker.fetch_k, "max_passages": reranker.max_passages,
+                                  "context_tokens": reranker.context_tokens},
+        "raw_top_k": summary(rows["raw"]),
+        "two_stage": summary(rows["reranked"]),
+        "retrieve_ms": {"cold_p50": round(statistics.median(cold) * 1000, 2),
+                        "warm_p50": round(statistics.median(warm) * 1000, 2)},
+    }
+    raw, two = report["raw_top_k"], report["two_stage"]
+    report["prompt_token_reduction"] = round(1 - two["mean_prompt_tokens"] / raw["mean_prompt_tokens"], 4)
+    print(f"raw top-{args.k}: {raw['mean_prompt_tokens']} prompt tokens, gold passage in prompt {raw['gold_in_prompt']:.1%}")
+    print(f"two-stage:  {two['mean_prompt_tokens']} prompt tokens, gold passage in prompt {two['gold_in_prompt']:.1%} "
+          f"({report['prompt_token_reduction']:.1%} fewer tokens)")
+    print(f"retrieval p50: {report['retrieve_ms']['cold_p50']} ms cold cache, {report['retrieve_ms']['warm_p50']} ms warm")
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+# backend/benchmarks/serving.py
+"""
+Serving load test for the API.
+
+Starts a stand-in Ollama (fake_ollama.py) with a configurable token rate,
+latency and embedding dimension, boots the FastAPI app under uvicorn
+against it, uploads a small corpus into a throwaway space, then drives a
+concurrent mixed workload (English chat, Persian chat, fullcomplete,
+knowledge and algorithm search) and reports per-workload p50/p95/p99
+latency, time to first byte and requests/sec.
+
+    python backend/benchmarks/serving.py --requests 300 --concurrency 16 --json serving.json
+    python backend/benchmarks/serving.py --token-rate 50 --baseline serving.json
+
+Time to first byte is measured on the client. /chat answers in one
+piece, so for chat it is close to the full latency.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_ollama import FakeOllama, serve  # noqa: E402
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+REPO_ROOT = Path(__file__).resolve().parents[2]
+REPO_CONFIG = REPO_ROOT / "config.yaml"
+
+DEFAULT_MIX = "en=4,fa=2,fullcomplete=1,search=2,algos=1"
+
+EN_PROMPTS = [
+    "write a python function that merges two sorted lists",
+    "what is the capital of france",
+    "explain in detail how dijkstra's algorithm works and prove its correctness",
+    "compare quicksort and mergesort for nearly sorted input",
+]
+FA_PROMPTS = [
+    "الگوریتم دایجسترا را با جزئیات توضیح بده",
+    "پیچیدگی زمانی مرتب‌سازی ادغامی چیست؟",
+    "یک تابع پایتون برای جستجوی دودویی بنویس",
+]
+SEARCH_QUERIES = ["shortest path", "sorting stability", "hash table collisions", "dynamic programming"]
+
+CORPUS = {
+    "graphs.md": "# Graphs\n\nAlgorithm: Dijkstra finds shortest paths with a priority queue.\n\n"
+                 "Algorithm: Bellman-Ford handles negative edges.\n",
+    "sorting.txt": "Mergesort algorithm is stable and runs in O(n log n).\n\n"
+                   "Quicksort algorithm is fast on average but not stable.\n",
+    "hashing.txt": "Hash tables resolve collisions by chaining or open addressing.\n\n"
+                   "The KMP algorithm uses a failure function for linear-time matching.\n",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+# --- Environment ---
+def write_config(path: Path, ollama_url: str) -> None:
+    config = yaml.safe_load(REPO_CONFIG.read_text(encoding="utf-8"))
+    config["ollama"]["api_url"] = f"{ollama_url}/api/generate"
+    config["ollama"]["backends"] = [{"url": ollama_url, "models": []}]
+    config.setdefault("residency", {})["rewarm_interval"] = 0
+    path.write_text(yaml.safe_dump(config, allow_unicode=True), encoding="utf-8")
+
+
+def start_app(port: int, config_path: Path, log_path: Path) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["EDRIS_CONFIG"] = str(config_path)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(APP_DIR), env.get("PYTHONPATH")]))
+    log = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--app-dir", str(APP_DIR),
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=str(REPO_ROOT), env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+
+def wait_until(check, timeout: float, what: str) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if check():
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"timed out waiting for {what}")
+
+
+def prepare_space(base: str, space: str, timeout: float) -> None:
+    requests.post(f"{base}/spaces/{space}", json={"bench": True}).raise_for_status()
+    files = [("files", (name, text.encode(), "text/plain")) for name, text in CORPUS.items()]
+    requests.post(f"{base}/knowledge/upload/{space}", files=files).raise_for_status()
+    # the index is built by a background task
+    wait_until(lambda: requests.get(f"{base}/knowledge/search/{space}", params={"q": "graph"}).json().get("results"),
+               timeout, "space index")
+
+
+# --- Workload ---
+def make_request(kind: str, base: str, space: str, rng: random.Random):
+    if kind == "en":
+        return "POST", f"{base}/chat", {"json": {"messages": [{"role": "user", "content": rng.choice(EN_PROMPTS)}]}}
+    if kind == "fa":
+        return "POST", f"{base}/chat", {"json": {"messages": [{"role": "user", "content": rng.choice(FA_PROMPTS)}]}}
+    if kind == "fullcomplete":
+        return "POST", f"{base}/chat", {"json": {"messages": [
+            {"role": "user", "content": f"fullcomplete {rng.choice(SEARCH_QUERIES)}"}]}}
+    if kind == "search":
+        return "GET", f"{base}/knowledge/search/{space}", {"params": {"q": rng.choice(SEARCH_QUERIES), "k": 3}}
+    if kind == "algos":
+        return "GET", f"{base}/algorithms/search/{space}", {"params": {"q": rng.choice(SEARCH_QUERIES), "k": 3}}
+    raise ValueError(f"unknown workload {kind}")
+
+
+def drive(base: str, space: str, mix: Dict[str, float], total: int, concurrency: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=total)
+    results: List[Dict] = []
+    lock = threading.Lock()
+    cursor = iter(range(total))
+
+    def worker(wid: int):
+        session = requests.Session()
+        wrng = random.Random(seed * 1000 + wid)
+        while True:
+            with lock:
+                i = next(cursor, None)
+            if i is None:
+                return
+            method, url, kwargs = make_request(kinds[i], base, space, wrng)
+            start = time.perf_counter()
+            ttfb = None
+            status = 0
+            try:
+                with session.request(method, url, stream=True, timeout=600, **kwargs) as resp:
+                    status = resp.status_code
+                    for _ in resp.iter_content(chunk_size=1024):
+                        if ttfb is None:
+                            ttfb = time.perf_counter() - start
+            except requests.RequestException:
+                status = -1
+            latency = time.perf_counter() - start
+            with lock:
+                results.append({"kind": kinds[i], "status": status, "latency": latency,
+                                "ttfb": ttfb if ttfb is not None else latency})
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(w,), daemon=True) for w in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {"wall_s": time.perf_counter() - start, "results": results}
+
+
+def summarize(results: List[Dict], wall_s: float) -> Dict:
+    def stats(rows: List[Dict]) -> Dict:
+        ok = [r for r in rows if r["status"] == 200]
+        lat = [r["latency"] * 1000 for r in ok]
+        ttfb = [r["ttfb"] * 1000 for r in ok]
+        out = {
+            "requests": len(rows), "ok": len(ok),
+            "errors": {str(s): sum(1 for r in rows if r["status"] == s)
+                       for s in sorted({r["status"] for r in rows if r["status"] != 200})},
+            "rps": round(len(ok) / wall_s, 2) if wall_s else None,
+        }
+        for name, values in (("latency_ms", lat), ("ttfb_ms", ttfb)):
+            out[name] = {f"p{int(q * 100)}": round(percentile(values, q), 2) if values else None
+                         for q in (0.5, 0.95, 0.99)}
+            out[name]["mean"] = round(statistics.mean(values), 2) if values else None
+        return out
+
+    per_kind = {}
+    for kind in sorted({r["kind"] for r in results}):
+        per_kind[kind] = stats([r for r in results if r["kind"] == kind])
+    return {"overall": stats(results), "workloads": per_kind}
+
+
+def compare(report: Dict, baseline: Dict) -> None:
+    print(f"\n{'workload':<14}{'p50 ms':>18}{'p99 ms':>18}{'rps':>16}")
+    rows = [("overall", report["overall"], baseline.get("overall", {}))]
+    rows += [(k, v, baseline.get("workloads", {}).get(k, {})) for k, v in report["workloads"].items()]
+    for name, cur, old in rows:
+        def cell(get):
+            new, prev = get(cur), get(old) if old else None
+            if new is None:
+                return "-"
+            if not prev:
+                return f"{new:.1f}"
+            return f"{new:.1f} ({(new - prev) / prev * 100:+.0f}%)"
+        print(f"{name:<14}{cell(lambda d: d.get('latency_ms', {}).get('p50')):>18}"
+              f"{cell(lambda d: d.get('latency_ms', {}).get('p99')):>18}{cell(lambda d: d.get('rps')):>16}")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(REPO_ROOT),
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API against a stand-in Ollama")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=10, help="requests sent before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="workload weights, e.g. en=4,fa=2,search=1")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="fake Ollama tokens per second")
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.02, help="fake Ollama seconds per call")
+    parser.add_argument("--embedding-dim", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="write the report to this file")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    fake = FakeOllama(latency=args.latency, token_rate=args.token_rate, answer_tokens=args.answer_tokens)
+    ollama_port, app_port = free_port(), free_port()
+    fake_server = serve(ollama_port, fake, args.embedding_dim)
+    base = f"http://127.0.0.1:{app_port}"
+    space = f"bench-{uuid.uuid4().hex[:8]}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config_path = Path(tmp) / "config.yaml"
+        log_path = Path(tmp) / "uvicorn.log"
+        write_config(config_path, f"http://127.0.0.1:{ollama_port}")
+        app = start_app(app_port, config_path, log_path)
+        try:
+            wait_until(lambda: requests.get(f"{base}/health").ok, 120, "app startup")
+            prepare_space(base, space, 120)
+            if args.warmup:
+                drive(base, space, mix, args.warmup, args.concurrency, args.seed + 1)
+            run = drive(base, space, mix, args.requests, args.concurrency, args.seed)
+            metrics = requests.get(f"{base}/metrics").text
+        except Exception:
+            print(log_path.read_text()[-4000:], file=sys.stderr)
+            raise
+        finally:
+            try:
+                requests.delete(f"{base}/spaces/{space}", timeout=10)
+            except requests.RequestException:
+                pass
+            app.terminate()
+            app.wait(timeout=30)
+            fake_server.shutdown()
+
+    report = {
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "settings": {"requests": args.requests, "concurrency": args.concurrency, "mix": mix,
+                     "token_rate": args.token_rate, "answer_tokens": args.answer_tokens,
+                     "latency": args.latency, "embedding_dim": args.embedding_dim, "seed": args.seed},
+        "wall_s": round(run["wall_s"], 3),
+        **summarize(run["results"], run["wall_s"]),
+        "server_stage_seconds": stage_totals(metrics),
+    }
+
+    o = report["overall"]
+    print(f"{o['ok']}/{o['requests']} ok in {report['wall_s']:.1f}s, {o['rps']} req/s")
+    for kind, w in report["workloads"].items():
+        lat, ttfb = w["latency_ms"], w["ttfb_ms"]
+        print(f"  {kind:<13} n={w['requests']:<5} p50 {lat['p50']} p95 {lat['p95']} p99 {lat['p99']} ms"
+              f"  ttfb p50 {ttfb['p50']} ms  errors {w['errors'] or '-'}")
+    if args.baseline:
+        compare(report, json.loads(Path(args.baseline).read_text()))
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+def stage_totals(metrics: str) -> Dict[str, Dict[str, float]]:
+    """Sum/count of edris_stage_seconds per stage, from the app's /metrics."""
+    out: Dict[str, Dict[str, float]] = {}
+    for line in metrics.splitlines():
+        for suffix in ("_sum", "_count"):
+            prefix = f"edris_stage_seconds{suffix}{{stage=\""
+            if line.startswith(prefix):
+                stage, value = line[len(prefix):].split("\"}", 1)
+                out.setdefault(stage, {})[suffix[1:]] = float(value)
+    return out
+
+
+if __name__ == "__main__":
+    main()
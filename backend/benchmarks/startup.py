@@ -0,0 +1,119 @@
+# backend/benchmarks/startup.py
+"""
+Import-cost benchmark for the API process.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for
+each target module and reports wall-clock import time plus the most
+expensive modules pulled in along the way.
+
+    python backend/benchmarks/startup.py
+    python backend/benchmarks/startup.py --modules main knowledge.loader --repeat 5 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+APP_DIR = Path(__file__).resolve().parents[1] / "app"
+REPO_CONFIG = Path(__file__).resolve().parents[2] / "config.yaml"
+
+DEFAULT_MODULES = ["main", "utils.router", "knowledge.manager", "knowledge.loader"]
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(APP_DIR), env.get("PYTHONPATH")]))
+    env.setdefault("EDRIS_CONFIG", str(REPO_CONFIG))
+    env["EDRIS_FAST_STARTUP"] = "1"
+    return env
+
+
+def parse_importtime(stderr: str) -> Dict[str, Dict[str, int]]:
+    """Parse `-X importtime` output into {module: {"self_us", "cumulative_us"}}."""
+    modules: Dict[str, Dict[str, int]] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            modules[name.strip()] = {
+                "self_us": int(self_us.strip()),
+                "cumulative_us": int(cumulative_us.strip()),
+            }
+        except ValueError:
+            continue
+    return modules
+
+
+def measure(module: str) -> Dict:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=str(APP_DIR), env=_env(), capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    return {
+        "ok": proc.returncode == 0,
+        "wall_s": wall,
+        "modules": parse_importtime(proc.stderr),
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else None,
+    }
+
+
+def run(modules: List[str], repeat: int, top: int) -> Dict:
+    report = {"python": sys.version.split()[0], "repeat": repeat, "targets": {}}
+    for module in modules:
+        runs = [measure(module) for _ in range(repeat)]
+        ok_runs = [r for r in runs if r["ok"]]
+        if not ok_runs:
+            report["targets"][module] = {"ok": False, "error": runs[-1]["error"]}
+            continue
+        # top-level packages only, ranked by the median cumulative import cost
+        per_pkg: Dict[str, List[int]] = {}
+        for r in ok_runs:
+            for name, t in r["modules"].items():
+                if "." not in name:
+                    per_pkg.setdefault(name, []).append(t["cumulative_us"])
+        ranked = sorted(
+            ((name, statistics.median(v)) for name, v in per_pkg.items()),
+            key=lambda x: x[1], reverse=True,
+        )[:top]
+        report["targets"][module] = {
+            "ok": True,
+            "wall_ms_median": statistics.median(r["wall_s"] for r in ok_runs) * 1000,
+            "import_ms_median": statistics.median(
+                r["modules"].get(module, {}).get("cumulative_us", 0) for r in ok_runs
+            ) / 1000,
+            "top_packages_ms": {name: us / 1000 for name, us in ranked},
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-module import cost of the backend")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", dest="json_path", help="write the report to this file")
+    args = parser.parse_args()
+
+    report = run(args.modules, args.repeat, args.top)
+    for module, result in report["targets"].items():
+        if not result["ok"]:
+            print(f"{module}: FAILED ({result['error']})")
+            continue
+        print(f"{module}: import {result['import_ms_median']:.1f} ms, "
+              f"process wall {result['wall_ms_median']:.1f} ms")
+        for name, ms in result["top_packages_ms"].items():
+            print(f"    {name:<32} {ms:9.1f} ms")
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
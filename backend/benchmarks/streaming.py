@@ -0,0 +1,133 @@
+# backend/benchmarks/streaming.py
+"""
+Rendered answers, buffered vs streamed.
+
+Boots the app under uvicorn against a fake Ollama that streams a fixed
+answer at --token-rate tokens/s: --sections sections of prose with a
+fenced code block, a [LATEX] formula, a ```json block and a footnote.
+Each /chat request goes to that model directly, in three modes:
+
+  buffered      stream false: post_process over the whole answer
+  stream        stream true, raw deltas (nothing to render)
+  stream+render stream true, IncrementalPostProcessor fragments
+
+and reports the median time to the first byte of answer text, total time,
+fragments per answer and whether the streamed rendered answer equals the
+buffered one.
+
+    python backend/benchmarks/streaming.py --token-rate 200 --sections 6
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_ollama import FakeOllama, serve  # noqa: E402
+from serving import free_port, start_app, wait_until, write_config  # noqa: E402
+
+SECTION = """Step {i}: relax every edge of the frontier[^{i}] before moving on.
+
+```python
+def relax(u, v, w):
+    if dist[u] + w < dist[v]:
+
+        dist[v] = dist[u] + w
+```
+
+The invariant is [LATEX]d(v) \\le d(u) + w(u, v)
+
+\\quad \\forall (u, v) \\in E[/LATEX] after round {i}.
+
+```json
+{{"round": {i}, "relaxed": [1, 2, 3]}}
+```
+
+[^{i}]: edges whose tail was settled in round {i}
+
+"""
+
+
+def answer(sections: int) -> str:
+    return "".join(SECTION.format(i=i + 1) for i in range(sections))
+
+
+def ask(base: str, question: str, stream: bool, render: bool) -> Dict:
+    body = {"messages": [{"role": "user", "content": question}], "model": "bench",
+            "stream": stream, "render": render}
+    start = time.perf_counter()
+    if not stream:
+        response = requests.post(f"{base}/chat", json=body)
+        response.raise_for_status()
+        seconds = time.perf_counter() - start
+        return {"first": seconds, "total": seconds, "fragments": 1, "response": response.json()["response"]}
+    first, fragments, done = None, 0, None
+    with requests.post(f"{base}/chat", json=body, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            event = json.loads(line)
+            if "delta" in event:
+                first = first or time.perf_counter() - start
+                fragments += 1
+            elif "error" in event:
+                raise RuntimeError(event["error"])
+            else:
+                done = event
+    return {"first": first, "total": time.perf_counter() - start, "fragments": fragments,
+            "response": done["response"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to first rendered fragment, buffered vs streamed")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="fake model tokens/s")
+    parser.add_argument("--sections", type=int, default=6)
+    parser.add_argument("--requests", type=int, default=5, help="requests per mode")
+    parser.add_argument("--json", dest="json_path")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    root = Path(tmp.name)
+    script = answer(args.sections)
+    fake_port, app_port = free_port(), free_port()
+    server = serve(fake_port, FakeOllama(token_rate=args.token_rate, script=script))
+    config_path = root / "config.yaml"
+    write_config(config_path, f"http://127.0.0.1:{fake_port}")
+    app = start_app(app_port, config_path, root / "uvicorn.log")
+    base = f"http://127.0.0.1:{app_port}"
+    rows, responses = {}, {}
+    try:
+        wait_until(lambda: requests.get(f"{base}/health").ok, 120, "app startup")
+        for mode, stream, render in (("buffered", False, True), ("stream", True, False),
+                                     ("stream+render", True, True)):
+            results = [ask(base, f"How does relaxation work? ({i})", stream, render) for i in range(args.requests)]
+            responses[mode] = [r.pop("response") for r in results]
+            rows[mode] = {"first_ms": round(statistics.median(r["first"] for r in results) * 1000, 1),
+                          "total_ms": round(statistics.median(r["total"] for r in results) * 1000, 1),
+                          "fragments": round(statistics.median(r["fragments"] for r in results))}
+    finally:
+        app.terminate()
+        app.wait()
+        server.shutdown()
+    identical = responses["stream+render"] == responses["buffered"]
+
+    tokens = len(FakeOllama(script=script).tokens("", ""))
+    print(f"{tokens} tokens at {args.token_rate:.0f} tokens/s, {args.requests} requests per mode")
+    print(f"{'mode':<15}{'first ms':>9}{'total ms':>10}{'fragments':>11}")
+    for mode, r in rows.items():
+        print(f"{mode:<15}{r['first_ms']:>9}{r['total_ms']:>10}{r['fragments']:>11}")
+    print(f"streamed rendering identical to buffered: {identical}")
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps({"settings": vars(args) | {"json_path": None},
+                                                    "results": rows, "identical": identical}, indent=2))
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()